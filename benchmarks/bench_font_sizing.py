@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+自动字号计算基准测试
+对比旧版二分查找+逐级微调算法、按参考字号比例推算算法以及字号结果缓存的测量次数和耗时
+
+用法: python benchmarks/bench_font_sizing.py [--boxes 500] [--font /path/to/font.ttc]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+
+from nodes.font_utils import get_default_font_path, clear_font_cache
+from nodes.text_layout import fit_single_line, fit_font_size, get_fit_cache_stats
+
+# 典型OCR/翻译场景的文字：短标签、价格、UI文本、长句
+SAMPLE_TEXTS = [
+    "价格", "SALE", "限时优惠", "¥199.00", "立即购买", "Add to cart", "新品上市",
+    "Free shipping on orders over $50", "产品参数", "Specifications", "OK", "取消",
+    "本产品适用于室内外多种场景，防水防尘", "Limited edition", "第3页", "Contact us",
+]
+
+
+def build_corpus(count, seed=42):
+    """生成一组接近真实OCR结果的 (文字, bbox) 样本"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        text = rng.choice(SAMPLE_TEXTS)
+        height = rng.randint(14, 120)
+        width = max(20, int(height * len(text) * rng.uniform(0.5, 1.2)))
+        x1, y1 = rng.randint(0, 1500), rng.randint(0, 1000)
+        corpus.append((text, [x1, y1, x1 + width, y1 + height]))
+    return corpus
+
+
+def legacy_fit(text, bbox, fill_ratio, font_path):
+    """旧版算法：二分查找，每次探测都重新加载字体并创建临时画布，然后逐级增大"""
+    x1, y1, x2, y2 = bbox
+    bbox_width, bbox_height = x2 - x1, y2 - y1
+    target_width = int(bbox_width * fill_ratio)
+    target_height = int(bbox_height * fill_ratio)
+    min_size = 6
+    max_size = min(500, max(bbox_width, bbox_height))
+    best_size = min_size
+    probes = 0
+
+    left, right = min_size, max_size
+    while right - left > 1:
+        mid_size = (left + right) // 2
+        test_font = ImageFont.truetype(font_path, mid_size)
+        temp_draw = ImageDraw.Draw(Image.new('RGB', (max(bbox_width, 100), max(bbox_height, 100))))
+        tb = temp_draw.textbbox((0, 0), text, font=test_font)
+        probes += 1
+        if tb[2] - tb[0] <= target_width and tb[3] - tb[1] <= target_height:
+            best_size = mid_size
+            left = mid_size
+        else:
+            right = mid_size
+
+    final_size = best_size
+    temp_draw = ImageDraw.Draw(Image.new('RGB', (max(bbox_width, 100), max(bbox_height, 100))))
+    temp_draw.textbbox((0, 0), text, font=ImageFont.truetype(font_path, final_size))
+    probes += 1
+    while final_size < max_size:
+        tb = temp_draw.textbbox((0, 0), text, font=ImageFont.truetype(font_path, final_size + 1))
+        probes += 1
+        if tb[2] - tb[0] <= target_width and tb[3] - tb[1] <= target_height:
+            final_size += 1
+        else:
+            break
+    return max(min_size, min(final_size, max_size)), probes
+
+
+def scaled_fit(text, bbox, fill_ratio, font_path):
+    """新版算法：参考字号测量一次后按比例推算"""
+    x1, y1, x2, y2 = bbox
+    bbox_width, bbox_height = x2 - x1, y2 - y1
+    return fit_single_line(
+        text, font_path, int(bbox_width * fill_ratio), int(bbox_height * fill_ratio),
+        6, min(500, max(bbox_width, bbox_height))
+    )
+
+
+def memo_fit(text, bbox, fill_ratio, font_path):
+    """新版算法 + 自动字号结果缓存"""
+    x1, y1, x2, y2 = bbox
+    bbox_width, bbox_height = x2 - x1, y2 - y1
+    return fit_font_size(
+        text, font_path, int(bbox_width * fill_ratio), int(bbox_height * fill_ratio),
+        6, min(500, max(bbox_width, bbox_height))
+    )
+
+
+def run(name, fit, corpus, font_path, fill_ratio):
+    sizes = []
+    total_probes = 0
+    start = time.perf_counter()
+    for text, bbox in corpus:
+        size, probes = fit(text, bbox, fill_ratio, font_path)
+        sizes.append(size)
+        total_probes += probes
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} 总耗时 {elapsed * 1000:9.1f} ms  "
+          f"单个 {elapsed / len(corpus) * 1e6:8.1f} us  "
+          f"平均测量次数 {total_probes / len(corpus):5.2f}")
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自动字号计算基准测试")
+    parser.add_argument("--boxes", type=int, default=500, help="样本bbox数量")
+    parser.add_argument("--font", default="", help="字体文件路径，默认使用系统检测到的字体")
+    parser.add_argument("--fill-ratio", type=float, default=0.95)
+    args = parser.parse_args()
+
+    font_path = args.font or get_default_font_path()
+    if not font_path:
+        print("未找到可用字体，请通过 --font 指定")
+        return
+
+    corpus = build_corpus(args.boxes)
+    print(f"字体: {font_path}  样本数: {len(corpus)}")
+    print("-" * 70)
+
+    legacy_sizes = run("binary", legacy_fit, corpus, font_path, args.fill_ratio)
+    clear_font_cache()
+    scaled_sizes = run("scaled", scaled_fit, corpus, font_path, args.fill_ratio)
+    scaled_warm = run("scaled(热)", scaled_fit, corpus, font_path, args.fill_ratio)
+    # 模拟批量任务：同一批bbox重复出现（视频帧、相似商品图）
+    run("memo(冷)", memo_fit, corpus, font_path, args.fill_ratio)
+    memo_sizes = run("memo(热)", memo_fit, corpus, font_path, args.fill_ratio)
+
+    same = sum(1 for a, b in zip(legacy_sizes, scaled_sizes) if a == b)
+    diffs = [abs(a - b) for a, b in zip(legacy_sizes, scaled_sizes)]
+    print("-" * 70)
+    print(f"结果一致率: {same / len(corpus) * 100:.1f}%  最大字号差: {max(diffs)}")
+    print(f"字号缓存: {get_fit_cache_stats()}")
+    assert scaled_sizes == scaled_warm == memo_sizes
+
+
+if __name__ == "__main__":
+    main()
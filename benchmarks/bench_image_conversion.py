@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+tensor与PIL图像互转基准测试
+对比节点旧版逐帧转换（扫描最大值、多次整帧复制）与 nodes/image_utils.py 批量转换的耗时
+
+用法: python benchmarks/bench_image_conversion.py [--batch 4] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+from PIL import Image
+
+from nodes.image_utils import tensor_to_pil_list, pil_list_to_tensor
+
+RESOLUTIONS = {
+    "1080p": (1080, 1920),
+    "4K": (2160, 3840),
+}
+
+
+def legacy_tensor_to_pil(tensor):
+    """旧版实现：扫描最大值猜测数值范围，再整帧相乘和类型转换"""
+    image_np = tensor.cpu().numpy()
+    if image_np.max() <= 1.0:
+        image_np = (image_np * 255).astype(np.uint8)
+    else:
+        image_np = image_np.astype(np.uint8)
+    return Image.fromarray(image_np)
+
+
+def legacy_pil_to_tensor(pil_image):
+    """旧版实现：np.array复制后astype再除法，产生多个整帧副本"""
+    image_np = np.array(pil_image).astype(np.float32) / 255.0
+    return torch.from_numpy(image_np).unsqueeze(0)
+
+
+def legacy_roundtrip(batch):
+    images = [legacy_tensor_to_pil(batch[i]) for i in range(batch.shape[0])]
+    return torch.cat([legacy_pil_to_tensor(image) for image in images], dim=0)
+
+
+def shared_roundtrip(batch):
+    return pil_list_to_tensor(tensor_to_pil_list(batch))
+
+
+def measure(func, batch, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(batch)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tensor与PIL图像互转基准测试")
+    parser.add_argument("--batch", type=int, default=4, help="每批图片数量")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最快一次")
+    args = parser.parse_args()
+
+    for name, (height, width) in RESOLUTIONS.items():
+        batch = torch.rand(args.batch, height, width, 3)
+        legacy_time, legacy_out = measure(legacy_roundtrip, batch, args.repeat)
+        shared_time, shared_out = measure(shared_roundtrip, batch, args.repeat)
+        max_diff = (legacy_out - shared_out).abs().max().item()
+        print(f"{name:<6} x{args.batch}  旧版 {legacy_time * 1000:8.1f} ms  "
+              f"批量 {shared_time * 1000:8.1f} ms  "
+              f"加速 {legacy_time / shared_time:4.2f}x  最大误差 {max_diff:.4f}")
+
+
+if __name__ == "__main__":
+    main()
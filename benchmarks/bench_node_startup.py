@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+动态节点启动加载基准测试
+对比旧版（每个节点一个JSON文件、逐个创建完整节点类并输出日志）与单文件存储 + 延迟注册的启动耗时，
+以及/object_info首次访问所有节点INPUT_TYPES的耗时
+
+用法: python benchmarks/bench_node_startup.py [--nodes 10000] [--inputs 6]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nodes.node_store import NodeConfigStore
+from nodes.node_registry import NodeRegistry, IyunyaInNode, IyunyaOutNode, build_input_types
+
+INPUT_TYPE_CYCLE = ["STRING", "INT", "FLOAT", "BOOLEAN"]
+
+
+def write_legacy_configs(directory, count, inputs):
+    """按旧版目录结构写入节点配置：saved_nodes/<group>/<id>.json"""
+    for index in range(count):
+        group = "in" if index % 2 == 0 else "out"
+        group_dir = os.path.join(directory, group)
+        os.makedirs(group_dir, exist_ok=True)
+        config = {
+            "id": f"node{index:05d}",
+            "group": group,
+            "inputs": {f"param_{k}": INPUT_TYPE_CYCLE[k % len(INPUT_TYPE_CYCLE)] for k in range(inputs)},
+            "name": f"工作流节点 {index}",
+            "create_time": f"2024-01-01 {index // 3600 % 24:02d}:{index // 60 % 60:02d}:{index % 60:02d}",
+        }
+        with open(os.path.join(group_dir, f"{config['id']}.json"), "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def legacy_load(directory, logger):
+    """旧版实现：逐个文件exists/open/json.load，按create_time字符串排序，逐个创建完整节点类并输出日志"""
+    class_mappings = {}
+    display_names = {}
+    for group in ["in", "out"]:
+        group_dir = os.path.join(directory, group)
+        if not os.path.exists(group_dir):
+            continue
+        configs = []
+        for filename in os.listdir(group_dir):
+            if filename.endswith(".json"):
+                path = os.path.join(group_dir, filename)
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        configs.append(json.load(f))
+        configs.sort(key=lambda x: x.get("create_time", "2000-01-01 00:00:00"))
+        for config in configs:
+            node_name = f"iyunya_{group}_{config['id']}"
+            base = IyunyaInNode if group == "in" else IyunyaOutNode
+            class_mappings[node_name] = type(node_name, (base,), {
+                "_input_types": build_input_types(config),
+                "RETURN_TYPES": tuple(config["inputs"].values()) if group == "in" else (),
+                "RETURN_NAMES": tuple(config["inputs"].keys()),
+            })
+            display_names[node_name] = config["name"]
+            logger.info(f"创建节点成功: {config['name']} (ID: {config['id']}, 组: {group})")
+    return class_mappings
+
+
+def lazy_load(directory):
+    """新版实现：一次读入存储文件，批量注册空壳节点类"""
+    registry = NodeRegistry()
+    registry.register_many(NodeConfigStore(directory).load())
+    return registry.class_mappings
+
+
+def touch_object_info(class_mappings):
+    """模拟/object_info：读取每个节点的INPUT_TYPES、RETURN_TYPES和RETURN_NAMES"""
+    for node_class in class_mappings.values():
+        node_class.INPUT_TYPES()
+        node_class.RETURN_TYPES
+        node_class.RETURN_NAMES
+
+
+def timed(name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {elapsed * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="动态节点启动加载基准测试")
+    parser.add_argument("--nodes", type=int, default=10000, help="保存的节点数量")
+    parser.add_argument("--inputs", type=int, default=6, help="每个节点的参数数量")
+    args = parser.parse_args()
+
+    # 旧版每个节点输出一行INFO日志，写入文件以免终端输出影响计时
+    root = tempfile.mkdtemp(prefix="iyunya_bench_")
+    logger = logging.getLogger("bench_node_startup")
+    logger.propagate = False
+    handler = logging.FileHandler(os.path.join(root, "startup.log"), encoding="utf-8")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    try:
+        legacy_dir = os.path.join(root, "legacy")
+        store_dir = os.path.join(root, "store")
+        write_legacy_configs(legacy_dir, args.nodes, args.inputs)
+        shutil.copytree(legacy_dir, store_dir)
+        print(f"节点数: {args.nodes}  每个节点参数数: {args.inputs}")
+        print("-" * 50)
+
+        legacy_classes = timed("旧版启动加载", legacy_load, legacy_dir, logger)
+        timed("迁移到单文件存储", NodeConfigStore(store_dir).load)
+        lazy_classes = timed("单文件 + 延迟注册", lazy_load, store_dir)
+        timed("/object_info首次访问", touch_object_info, lazy_classes)
+        timed("/object_info再次访问", touch_object_info, lazy_classes)
+
+        assert set(legacy_classes) == set(lazy_classes)
+        for name, node_class in legacy_classes.items():
+            assert node_class.INPUT_TYPES() == lazy_classes[name].INPUT_TYPES()
+            assert node_class.RETURN_TYPES == lazy_classes[name].RETURN_TYPES
+        print("-" * 50)
+        print(f"存储文件大小: {os.path.getsize(os.path.join(store_dir, 'nodes.jsonl')) / 1024:.0f} KB")
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,8 @@ ComfyUI-iyunya-nodes 字体检测脚本
 
 import os
 import platform
-from PIL import ImageFont
+
+from nodes.font_utils import get_font_candidates, rescan_fonts, load_font
 
 def detect_fonts():
     """检测系统中可用的字体"""
@@ -16,65 +17,45 @@ def detect_fonts():
     print(f"检测系统: {system}")
     print("=" * 50)
     
-    # 定义字体路径
-    if system == "Windows":
-        font_paths = [
-            ("微软雅黑", "C:/Windows/Fonts/msyh.ttc"),
-            ("黑体", "C:/Windows/Fonts/simhei.ttf"),
-            ("宋体", "C:/Windows/Fonts/simsun.ttc"),
-            ("Arial", "C:/Windows/Fonts/arial.ttf"),
-        ]
-    elif system == "Darwin":  # macOS
-        font_paths = [
-            ("苹方", "/System/Library/Fonts/PingFang.ttc"),
-            ("Helvetica", "/System/Library/Fonts/Helvetica.ttc"),
-            ("Arial", "/System/Library/Fonts/Arial.ttf"),
-        ]
-    else:  # Linux
-        font_paths = [
-            ("Noto Sans CJK", "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc"),
-            ("Noto Sans CJK (OpenType)", "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc"),
-            ("Noto Serif CJK", "/usr/share/fonts/truetype/noto/NotoSerifCJK-Regular.ttc"),
-            ("Noto Serif CJK (OpenType)", "/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc"),
-            ("文泉驿微米黑", "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc"),
-            ("文泉驿正黑", "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc"),
-            ("文鼎楷书", "/usr/share/fonts/truetype/arphic/ukai.ttc"),
-            ("文鼎明体", "/usr/share/fonts/truetype/arphic/uming.ttc"),
-            ("DejaVu Sans", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
-            ("Liberation Sans", "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf"),
-            ("DejaVu Sans (TTF)", "/usr/share/fonts/TTF/DejaVuSans.ttf"),
-            ("Liberation Sans (System)", "/usr/share/fonts/liberation/LiberationSans-Regular.ttf"),
-        ]
+    # 候选字体列表与节点共用，见 nodes/font_utils.py
+    font_paths = get_font_candidates(system)
+    verified_paths = {path for _, path in rescan_fonts()}
     
     available_fonts = []
     missing_fonts = []
+    broken_fonts = []
     
     print("字体检测结果:")
     print("-" * 50)
     
     for name, path in font_paths:
-        if os.path.exists(path):
+        if path in verified_paths:
             print(f"✓ {name}: {path}")
+            print(f"  → 字体加载测试: 成功")
             available_fonts.append((name, path))
-            
-            # 测试字体是否可以正常加载
+        elif os.path.exists(path):
+            # 文件存在但无法加载，重新加载一次以输出具体原因
             try:
-                font = ImageFont.truetype(path, 16)
-                print(f"  → 字体加载测试: 成功")
+                load_font(path, 16)
+                error = "字体发现时验证未通过"
             except Exception as e:
-                print(f"  → 字体加载测试: 失败 ({e})")
+                error = str(e)
+            print(f"✗ {name}: {path} (无法加载)")
+            print(f"  → 字体加载测试: 失败 ({error})")
+            broken_fonts.append((name, path))
         else:
             print(f"✗ {name}: {path} (未找到)")
             missing_fonts.append((name, path))
     
     print("\n" + "=" * 50)
-    print(f"检测完成: 找到 {len(available_fonts)} 个字体，缺少 {len(missing_fonts)} 个字体")
+    print(f"检测完成: 找到 {len(available_fonts)} 个字体，缺少 {len(missing_fonts)} 个字体，"
+          f"{len(broken_fonts)} 个字体无法加载")
     
     if available_fonts:
         print(f"\n推荐使用字体: {available_fonts[0][0]}")
         print(f"字体路径: {available_fonts[0][1]}")
     
-    if missing_fonts and system == "Linux":
+    if (missing_fonts or broken_fonts) and system == "Linux":
         print("\n如果中文显示有问题，建议安装以下字体包:")
         print("sudo apt-get install fonts-noto-cjk fonts-wqy-microhei fonts-wqy-zenhei")
         print("sudo apt-get install fonts-arphic-ukai fonts-arphic-uming")
@@ -105,7 +86,7 @@ def test_chinese_text():
         draw = ImageDraw.Draw(img)
         
         # 加载字体
-        font = ImageFont.truetype(font_path, 24)
+        font = load_font(font_path, 24)
         
         # 绘制文字
         draw.text((10, 30), test_text, font=font, fill='black')
@@ -0,0 +1,140 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger("bbox_utils")
+
+# bbox_2d坐标约定：像素坐标、0~1000归一化坐标、0~1归一化坐标，auto为自动检测
+COORD_MODES = ["auto", "absolute", "norm_1000", "norm_1"]
+
+# 自动检测时允许的越界容差（模型常把框画到图像边缘外一两个像素）
+_DETECT_TOLERANCE = 1.02
+
+
+def collect_item_points(ocr_results):
+    """
+    提取OCR结果项的坐标点
+
+    返回 (有效结果项索引列表, 每项的 (K, 2) float32点数组列表)；bbox_2d为4个数时
+    视为矩形的两个角点，为8个及以上的偶数个数或提供polygon字段时视为多边形
+    """
+    indices = []
+    points = []
+    for index, item in enumerate(ocr_results):
+        if not isinstance(item, dict):
+            continue
+        coords = item.get("polygon")
+        if not coords:
+            coords = item.get("bbox_2d")
+            if isinstance(coords, (list, tuple)) and not (len(coords) >= 8 and len(coords) % 2 == 0):
+                coords = coords[:4]
+        try:
+            array = np.asarray(coords, dtype=np.float32).reshape(-1, 2)
+        except (TypeError, ValueError):
+            continue
+        if len(array) < 2 or not np.isfinite(array).all():
+            continue
+        indices.append(index)
+        points.append(array)
+    return indices, points
+
+
+def detect_coord_mode(coords, width, height):
+    """
+    根据坐标范围推断坐标约定
+
+    所有坐标不超过1时为0~1归一化；坐标超出图像尺寸但不超过1000时为0~1000归一化；
+    其他情况按像素坐标处理。图像两边都大于1000且框都在范围内时无法区分，按像素坐标处理，
+    此时需要显式指定坐标约定
+    """
+    coords = np.asarray(coords, dtype=np.float32).reshape(-1, 2)
+    if len(coords) == 0:
+        return "absolute"
+    max_x, max_y = coords.max(axis=0)
+    if max(max_x, max_y) <= 1.0:
+        return "norm_1"
+    exceeds = max_x > width * _DETECT_TOLERANCE or max_y > height * _DETECT_TOLERANCE
+    if exceeds and max(max_x, max_y) <= 1000 * _DETECT_TOLERANCE:
+        return "norm_1000"
+    return "absolute"
+
+
+def coord_scale(mode, width, height, source_size=None):
+    """
+    返回将mode约定的坐标转换为 width x height 图像像素坐标的缩放系数 (sx, sy)
+
+    source_size为模型实际看到的图像尺寸（上传前缩放过时与目标尺寸不同），
+    只影响像素坐标的换算
+    """
+    if mode == "norm_1":
+        return float(width), float(height)
+    if mode == "norm_1000":
+        return width / 1000.0, height / 1000.0
+    if source_size is None:
+        return 1.0, 1.0
+    return width / float(source_size[0]), height / float(source_size[1])
+
+
+def clip_pixel_boxes(boxes, width, height):
+    """
+    将 (N, 4) 框数组整理为左上/右下顺序、取整并裁剪到图像范围 [0, W-1] x [0, H-1]
+
+    返回 (int32框数组, 非退化框的布尔掩码)
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    ordered = np.stack([
+        np.minimum(boxes[:, 0], boxes[:, 2]),
+        np.minimum(boxes[:, 1], boxes[:, 3]),
+        np.maximum(boxes[:, 0], boxes[:, 2]),
+        np.maximum(boxes[:, 1], boxes[:, 3]),
+    ], axis=1)
+    upper = np.array([width - 1, height - 1, width - 1, height - 1], dtype=np.float32)
+    clipped = np.clip(np.rint(ordered), 0, np.maximum(upper, 0)).astype(np.int32)
+    keep = (clipped[:, 2] > clipped[:, 0]) & (clipped[:, 3] > clipped[:, 1])
+    return clipped, keep
+
+
+def normalize_ocr_results(ocr_results, width, height, coord_mode="auto", source_size=None):
+    """
+    将一帧OCR结果的坐标统一转换为 width x height 图像上的像素坐标
+
+    所有坐标拼成一个数组后一次性检测约定、缩放、裁剪，并去掉退化的框。
+    返回 (结果项列表, (N, 4) int32外接框数组)，两者一一对应；
+    结果项为副本，bbox_2d（以及polygon）已替换为整数像素坐标，带polygon的项bbox_2d为其外接框
+    """
+    indices, points = collect_item_points(ocr_results or [])
+    if not indices:
+        return [], np.zeros((0, 4), dtype=np.int32)
+
+    counts = np.fromiter((len(p) for p in points), dtype=np.int64, count=len(points))
+    flat = np.concatenate(points)
+    detect_size = source_size or (width, height)
+    mode = coord_mode
+    if mode not in COORD_MODES or mode == "auto":
+        mode = detect_coord_mode(flat, detect_size[0], detect_size[1])
+    if mode != "absolute":
+        logger.debug(f"bbox坐标约定：{mode}")
+
+    flat = flat * np.asarray(coord_scale(mode, width, height, source_size), dtype=np.float32)
+    flat[:, 0] = np.clip(flat[:, 0], 0, max(width - 1, 0))
+    flat[:, 1] = np.clip(flat[:, 1], 0, max(height - 1, 0))
+
+    # 每项的外接框：按项分段求最小/最大值
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    mins = np.minimum.reduceat(flat, starts, axis=0)
+    maxs = np.maximum.reduceat(flat, starts, axis=0)
+    boxes, keep = clip_pixel_boxes(np.concatenate([mins, maxs], axis=1), width, height)
+
+    normalized = []
+    rounded = np.rint(flat).astype(np.int32)
+    for k in np.flatnonzero(keep).tolist():
+        item = dict(ocr_results[indices[k]])
+        segment = rounded[starts[k]:starts[k] + counts[k]]
+        if counts[k] == 2:
+            item["bbox_2d"] = boxes[k].tolist()
+        elif item.get("polygon"):
+            item["polygon"] = segment.tolist()
+            item["bbox_2d"] = boxes[k].tolist()
+        else:
+            item["bbox_2d"] = segment.reshape(-1).tolist()
+        normalized.append(item)
+    return normalized, boxes[keep]
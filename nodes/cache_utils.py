@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    线程安全的有界LRU缓存，带命中/未命中统计
+
+    可选的max_weight和weigher用于按条目大小（如字节数）限制总容量
+    """
+
+    def __init__(self, maxsize=128, name="cache", max_weight=None, weigher=None):
+        self.maxsize = max(1, int(maxsize))
+        self.name = name
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self._data = OrderedDict()
+        self._weights = {}
+        self._total_weight = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key, default=None):
+        """读取缓存，命中时移动到队尾（最近使用）"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def _insert(self, key, value):
+        """写入条目并按容量淘汰（调用方持有锁）"""
+        if self.weigher is not None:
+            weight = self.weigher(value)
+            self._total_weight += weight - self._weights.get(key, 0)
+            self._weights[key] = weight
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self._shrink()
+
+    def _shrink(self):
+        """淘汰最久未使用的条目直到满足容量限制（调用方持有锁）"""
+        while self._data and (len(self._data) > self.maxsize or
+                              (self.max_weight is not None and self._total_weight > self.max_weight)):
+            key, _ = self._data.popitem(last=False)
+            self._total_weight -= self._weights.pop(key, 0)
+            self.evictions += 1
+
+    def put(self, key, value):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._insert(key, value)
+
+    def get_or_create(self, key, factory):
+        """读取缓存，未命中时调用factory创建并写入"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # 在锁外创建，避免长时间阻塞其他线程（如加载大字体文件）
+        value = factory()
+        with self._lock:
+            if key in self._data:
+                # 其他线程已抢先写入，复用已有对象
+                self._data.move_to_end(key)
+                return self._data[key]
+            self._insert(key, value)
+        return value
+
+    def resize(self, maxsize):
+        """调整缓存容量"""
+        with self._lock:
+            self.maxsize = max(1, int(maxsize))
+            self._shrink()
+
+    def clear(self):
+        """清空缓存并重置统计"""
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self._total_weight = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "weight": self._total_weight,
+                "max_weight": self.max_weight,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,465 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from .cache_utils import LRUCache
+from .qwen_vl_client import (
+    APIRequestError, RequestCancelled, send_with_retry, iter_sse_data, compute_backoff, release_response,
+    DEFAULT_MAX_RETRIES, DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX,
+)
+
+logger = logging.getLogger("endpoint_pool")
+
+BALANCE_STRATEGIES = ["weighted_round_robin", "least_in_flight"]
+
+# 熔断器：连续失败次数达到阈值后摘除端点，冷却时间后放行一个探测请求
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("IYUNYA_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("IYUNYA_BREAKER_RESET_SECONDS", "30"))
+
+# 只对当前API Key有效的错误（鉴权失败），切换到其他端点重试
+KEY_ERROR_STATUS_CODES = frozenset({401, 403})
+
+# 估算请求token数时每张图片计入的token数（实际值由响应中的usage校正）
+IMAGE_TOKEN_ESTIMATE = 1000
+
+
+class TokenBucket:
+    """
+    令牌桶限流器，rate为每秒补充的令牌数，capacity为桶容量（允许的突发量）
+
+    adjust允许余额为负（用于按实际用量补扣），余额为负时后续请求需等待补足
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount=1.0):
+        """返回获取amount个令牌需要等待的秒数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            amount = min(amount, self.capacity)
+            return max(0.0, (amount - self._tokens) / self.rate)
+
+    def try_consume(self, amount=1.0):
+        """令牌足够时扣除并返回0，否则不扣除并返回需要等待的秒数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            # 单次请求超过桶容量时按容量计，避免永远无法满足
+            needed = min(amount, self.capacity)
+            if self._tokens >= needed:
+                self._tokens -= amount
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+    def adjust(self, delta):
+        """按实际用量补扣（delta>0）或退还（delta<0）令牌"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+
+class KeyLimiter:
+    """单个API Key的QPS和TPM（每分钟token数）限制，同一Key的多个端点共享"""
+
+    def __init__(self, qps=None, tpm=None):
+        self.qps_bucket = TokenBucket(qps, max(1.0, qps)) if qps else None
+        self.tpm_bucket = TokenBucket(tpm / 60.0, tpm) if tpm else None
+
+    def wait_time(self, tokens):
+        waits = [0.0]
+        if self.qps_bucket is not None:
+            waits.append(self.qps_bucket.wait_time(1))
+        if self.tpm_bucket is not None:
+            waits.append(self.tpm_bucket.wait_time(tokens))
+        return max(waits)
+
+    def acquire(self, tokens, cancel_token=None):
+        """阻塞直到QPS和TPM额度都满足并扣除，cancel_token被取消时抛出RequestCancelled"""
+        while True:
+            wait = self.wait_time(tokens)
+            if wait <= 0:
+                # 两个桶分别扣除，TPM不足时退还已扣的QPS令牌后重新等待
+                if self.qps_bucket is not None and self.qps_bucket.try_consume(1) > 0:
+                    continue
+                if self.tpm_bucket is not None and self.tpm_bucket.try_consume(tokens) > 0:
+                    if self.qps_bucket is not None:
+                        self.qps_bucket.adjust(-1)
+                    continue
+                return
+            if cancel_token is not None:
+                if cancel_token.wait(wait):
+                    raise RequestCancelled("请求已取消")
+            else:
+                time.sleep(wait)
+
+    def record_usage(self, estimated, actual):
+        """用响应中的实际token用量校正TPM额度"""
+        if self.tpm_bucket is not None and actual is not None:
+            self.tpm_bucket.adjust(actual - estimated)
+
+
+class CircuitBreaker:
+    """
+    熔断器：closed（正常）→ 连续失败达到阈值 → open（摘除）→ 冷却后 half_open（放行一个探测请求）
+    → 探测成功恢复为closed，失败重新open
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_SECONDS):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def retry_at(self):
+        """open状态下允许探测的时间点（time.monotonic）"""
+        return self.opened_at + self.reset_timeout
+
+    def available(self, now):
+        """是否可以接收请求（不改变状态）"""
+        if self.state == "open":
+            return now >= self.retry_at()
+        return self.state == "closed" or not self._probing
+
+    def allow(self, now):
+        """是否允许发送请求（调用方持有锁）；half_open时只放行一个探测请求"""
+        if self.state == "open":
+            if now < self.retry_at():
+                return False
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "half_open":
+            return not self._probing
+        return True
+
+    def on_dispatch(self):
+        if self.state == "half_open":
+            self._probing = True
+
+    def record_neutral(self):
+        """请求的结果不反映端点健康状况（被取消、请求本身有误）时只结束探测，不改变熔断状态"""
+        self._probing = False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self, now):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = now
+
+
+class Endpoint:
+    """一个 (API Key, API地址) 组合及其负载均衡、熔断状态"""
+
+    def __init__(self, api_key, api_base_url, weight=1, limiter=None):
+        self.api_key = api_key
+        self.api_base_url = api_base_url.rstrip("/")
+        self.weight = max(1, int(weight))
+        self.limiter = limiter or KeyLimiter()
+        self.breaker = CircuitBreaker()
+        self.in_flight = 0
+        self.current_weight = 0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def name(self):
+        masked = self.api_key[:6] + "***" if len(self.api_key) > 6 else "***"
+        return f"{masked}@{self.api_base_url}"
+
+    def headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+
+def estimate_request_tokens(payload):
+    """粗略估算请求消耗的token数：文本字符数 + 每张图片固定值 + 最大输出token数"""
+    tokens = int(payload.get("max_tokens") or 0)
+    for message in payload.get("messages") or []:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part.get("type") == "image_url":
+                tokens += IMAGE_TOKEN_ESTIMATE
+            else:
+                tokens += len(part.get("text") or "")
+    return tokens
+
+
+class EndpointPool:
+    """
+    多个 (API Key, API地址) 组成的请求池
+
+    按平滑加权轮询或最少进行中请求选择端点，每个Key独立限制QPS/TPM，
+    连续失败的端点由熔断器摘除，失败的请求自动切换到其他端点重试
+    """
+
+    def __init__(self, endpoints, strategy="weighted_round_robin"):
+        if not endpoints:
+            raise ValueError("端点池为空")
+        self.endpoints = list(endpoints)
+        self.strategy = strategy if strategy in BALANCE_STRATEGIES else BALANCE_STRATEGIES[0]
+        self._lock = threading.Lock()
+
+    def _select(self, candidates):
+        """按负载均衡策略从候选端点中选择一个（调用方持有锁）"""
+        if self.strategy == "least_in_flight":
+            return min(candidates, key=lambda e: (e.in_flight / e.weight, e.requests))
+        # 平滑加权轮询（nginx算法）：权重高的端点被选中更频繁，且分布均匀
+        total = sum(e.weight for e in candidates)
+        for endpoint in candidates:
+            endpoint.current_weight += endpoint.weight
+        chosen = max(candidates, key=lambda e: e.current_weight)
+        chosen.current_weight -= total
+        return chosen
+
+    def acquire(self, tokens=0, exclude=()):
+        """
+        选择一个可用端点并计入进行中请求，返回 (端点, 限流需等待的秒数)
+
+        优先选择限流额度充足的端点；所有端点都被熔断时返回 (None, 最早可探测的等待秒数)
+        """
+        with self._lock:
+            now = time.monotonic()
+            allowed = [e for e in self.endpoints if e.breaker.allow(now)]
+            # 优先选择本次请求还没尝试过的端点
+            allowed = [e for e in allowed if e not in exclude] or allowed
+            if not allowed:
+                return None, max(0.0, min(e.breaker.retry_at() for e in self.endpoints) - now)
+            waits = {id(e): e.limiter.wait_time(tokens) for e in allowed}
+            ready = [e for e in allowed if waits[id(e)] <= 0]
+            if ready:
+                endpoint = self._select(ready)
+            else:
+                endpoint = min(allowed, key=lambda e: waits[id(e)])
+            endpoint.breaker.on_dispatch()
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint, waits[id(endpoint)]
+
+    def has_untried(self, tried):
+        """是否还有本次请求未尝试过、且未被熔断的端点"""
+        with self._lock:
+            now = time.monotonic()
+            return any(e not in tried and e.breaker.available(now) for e in self.endpoints)
+
+    def release(self, endpoint, success):
+        """
+        请求结束后更新端点的进行中计数和熔断状态
+
+        success为None表示结果不反映端点健康状况（被取消或请求本身有误），只减少进行中计数，
+        不重置失败次数，也不会让half_open的熔断器恢复
+        """
+        with self._lock:
+            endpoint.in_flight -= 1
+            if success is None:
+                endpoint.breaker.record_neutral()
+            elif success:
+                endpoint.breaker.record_success()
+            else:
+                endpoint.failures += 1
+                was_open = endpoint.breaker.state == "open"
+                endpoint.breaker.record_failure(time.monotonic())
+                if endpoint.breaker.state == "open" and not was_open:
+                    logger.warning(f"端点{endpoint.name}连续失败，熔断{endpoint.breaker.reset_timeout:.0f}秒")
+
+    def stats(self):
+        """返回各端点的请求数、失败数、进行中请求数和熔断状态"""
+        with self._lock:
+            return [{
+                "endpoint": e.name,
+                "weight": e.weight,
+                "requests": e.requests,
+                "failures": e.failures,
+                "in_flight": e.in_flight,
+                "state": e.breaker.state,
+            } for e in self.endpoints]
+
+    def _send(self, path, payload, stream=False, max_retries=DEFAULT_MAX_RETRIES,
+              backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX, cancel_token=None,
+              **request_options):
+        """
+        选择端点发送请求，失败时切换端点重试，返回 (响应, 端点, 估算token数)
+
+        每次尝试只向一个端点发送一次（不在同一端点上原地重试），由熔断器和负载均衡决定下一个端点
+        """
+        tokens = estimate_request_tokens(payload)
+        attempt = 0
+        tried = []
+        while True:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            endpoint, wait = self.acquire(tokens, exclude=tried)
+            if endpoint is None:
+                error = APIRequestError(f"所有API端点均已熔断，{wait:.1f}秒后恢复", attempts=attempt)
+                retry_after = wait
+            else:
+                retry_after = None
+                try:
+                    endpoint.limiter.acquire(tokens, cancel_token)
+                    response = send_with_retry(
+                        f"{endpoint.api_base_url}{path}", endpoint.headers(), payload, max_retries=0,
+                        stream=stream, cancel_token=cancel_token, **request_options
+                    )
+                    return response, endpoint, tokens
+                except RequestCancelled:
+                    self.release(endpoint, None)
+                    raise
+                except APIRequestError as e:
+                    if (e.status_code is not None and e.status_code < 500 and
+                            e.status_code not in (408, 429) and e.status_code not in KEY_ERROR_STATUS_CODES):
+                        # 请求本身有误（如400），换端点也不会成功
+                        self.release(endpoint, None)
+                        raise
+                    self.release(endpoint, False)
+                    tried.append(endpoint)
+                    retry_after = e.retry_after
+                    error = APIRequestError(f"{endpoint.name}: {str(e)}", status_code=e.status_code,
+                                            attempts=attempt + 1, retry_after=retry_after)
+                    logger.warning(f"端点请求失败（{str(error)}）")
+
+            if attempt >= max_retries:
+                raise error
+            # 还有未尝试过的健康端点时立即切换，否则退避等待
+            if endpoint is None or not self.has_untried(tried):
+                delay = compute_backoff(attempt, backoff_base, backoff_max, retry_after)
+                tried = []
+                if cancel_token is not None:
+                    if cancel_token.wait(delay):
+                        raise RequestCancelled("请求已取消")
+                else:
+                    time.sleep(delay)
+            attempt += 1
+
+    def post_json(self, path, payload, **request_options):
+        """发送JSON请求并返回解析后的响应，参数同send_with_retry"""
+        response, endpoint, tokens = self._send(path, payload, **request_options)
+        success = False
+        try:
+            result = response.json()
+            success = True
+        except ValueError:
+            cancel_token = request_options.get("cancel_token")
+            if cancel_token is not None and cancel_token.cancelled:
+                success = None
+                raise RequestCancelled("请求已取消")
+            raise APIRequestError(f"{endpoint.name}: 响应不是合法的JSON")
+        finally:
+            response.close()
+            self.release(endpoint, success)
+        usage = result.get("usage") if isinstance(result, dict) else None
+        if usage:
+            endpoint.limiter.record_usage(tokens, usage.get("total_tokens"))
+        return result
+
+    def stream_chat_completion(self, path, payload, **request_options):
+        """以SSE流式方式发送请求，逐段返回模型输出的文本增量"""
+        payload = dict(payload, stream=True)
+        response, endpoint, _ = self._send(path, payload, stream=True, **request_options)
+        cancel_token = request_options.get("cancel_token")
+        success = False
+        try:
+            for data in iter_sse_data(response):
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    logger.warning(f"无法解析的SSE事件：{data[:200]}")
+                    continue
+                for choice in event.get("choices") or []:
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            success = True
+        except (RequestCancelled, GeneratorExit):
+            # 被取消或调用方提前停止读取
+            success = None
+            raise
+        except Exception as e:
+            if cancel_token is not None and cancel_token.cancelled:
+                success = None
+                raise RequestCancelled("请求已取消") from e
+            raise APIRequestError(f"{endpoint.name}: 流式读取响应失败：{str(e)}") from e
+        finally:
+            response.close()
+            release_response(response, cancel_token)
+            self.release(endpoint, success)
+
+
+def parse_endpoint_config(text):
+    """
+    解析端点池配置，返回 [(api_key, api_base_url, weight, qps, tpm), ...]
+
+    支持JSON数组（元素为含api_key、api_base_url、weight、qps、tpm字段的对象），
+    或每行一个端点：api_key, api_base_url[, weight[, qps[, tpm]]]，#开头为注释
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        entries = []
+        for item in json.loads(text):
+            entries.append((
+                str(item["api_key"]).strip(), str(item["api_base_url"]).strip(),
+                int(item.get("weight", 1)), item.get("qps"), item.get("tpm"),
+            ))
+        return entries
+
+    entries = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) < 2 or not fields[0] or not fields[1]:
+            raise ValueError(f"端点池配置第{line_number}行格式错误：{line}")
+
+        def number(index, cast):
+            if len(fields) > index and fields[index]:
+                return cast(fields[index])
+            return None
+
+        entries.append((fields[0], fields[1], number(2, int) or 1, number(3, float), number(4, float)))
+    return entries
+
+
+# 相同配置的端点池在多次执行之间共享，保留熔断和限流状态
+_pool_cache = LRUCache(maxsize=16, name="endpoint_pool")
+
+
+def build_endpoint_pool(entries, strategy="weighted_round_robin"):
+    """由端点列表构建端点池，同一API Key的端点共享限流器（取第一次出现时的限制）"""
+    limiters = {}
+    endpoints = []
+    for api_key, api_base_url, weight, qps, tpm in entries:
+        if api_key not in limiters:
+            limiters[api_key] = KeyLimiter(float(qps) if qps else None, float(tpm) if tpm else None)
+        endpoints.append(Endpoint(api_key, api_base_url, weight, limiters[api_key]))
+    return EndpointPool(endpoints, strategy)
+
+
+def get_endpoint_pool(config_text, strategy="weighted_round_robin"):
+    """返回配置文本对应的共享端点池，配置为空时返回None"""
+    key = ((config_text or "").strip(), strategy)
+    if not key[0]:
+        return None
+    return _pool_cache.get_or_create(key, lambda: build_endpoint_pool(parse_endpoint_config(key[0]), strategy))
@@ -0,0 +1,182 @@
+import os
+import logging
+import platform
+import threading
+from PIL import ImageFont
+
+from .cache_utils import LRUCache
+
+logger = logging.getLogger("font_utils")
+
+# 字体对象缓存的默认容量（每个条目是一个字体文件在某个字号下的FreeTypeFont对象）
+FONT_CACHE_SIZE = int(os.environ.get("IYUNYA_FONT_CACHE_SIZE", "256"))
+
+# 进程级共享字体缓存，键为 (解析后的字体路径, 字号, face索引)
+_font_cache = LRUCache(maxsize=FONT_CACHE_SIZE, name="font")
+
+
+# 各平台候选字体列表 (显示名称, 路径)，按优先级排序，中文字体优先
+FONT_CANDIDATES = {
+    "Windows": [
+        ("微软雅黑", "C:/Windows/Fonts/msyh.ttc"),
+        ("黑体", "C:/Windows/Fonts/simhei.ttf"),
+        ("宋体", "C:/Windows/Fonts/simsun.ttc"),
+        ("Arial", "C:/Windows/Fonts/arial.ttf"),
+    ],
+    "Darwin": [
+        ("苹方", "/System/Library/Fonts/PingFang.ttc"),
+        ("Helvetica", "/System/Library/Fonts/Helvetica.ttc"),
+        ("Arial", "/System/Library/Fonts/Arial.ttf"),
+    ],
+    "Linux": [
+        ("Noto Sans CJK", "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc"),
+        ("Noto Serif CJK", "/usr/share/fonts/truetype/noto/NotoSerifCJK-Regular.ttc"),
+        ("Noto Sans CJK (OpenType)", "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc"),
+        ("Noto Serif CJK (OpenType)", "/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc"),
+        ("文泉驿微米黑", "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc"),
+        ("文泉驿正黑", "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc"),
+        ("文鼎楷书", "/usr/share/fonts/truetype/arphic/ukai.ttc"),
+        ("文鼎明体", "/usr/share/fonts/truetype/arphic/uming.ttc"),
+        ("Japanese Gothic", "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf"),
+        ("Japanese Mincho", "/usr/share/fonts/truetype/fonts-japanese-mincho.ttf"),
+        # 系统可能的其他中文字体位置
+        ("苹方", "/System/Library/Fonts/PingFang.ttc"),
+        ("DejaVu Sans (TTF)", "/usr/share/fonts/TTF/DejaVuSans.ttf"),
+        ("Liberation Sans (System)", "/usr/share/fonts/liberation/LiberationSans-Regular.ttf"),
+        # 备用西文字体
+        ("DejaVu Sans", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
+        ("Liberation Sans", "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf"),
+    ],
+}
+
+# 字体发现结果，每个进程只扫描一次，直到显式调用invalidate_font_discovery
+_discovery_lock = threading.Lock()
+_available_fonts = None
+_user_font_paths = {}
+_resolved_paths = {}
+
+
+def get_font_candidates(system=None):
+    """返回当前平台的候选字体列表 (显示名称, 路径)"""
+    system = system or platform.system()
+    return list(FONT_CANDIDATES.get(system, FONT_CANDIDATES["Linux"]))
+
+
+def _validate_font(path):
+    """检查字体文件是否存在且能被FreeType正常加载"""
+    if not os.path.exists(path):
+        return False
+    try:
+        load_font(path, 16)
+        return True
+    except Exception as e:
+        logger.warning(f"字体文件无法加载：{path} ({str(e)})")
+        return False
+
+
+def _scan_fonts():
+    """扫描候选字体，返回已验证可用的 (显示名称, 路径) 列表"""
+    system = platform.system()
+    available = [(name, path) for name, path in get_font_candidates(system) if _validate_font(path)]
+
+    if available:
+        logger.info(f"检测到可用字体: {available[0][1]}（共{len(available)}个）")
+    else:
+        logger.warning(f"在{system}系统上未找到可用的中文字体")
+        if system == "Linux":
+            logger.warning("建议安装中文字体包:")
+            logger.warning("sudo apt-get install fonts-noto-cjk fonts-wqy-microhei fonts-wqy-zenhei")
+            logger.warning("或者: sudo apt-get install fonts-arphic-ukai fonts-arphic-uming")
+    return available
+
+
+def get_available_fonts():
+    """返回已验证可用的系统字体列表 (显示名称, 路径)，首次调用时扫描"""
+    global _available_fonts
+    fonts = _available_fonts
+    if fonts is None:
+        with _discovery_lock:
+            if _available_fonts is None:
+                _available_fonts = _scan_fonts()
+            fonts = _available_fonts
+    return list(fonts)
+
+
+def get_default_font_path():
+    """返回优先级最高的可用系统字体路径，没有可用字体时返回None"""
+    fonts = get_available_fonts()
+    return fonts[0][1] if fonts else None
+
+
+def resolve_user_font(font_path):
+    """
+    检查用户指定的字体路径是否存在且能被正常加载，结果按路径缓存
+
+    返回可用的路径，不可用时返回None（调用方回退到默认字体）
+    """
+    if not font_path:
+        return None
+    cached = _user_font_paths.get(font_path)
+    if cached is None:
+        cached = font_path if _validate_font(font_path) else ""
+        _user_font_paths[font_path] = cached
+    return cached or None
+
+
+def find_font_path(font_path=""):
+    """优先返回用户指定的字体，否则返回默认系统字体路径"""
+    return resolve_user_font(font_path) or get_default_font_path()
+
+
+def invalidate_font_discovery():
+    """使字体发现结果失效，下次访问时重新扫描"""
+    global _available_fonts
+    with _discovery_lock:
+        _available_fonts = None
+        _user_font_paths.clear()
+        _resolved_paths.clear()
+
+
+def rescan_fonts():
+    """立即重新扫描系统字体并返回结果"""
+    invalidate_font_discovery()
+    return get_available_fonts()
+
+
+def resolve_font_path(font_path):
+    """解析字体路径为绝对真实路径，保证同一文件的不同写法共享缓存"""
+    resolved = _resolved_paths.get(font_path)
+    if resolved is None:
+        resolved = os.path.realpath(os.path.expanduser(font_path))
+        _resolved_paths[font_path] = resolved
+    return resolved
+
+
+def load_font(font_path, font_size, index=0):
+    """
+    从共享缓存中获取字体对象，未命中时才调用ImageFont.truetype加载
+
+    font_path为None或空时返回PIL默认字体
+    """
+    if not font_path:
+        return _font_cache.get_or_create(("<default>", 0, 0), ImageFont.load_default)
+
+    key = (resolve_font_path(font_path), int(font_size), int(index))
+    return _font_cache.get_or_create(
+        key, lambda: ImageFont.truetype(key[0], key[1], index=key[2])
+    )
+
+
+def get_font_cache_stats():
+    """返回字体缓存的命中统计"""
+    return _font_cache.stats()
+
+
+def set_font_cache_size(maxsize):
+    """调整字体缓存容量"""
+    _font_cache.resize(maxsize)
+
+
+def clear_font_cache():
+    """清空字体缓存"""
+    _font_cache.clear()
@@ -0,0 +1,99 @@
+import numpy as np
+import torch
+from PIL import Image
+
+# ComfyUI的IMAGE类型约定：[batch, height, width, channels]的float32张量，取值范围[0, 1]
+# MASK类型约定：[batch, height, width]的float32张量，取值范围[0, 1]
+
+_SCALE_TO_UINT8 = np.float32(255.0)
+_SCALE_TO_FLOAT = np.float32(1.0 / 255.0)
+
+
+def tensor_to_uint8(tensor, out=None, kind="IMAGE"):
+    """
+    将IMAGE/MASK张量整批转换为uint8数组，不扫描数值范围
+
+    kind为张量的ComfyUI类型（"IMAGE"或"MASK"），据此判断是否带batch维度：
+    IMAGE为[B, H, W, C]（单张[H, W, C]），MASK为[B, H, W]（单张[H, W]）。
+    按ComfyUI约定直接映射[0, 1] -> [0, 255]（与内置SaveImage一致：先截断再取整）。
+    out可传入预分配的uint8数组以复用内存；逐帧使用一块float32临时缓冲区，
+    避免为整批数据创建浮点副本。
+    """
+    frame_dims = {"IMAGE": 3, "MASK": 2}.get(kind)
+    if frame_dims is None:
+        raise ValueError(f"不支持的张量类型: {kind}，只支持 'IMAGE' 或 'MASK'")
+    if tensor.dim() == frame_dims:
+        # 单张图像或遮罩，补齐batch维度
+        tensor = tensor.unsqueeze(0)
+    elif tensor.dim() != frame_dims + 1:
+        raise ValueError(f"{kind}张量的维度应为{frame_dims}或{frame_dims + 1}，实际为{tensor.dim()}")
+
+    array = tensor.detach().cpu().numpy()
+    if array.dtype == np.uint8:
+        return array
+
+    if out is None:
+        out = np.empty(array.shape, dtype=np.uint8)
+    scratch = np.empty(array.shape[1:], dtype=np.float32)
+    for i in range(array.shape[0]):
+        np.multiply(array[i], _SCALE_TO_UINT8, out=scratch, casting='unsafe')
+        np.clip(scratch, 0, _SCALE_TO_UINT8, out=scratch)
+        np.copyto(out[i], scratch, casting='unsafe')
+    return out
+
+
+def tensor_to_pil_list(tensor, kind="IMAGE"):
+    """将IMAGE/MASK张量整批转换为PIL图像列表，kind含义见tensor_to_uint8"""
+    array = tensor_to_uint8(tensor, kind=kind)
+    if array.ndim == 4 and array.shape[-1] == 1:
+        array = array[..., 0]
+    return [Image.fromarray(array[i]) for i in range(array.shape[0])]
+
+
+def pil_list_to_tensor(pil_images, out=None):
+    """
+    将PIL图像列表整批转换为IMAGE/MASK张量
+
+    结果直接写入预分配的float32数组（可通过out传入复用），每帧只做一次uint8视图到
+    float32的转换，不产生中间副本。RGB图像得到[B, H, W, 3]，L图像得到[B, H, W]。
+    """
+    first = np.asarray(pil_images[0])
+    shape = (len(pil_images),) + first.shape
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+    for i, pil_image in enumerate(pil_images):
+        frame = first if i == 0 else np.asarray(pil_image)
+        np.multiply(frame, _SCALE_TO_FLOAT, out=out[i], casting='unsafe')
+    return torch.from_numpy(out)
+
+
+def uint8_to_tensor(array):
+    """将uint8数组（[B, H, W, C]或[B, H, W]）转换为float32张量"""
+    out = np.empty(array.shape, dtype=np.float32)
+    np.multiply(array, _SCALE_TO_FLOAT, out=out, casting='unsafe')
+    return torch.from_numpy(out)
+
+
+def composite_layer(frame, layer, opacity=1.0):
+    """
+    将RGBA图层一次性alpha合成到float32图像帧 [H, W, C]（原地修改）
+
+    图层为straight alpha（PIL在透明RGBA图层上绘制的结果），整体透明度由opacity控制。
+    只处理图层中非透明像素的包围盒区域。
+    """
+    if opacity <= 0:
+        return frame
+    bbox = layer.getbbox(alpha_only=True)
+    if bbox is None:
+        return frame
+    x1, y1, x2, y2 = bbox
+    region = np.asarray(layer.crop(bbox), dtype=np.float32)
+    alpha = region[..., 3:4] * np.float32(opacity / 255.0)
+    target = frame[y1:y2, x1:x2, :3]
+    # target = target * (1 - alpha) + rgb * alpha
+    rgb = region[..., :3]
+    rgb *= _SCALE_TO_FLOAT
+    rgb -= target
+    rgb *= alpha
+    target += rgb
+    return frame
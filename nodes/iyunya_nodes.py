@@ -1,5 +1,6 @@
 import os
 import json
+import asyncio
 from aiohttp import web
 import uuid
 import logging
@@ -7,120 +8,43 @@ from server import PromptServer
 # 导入主节点映射
 import nodes as comfy_nodes
 
+from .node_store import NodeConfigStore
+from .node_registry import NodeRegistry, IyunyaInNode, IyunyaOutNode, get_default_value_for_type
+from .node_service import NodeService, NODE_LIST_FIELDS, default_node_name, etag_matches
+
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("iyunya_nodes")
 
-# 全局存储所有动态创建的节点
-DYNAMIC_NODE_CLASSES = {}
+# 动态节点注册表，节点类在注册时创建为空壳，INPUT_TYPES等类属性在首次访问时才生成
+NODE_REGISTRY = NodeRegistry()
+
+# 全局存储所有动态创建的节点 {group: {node_id: 节点类}}
+DYNAMIC_NODE_CLASSES = NODE_REGISTRY.classes
 NODE_CLASS_MAPPINGS = {}
 NODE_DISPLAY_NAME_MAPPINGS = {}
 
+# 注册/删除节点时同步更新本地映射和ComfyUI主节点映射，确保能被/api/object_info识别
+NODE_REGISTRY.attach(NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS)
+NODE_REGISTRY.attach(comfy_nodes.NODE_CLASS_MAPPINGS, comfy_nodes.NODE_DISPLAY_NAME_MAPPINGS)
+
 # 节点配置保存路径
 # 当前文件的父级目录平行存储saved_nodes
 NODES_CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "saved_nodes")
 os.makedirs(NODES_CONFIG_DIR, exist_ok=True)
 
+# 所有节点配置保存在一个日志文件中，首次加载时自动迁移旧版每个节点一个JSON文件的目录结构
+NODE_STORE = NodeConfigStore(NODES_CONFIG_DIR)
 
-class IyunyaInNode:
-    """
-    动态创建的输入节点，具有可配置的输入和输出
-    """
-    
-    @classmethod
-    def INPUT_TYPES(cls):
-        # 从类属性获取动态输入类型
-        return cls._input_types if hasattr(cls, "_input_types") else {"required": {}}
-    
-    # 这些属性将在运行时动态设置
-    FUNCTION = "execute"
-    CATEGORY = "工作流/输入"
-    
-    def __init__(self):
-        pass
-    
-    def execute(self, **kwargs):
-        # 使用kwargs中的所有输入值作为输出
-        # 输出顺序基于RETURN_NAMES
-        result = []
-        for name in self.RETURN_NAMES:
-            if name in kwargs:
-                result.append(kwargs[name])
-            else:
-                # 如果输入中没有对应的值，提供一个默认值
-                # 基于输出类型
-                type_idx = self.RETURN_NAMES.index(name)
-                if type_idx < len(self.RETURN_TYPES):
-                    return_type = self.RETURN_TYPES[type_idx]
-                    result.append(get_default_value_for_type(return_type))
-                else:
-                    result.append(None)
-        
-        return tuple(result)
-
-
-class IyunyaOutNode:
-    """
-    动态创建的输出节点，用于接收和处理工作流中的输出
-    """
-    
-    @classmethod
-    def INPUT_TYPES(cls):
-        # 从类属性获取动态输入类型
-        return cls._input_types if hasattr(cls, "_input_types") else {"required": {}}
-    
-    # 这些属性将在运行时动态设置
-    FUNCTION = "execute"
-    CATEGORY = "工作流/输出"
-    OUTPUT_NODE = True  # 标记为输出节点，确保它的输入会被执行
-    
-    def __init__(self):
-        pass
-    
-    def execute(self, **kwargs):
-        # 收集输入数据
-        collected_data = []
-        
-        for name in self.RETURN_NAMES:
-            if name in kwargs:
-                collected_data.append({"name": name, "value": kwargs[name]})
-            else:
-                # 如果输入中没有对应的值，提供一个默认值
-                collected_data.append({"name": name, "value": None})
-                
-        # 获取节点的真实class_type
-        node_class_type = self.__class__.__name__
-        
-        # 返回带有UI数据的字典，使用真实class_type作为键
-        ui_result = {"ui": {node_class_type: collected_data}}
-        logger.info(f"ui_result: {ui_result}")
-        return ui_result
-
-
-def get_default_value_for_type(type_name):
-    """为不同类型返回默认值"""
-    type_defaults = {
-        "STRING": "",
-        "INT": 0,
-        "FLOAT": 0.0,
-        "BOOLEAN": False,
-        "COMBO": "",
-    }
-    return type_defaults.get(type_name, None)
+# 批量修改节点（同时提交给注册表和存储）和查询节点列表
+NODE_SERVICE = NodeService(NODE_REGISTRY, NODE_STORE)
 
 
 def save_node_config(node_id, config):
-    """保存节点配置到磁盘"""
+    """保存节点配置到磁盘（由存储的后台线程写入，不阻塞请求处理）"""
     try:
-        # 确保组目录存在
-        group = config.get("group", "in")
-        group_dir = os.path.join(NODES_CONFIG_DIR, group)
-        os.makedirs(group_dir, exist_ok=True)
-        
-        config_path = os.path.join(group_dir, f"{node_id}.json")
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        NODE_STORE.put(dict(config, id=node_id))
         return True
     except Exception as e:
         logger.error(f"保存节点配置失败: {str(e)}")
@@ -130,10 +54,7 @@ def save_node_config(node_id, config):
 def load_node_config(node_id, group="in"):
     """从磁盘加载节点配置"""
     try:
-        config_path = os.path.join(NODES_CONFIG_DIR, group, f"{node_id}.json")
-        if os.path.exists(config_path):
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        return NODE_STORE.get(group, node_id)
     except Exception as e:
         logger.error(f"加载节点配置失败: {str(e)}")
     return None
@@ -142,9 +63,7 @@ def load_node_config(node_id, group="in"):
 def delete_node_config(node_id, group="in"):
     """从磁盘删除节点配置"""
     try:
-        config_path = os.path.join(NODES_CONFIG_DIR, group, f"{node_id}.json")
-        if os.path.exists(config_path):
-            os.remove(config_path)
+        NODE_STORE.delete(group, node_id)
         return True
     except Exception as e:
         logger.error(f"删除节点配置失败: {str(e)}")
@@ -166,113 +85,28 @@ def create_dynamic_node(config, save_to_disk=True):
         "name": "自定义节点名称"  # 可选
     }
     """
-    # 确定节点组和类型
-    group = config.get("group", "in")
-    if group not in ["in", "out"]:
-        raise ValueError(f"不支持的节点组类型: {group}，只支持 'in' 或 'out'")
-    
-    # 生成一个唯一的类名和ID
-    node_id = config.get("id", f"iyunya_{group}_{uuid.uuid4().hex[:8]}")
-    class_name = f"iyunya_{group}_{node_id}"
-    
-    # 准备输入类型
-    input_types = {"required": {}}
-    for param_name, param_type in config.get("inputs", {}).items():
-        if param_type == "STRING":
-            input_types["required"][param_name] = ("STRING", {"multiline": False, "default": ""})
-        elif param_type == "INT":
-            input_types["required"][param_name] = ("INT", {"default": 0, "min": -2147483648, "max": 2147483647})
-        elif param_type == "FLOAT":
-            input_types["required"][param_name] = ("FLOAT", {"default": 0.0, "min": -3.402823e+38, "max": 3.402823e+38})
-        elif param_type == "BOOLEAN":
-            input_types["required"][param_name] = (["True", "False"], {"default": "False"})
-        else:
-            # 默认作为字符串处理
-            input_types["required"][param_name] = ("STRING", {"multiline": False, "default": ""})
-    
-    # 基于组类型创建相应的节点类
-    if group == "in":
-        DynamicNodeClass = type(class_name, (IyunyaInNode,), {
-            "_input_types": input_types,
-            "RETURN_TYPES": tuple(config.get("inputs", {}).values()),
-            "RETURN_NAMES": tuple(config.get("inputs", {}).keys()),
-        })
-    else:  # out
-        DynamicNodeClass = type(class_name, (IyunyaOutNode,), {
-            "_input_types": input_types,
-            "RETURN_TYPES": (), # 输出节点不需要返回值
-            "RETURN_NAMES": tuple(config.get("inputs", {}).keys()),
-        })
-    
-    # 保存节点类到对应组
-    if group not in DYNAMIC_NODE_CLASSES:
-        DYNAMIC_NODE_CLASSES[group] = {}
-    DYNAMIC_NODE_CLASSES[group][node_id] = DynamicNodeClass
-    
-    # 注册节点
-    node_name = f"iyunya_{group}_{node_id}"
-    display_name = config.get("name", f"工作流{group == 'in' and '输入' or '输出'} {node_id}")
-    
-    # 添加到本地映射
-    NODE_CLASS_MAPPINGS[node_name] = DynamicNodeClass
-    NODE_DISPLAY_NAME_MAPPINGS[node_name] = display_name
-    
-    # 同时添加到ComfyUI主节点映射，确保能被/api/object_info识别
-    comfy_nodes.NODE_CLASS_MAPPINGS[node_name] = DynamicNodeClass
-    comfy_nodes.NODE_DISPLAY_NAME_MAPPINGS[node_name] = display_name
+    # 注册节点（组类型无效时抛出ValueError）
+    result = NODE_REGISTRY.register(config)
     
     # 保存配置到磁盘
     if save_to_disk:
         # 添加创建时间
         from datetime import datetime
         config["create_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        save_node_config(node_id, config)
+        save_node_config(result["id"], config)
     
-    logger.info(f"创建节点成功: {display_name} (ID: {node_id}, 组: {group})")
+    logger.info(f"创建节点成功: {result['display_name']} (ID: {result['id']}, 组: {result['group']})")
     
-    return {
-        "id": node_id,
-        "group": group,
-        "class_name": class_name,
-        "node_name": node_name,
-        "display_name": display_name
-    }
+    return result
 
 
 def remove_dynamic_node(node_id, group="in"):
     """删除一个动态节点"""
-    node_name = f"iyunya_{group}_{node_id}"
-    
-    # 检查节点是否存在
-    node_exists = (node_name in NODE_CLASS_MAPPINGS or 
-                   node_name in comfy_nodes.NODE_CLASS_MAPPINGS or 
-                   (group in DYNAMIC_NODE_CLASSES and node_id in DYNAMIC_NODE_CLASSES[group]))
-    
-    if not node_exists:
+    display_name = NODE_REGISTRY.unregister(group, node_id)
+    if display_name is None:
         logger.warning(f"尝试删除不存在的节点: {node_id} (组: {group})")
         return False
     
-    # 获取节点名称用于日志
-    display_name = NODE_DISPLAY_NAME_MAPPINGS.get(node_name, f"未知节点 ({node_id})")
-    
-    # 从本地映射中删除
-    if node_name in NODE_CLASS_MAPPINGS:
-        del NODE_CLASS_MAPPINGS[node_name]
-    
-    if node_name in NODE_DISPLAY_NAME_MAPPINGS:
-        del NODE_DISPLAY_NAME_MAPPINGS[node_name]
-    
-    # 从ComfyUI主节点映射中删除
-    if node_name in comfy_nodes.NODE_CLASS_MAPPINGS:
-        del comfy_nodes.NODE_CLASS_MAPPINGS[node_name]
-    
-    if node_name in comfy_nodes.NODE_DISPLAY_NAME_MAPPINGS:
-        del comfy_nodes.NODE_DISPLAY_NAME_MAPPINGS[node_name]
-    
-    # 从动态节点类映射中删除
-    if group in DYNAMIC_NODE_CLASSES and node_id in DYNAMIC_NODE_CLASSES[group]:
-        del DYNAMIC_NODE_CLASSES[group][node_id]
-    
     # 从磁盘删除配置
     delete_node_config(node_id, group)
     
@@ -282,37 +116,15 @@ def remove_dynamic_node(node_id, group="in"):
 
 
 def load_all_saved_nodes():
-    """加载所有保存的节点配置"""
+    """
+    加载所有保存的节点配置
+    
+    整个存储文件一次读入后批量注册空壳节点类，不逐个生成INPUT_TYPES，也不逐个输出日志
+    """
     try:
-        if not os.path.exists(NODES_CONFIG_DIR):
-            return
-
-        loaded_count = 0
-        # 加载所有组下的节点
-        for group in ["in", "out"]:
-            group_dir = os.path.join(NODES_CONFIG_DIR, group)
-            if os.path.exists(group_dir):
-                # 收集所有节点配置和创建时间
-                node_configs = []
-                for filename in os.listdir(group_dir):
-                    if filename.endswith('.json'):
-                        node_id = os.path.splitext(filename)[0]
-                        config = load_node_config(node_id, group)
-                        if config:
-                            # 如果没有创建时间，设置一个默认值确保排序不会出错
-                            if "create_time" not in config:
-                                config["create_time"] = "2000-01-01 00:00:00"
-                            node_configs.append(config)
-                
-                # 按创建时间排序
-                node_configs.sort(key=lambda x: x.get("create_time", "2000-01-01 00:00:00"))
-                
-                # 按排序后的顺序创建节点
-                for config in node_configs:
-                    create_dynamic_node(config, save_to_disk=False)  # 不重复保存
-                    loaded_count += 1
-        
-        logger.info(f"已加载 {loaded_count} 个持久化动态节点")
+        configs = [config for config in NODE_STORE.load() if config.get("group", "in") in ["in", "out"]]
+        NODE_REGISTRY.register_many(configs)
+        logger.info(f"已加载 {len(configs)} 个持久化动态节点")
     except Exception as e:
         logger.error(f"加载保存的节点时出错: {str(e)}")
 
@@ -331,11 +143,20 @@ async def api_create_iyunya_node(request):
                 "message": f"不支持的节点组类型: {group}，只支持 'in' 或 'out'"
             }, status=400)
         
+        node_id = data.get("id") or uuid.uuid4().hex[:8]
+        name = data.get("name", default_node_name(group))
+        if not isinstance(node_id, (str, int)) or isinstance(node_id, bool) or not isinstance(name, str):
+            return web.json_response({
+                "status": "failed",
+                "message": "节点ID必须是字符串或整数，name必须是字符串"
+            }, status=400)
+        
+        # ID统一保存为字符串，与批量接口一致
         config = {
-            "id": data.get("id", uuid.uuid4().hex[:8]),
+            "id": str(node_id),
             "group": group,
             "inputs": data.get("inputs", {}),
-            "name": data.get("name", f"动态{group == 'in' and '输入' or '输出'}节点")
+            "name": name
         }
         
         logger.info(f"收到创建节点请求: {config['name']} (组: {group})")
@@ -359,6 +180,62 @@ async def api_create_iyunya_node(request):
         }, status=500)
 
 
+# 需在 /api/iyunya/node/{node_id} 之前注册，否则 "list" 会被当作节点ID匹配
+@PromptServer.instance.routes.get("/api/iyunya/node/list")
+async def api_list_iyunya_nodes(request):
+    """
+    获取节点列表
+    
+    查询参数: group, prefix, fields（逗号分隔）, offset, limit。
+    响应带ETag，请求头If-None-Match匹配时返回304
+    """
+    try:
+        group = request.query.get("group", None)
+        if group is not None and group not in ["in", "out"]:
+            return web.json_response({
+                "status": "failed", 
+                "message": f"不支持的节点组类型: {group}，只支持 'in' 或 'out'"
+            }, status=400)
+        
+        fields = [field.strip() for field in request.query.get("fields", "").split(",") if field.strip()]
+        unknown = [field for field in fields if field not in NODE_LIST_FIELDS]
+        if unknown:
+            return web.json_response({
+                "status": "failed",
+                "message": f"不支持的字段: {', '.join(unknown)}，可选字段: {', '.join(NODE_LIST_FIELDS)}"
+            }, status=400)
+        
+        try:
+            offset = int(request.query.get("offset", 0))
+            limit = int(request.query.get("limit", 0))
+        except ValueError:
+            offset = limit = -1
+        if offset < 0 or limit < 0:
+            return web.json_response({
+                "status": "failed",
+                "message": "offset和limit必须是非负整数"
+            }, status=400)
+        
+        etag, body = NODE_SERVICE.node_list(group, request.query.get("prefix", ""), fields, offset, limit)
+        # no-cache让浏览器每次都带If-None-Match重新验证，节点未变化时只返回304
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        
+        if etag_matches(etag, request.headers.get("If-None-Match", "")):
+            return web.Response(status=304, headers=headers)
+        
+        logger.debug(f"返回节点列表{group and '（组: ' + group + '）' or ''}")
+        return web.Response(text=body, content_type="application/json", headers=headers)
+    
+    except Exception as e:
+        import traceback
+        logger.error(f"获取节点列表失败: {str(e)}\n{traceback.format_exc()}")
+        return web.json_response({
+            "status": "failed",
+            "message": str(e),
+            "traceback": traceback.format_exc()
+        }, status=500)
+
+
 @PromptServer.instance.routes.get("/api/iyunya/node/{node_id}")
 async def api_get_iyunya_node(request):
     try:
@@ -460,71 +337,44 @@ async def api_delete_iyunya_node(request):
         }, status=500)
 
 
-@PromptServer.instance.routes.get("/api/iyunya/node/list")
-async def api_list_iyunya_nodes(request):
+@PromptServer.instance.routes.post("/api/iyunya/node/batch")
+async def api_batch_iyunya_nodes(request):
+    """
+    批量创建/更新/删除节点
+    
+    请求体: {"operations": [{"action": "create"|"update"|"delete", "id", "group", "inputs", "name"}, ...],
+            "atomic": true}
+    """
     try:
-        group = request.query.get("group", None)
-        
-        logger.info(f"请求节点列表{group and '（组: ' + group + '）' or ''}")
+        data = await request.json()
+        operations = data.get("operations") if isinstance(data, dict) else data
+        if not isinstance(operations, list):
+            return web.json_response({
+                "status": "failed",
+                "message": "operations必须是操作项数组"
+            }, status=400)
+        atomic = bool(data.get("atomic", True)) if isinstance(data, dict) else True
         
-        # 列出指定组或所有组的动态节点
-        nodes = []
+        results, applied = NODE_SERVICE.apply_batch(operations, atomic)
+        failed = sum(1 for result in results if result["status"] == "failed")
         
-        # 如果指定了组，只查找该组
-        if group is not None:
-            if group not in ["in", "out"]:
-                return web.json_response({
-                    "status": "failed", 
-                    "message": f"不支持的节点组类型: {group}，只支持 'in' 或 'out'"
-                }, status=400)
-                
-            if group in DYNAMIC_NODE_CLASSES:
-                for node_id, node_class in DYNAMIC_NODE_CLASSES[group].items():
-                    node_name = f"iyunya_{group}_{node_id}"
-                    node_info = {
-                        "id": node_id,
-                        "group": group,
-                        "class_name": node_class.__name__,
-                        "node_name": node_name,
-                        "display_name": NODE_DISPLAY_NAME_MAPPINGS.get(node_name, "Unknown"),
-                    }
-                    
-                    # in类型的节点需要返回输出信息
-                    if hasattr(node_class, "RETURN_TYPES") and hasattr(node_class, "RETURN_NAMES"):
-                        node_info["return_types"] = node_class.RETURN_TYPES
-                        node_info["return_names"] = node_class.RETURN_NAMES
-                        
-                    nodes.append(node_info)
-        else:
-            # 查找所有组
-            for group_name, group_nodes in DYNAMIC_NODE_CLASSES.items():
-                for node_id, node_class in group_nodes.items():
-                    node_name = f"iyunya_{group_name}_{node_id}"
-                    node_info = {
-                        "id": node_id,
-                        "group": group_name,
-                        "class_name": node_class.__name__,
-                        "node_name": node_name,
-                        "display_name": NODE_DISPLAY_NAME_MAPPINGS.get(node_name, "Unknown"),
-                    }
-                    
-                    # in类型的节点需要返回输出信息
-                    if hasattr(node_class, "RETURN_TYPES") and hasattr(node_class, "RETURN_NAMES"):
-                        node_info["return_types"] = node_class.RETURN_TYPES
-                        node_info["return_names"] = node_class.RETURN_NAMES
-                        
-                    nodes.append(node_info)
+        if applied:
+            # 等待本批修改写入磁盘（一次追加、一次fsync），不阻塞事件循环
+            await asyncio.get_running_loop().run_in_executor(None, NODE_STORE.flush)
         
-        logger.info(f"返回节点列表，共 {len(nodes)} 个节点")
+        logger.info(f"批量操作节点: 共 {len(results)} 项，失败 {failed} 项，"
+                    f"{'已应用' if applied else '未应用任何修改'}（注册表版本: {NODE_REGISTRY.version}）")
         
         return web.json_response({
-            "status": "success",
-            "nodes": nodes
-        })
+            "status": "success" if applied and not failed else ("partial" if applied else "failed"),
+            "applied": applied,
+            "version": NODE_REGISTRY.version,
+            "results": results
+        }, status=200 if applied else 400)
     
     except Exception as e:
         import traceback
-        logger.error(f"获取节点列表失败: {str(e)}\n{traceback.format_exc()}")
+        logger.error(f"批量操作节点失败: {str(e)}\n{traceback.format_exc()}")
         return web.json_response({
             "status": "failed",
             "message": str(e),
@@ -559,8 +409,8 @@ default_out_node_config = {
 load_all_saved_nodes()
 
 # 确保默认节点存在（如果不存在则创建）
-if "in" not in DYNAMIC_NODE_CLASSES or len(DYNAMIC_NODE_CLASSES["in"]) == 0:
+if NODE_REGISTRY.count("in") == 0:
     create_dynamic_node(default_in_node_config)
 
-if "out" not in DYNAMIC_NODE_CLASSES or len(DYNAMIC_NODE_CLASSES["out"]) == 0:
+if NODE_REGISTRY.count("out") == 0:
     create_dynamic_node(default_out_node_config)
\ No newline at end of file
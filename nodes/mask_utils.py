@@ -0,0 +1,116 @@
+import numpy as np
+import torch
+import cv2
+
+from .ocr_result import OCRFrame
+
+
+def split_boxes_and_polygons(ocr_results):
+    """
+    从OCR结果中提取矩形框和多边形
+
+    bbox_2d为4个数时视为矩形 [x1, y1, x2, y2]；为8个及以上的偶数个数，或提供了
+    polygon字段（[[x, y], ...]）时视为多边形。返回 ((N, 4) float32数组, 多边形列表)
+    """
+    boxes = []
+    polygons = []
+    for result in ocr_results:
+        polygon = result.get("polygon")
+        bbox = result.get("bbox_2d")
+        try:
+            if polygon:
+                points = np.asarray(polygon, dtype=np.float32).reshape(-1, 2)
+                if len(points) >= 3:
+                    polygons.append(points)
+                continue
+            if bbox is None or len(bbox) < 4:
+                continue
+            if len(bbox) >= 8 and len(bbox) % 2 == 0:
+                polygons.append(np.asarray(bbox, dtype=np.float32).reshape(-1, 2))
+            else:
+                # 在这里逐项转换为数值，模型返回的非数值坐标只跳过该项，不影响整批
+                box = [float(value) for value in bbox[:4]]
+                if np.isfinite(box).all():
+                    boxes.append(box)
+        except (TypeError, ValueError):
+            continue
+    box_array = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return box_array, polygons
+
+
+def clip_boxes(boxes, height, width, dilate=0):
+    """
+    将 (N, 4) 框数组外扩dilate像素并裁剪到图像范围内，转换为切片用的整数坐标
+
+    返回的右/下边界为开区间（与PIL rectangle包含端点的行为一致，即x2+1），
+    并去掉面积为0的框
+    """
+    if len(boxes) == 0:
+        return np.zeros((0, 4), dtype=np.int64)
+    boxes = np.asarray(boxes, dtype=np.float32)
+    x1 = np.minimum(boxes[:, 0], boxes[:, 2]) - dilate
+    y1 = np.minimum(boxes[:, 1], boxes[:, 3]) - dilate
+    x2 = np.maximum(boxes[:, 0], boxes[:, 2]) + dilate + 1
+    y2 = np.maximum(boxes[:, 1], boxes[:, 3]) + dilate + 1
+    clipped = np.stack([
+        np.clip(np.floor(x1), 0, width),
+        np.clip(np.floor(y1), 0, height),
+        np.clip(np.floor(x2), 0, width),
+        np.clip(np.floor(y2), 0, height),
+    ], axis=1).astype(np.int64)
+    keep = (clipped[:, 2] > clipped[:, 0]) & (clipped[:, 3] > clipped[:, 1])
+    return clipped[keep]
+
+
+def rasterize_frame(out, boxes, polygons=(), dilate=0, feather=0.0):
+    """
+    将框和多边形直接写入预分配的float32 mask帧 [H, W]
+
+    矩形框用差分图一次写入：每个框在四个角点上+1/-1，二维前缀和后覆盖计数大于0的像素即为框内，
+    耗时取决于框的外接区域面积，与框数量基本无关；多边形使用cv2.fillPoly填充；
+    feather>0时对结果做高斯羽化（sigma=feather像素）
+    """
+    height, width = out.shape
+    clipped = clip_boxes(boxes, height, width, dilate)
+    if len(clipped):
+        # 只在所有框的外接区域内计算差分图
+        left, top = clipped[:, 0].min(), clipped[:, 1].min()
+        right, bottom = clipped[:, 2].max(), clipped[:, 3].max()
+        x1, y1, x2, y2 = (clipped - [left, top, left, top]).T
+        diff = np.zeros((bottom - top + 1, right - left + 1), dtype=np.int32)
+        np.add.at(diff, (y1, x1), 1)
+        np.add.at(diff, (y1, x2), -1)
+        np.add.at(diff, (y2, x1), -1)
+        np.add.at(diff, (y2, x2), 1)
+        np.cumsum(diff, axis=0, out=diff)
+        np.cumsum(diff, axis=1, out=diff)
+        out[top:bottom, left:right][diff[:-1, :-1] > 0] = 1.0
+
+    if polygons:
+        contours = [np.round(points).astype(np.int32) for points in polygons]
+        cv2.fillPoly(out, contours, 1.0)
+        if dilate > 0:
+            cv2.polylines(out, contours, True, 1.0, thickness=int(dilate) * 2 + 1)
+
+    if feather > 0:
+        cv2.GaussianBlur(out, (0, 0), sigmaX=float(feather), dst=out)
+    return out
+
+
+def build_mask_batch(frame_results, height, width, dilate=0, feather=0.0):
+    """
+    为一批OCR结果构建MASK张量 [B, H, W]
+
+    frame_results为每帧一个OCR结果列表或OCRFrame（直接使用其框数组，不再解析结果项）；
+    所有帧写入同一块预分配的float32数组，转换为tensor时不再复制
+    """
+    masks = np.zeros((len(frame_results), height, width), dtype=np.float32)
+    for i, ocr_results in enumerate(frame_results):
+        if not ocr_results:
+            continue
+        if isinstance(ocr_results, OCRFrame):
+            boxes, polygons = ocr_results.mask_shapes()
+        else:
+            boxes, polygons = split_boxes_and_polygons(ocr_results)
+        rasterize_frame(masks[i], boxes, polygons, dilate, feather)
+    return torch.from_numpy(masks)
@@ -0,0 +1,272 @@
+import gc
+import uuid
+import logging
+import threading
+
+logger = logging.getLogger("node_registry")
+
+# 支持的节点组
+NODE_GROUPS = ("in", "out")
+
+
+def get_default_value_for_type(type_name):
+    """为不同类型返回默认值"""
+    type_defaults = {
+        "STRING": "",
+        "INT": 0,
+        "FLOAT": 0.0,
+        "BOOLEAN": False,
+        "COMBO": "",
+    }
+    return type_defaults.get(type_name, None)
+
+
+def build_input_types(config):
+    """根据节点配置的inputs生成INPUT_TYPES返回值"""
+    input_types = {"required": {}}
+    for param_name, param_type in config.get("inputs", {}).items():
+        if param_type == "STRING":
+            input_types["required"][param_name] = ("STRING", {"multiline": False, "default": ""})
+        elif param_type == "INT":
+            input_types["required"][param_name] = ("INT", {"default": 0, "min": -2147483648, "max": 2147483647})
+        elif param_type == "FLOAT":
+            input_types["required"][param_name] = ("FLOAT", {"default": 0.0, "min": -3.402823e+38, "max": 3.402823e+38})
+        elif param_type == "BOOLEAN":
+            input_types["required"][param_name] = (["True", "False"], {"default": "False"})
+        else:
+            # 默认作为字符串处理
+            input_types["required"][param_name] = ("STRING", {"multiline": False, "default": ""})
+    return input_types
+
+
+class _LazyNodeAttribute:
+    """
+    按需从节点配置生成的类属性
+
+    第一次被访问（/object_info调用INPUT_TYPES或执行器读取RETURN_TYPES）时才计算，
+    结果写入具体节点类的属性中，之后的访问不再经过描述符。没有配置的基类上访问时抛出AttributeError
+    """
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        config = owner.__dict__.get("_config")
+        if config is None:
+            raise AttributeError(self.name)
+        value = self.builder(owner, config)
+        setattr(owner, self.name, value)
+        return value
+
+
+class IyunyaInNode:
+    """
+    动态创建的输入节点，具有可配置的输入和输出
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        # 从类属性获取动态输入类型
+        return cls._input_types if hasattr(cls, "_input_types") else {"required": {}}
+
+    # 以下属性在首次访问时根据节点配置生成
+    _input_types = _LazyNodeAttribute(lambda cls, config: build_input_types(config))
+    RETURN_TYPES = _LazyNodeAttribute(lambda cls, config: tuple(config.get("inputs", {}).values()))
+    RETURN_NAMES = _LazyNodeAttribute(lambda cls, config: tuple(config.get("inputs", {}).keys()))
+
+    FUNCTION = "execute"
+    CATEGORY = "工作流/输入"
+
+    def __init__(self):
+        pass
+
+    def execute(self, **kwargs):
+        # 使用kwargs中的所有输入值作为输出
+        # 输出顺序基于RETURN_NAMES
+        result = []
+        for name in self.RETURN_NAMES:
+            if name in kwargs:
+                result.append(kwargs[name])
+            else:
+                # 如果输入中没有对应的值，提供一个默认值
+                # 基于输出类型
+                type_idx = self.RETURN_NAMES.index(name)
+                if type_idx < len(self.RETURN_TYPES):
+                    return_type = self.RETURN_TYPES[type_idx]
+                    result.append(get_default_value_for_type(return_type))
+                else:
+                    result.append(None)
+
+        return tuple(result)
+
+
+class IyunyaOutNode:
+    """
+    动态创建的输出节点，用于接收和处理工作流中的输出
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        # 从类属性获取动态输入类型
+        return cls._input_types if hasattr(cls, "_input_types") else {"required": {}}
+
+    # 以下属性在首次访问时根据节点配置生成
+    _input_types = _LazyNodeAttribute(lambda cls, config: build_input_types(config))
+    RETURN_TYPES = _LazyNodeAttribute(lambda cls, config: ())  # 输出节点不需要返回值
+    RETURN_NAMES = _LazyNodeAttribute(lambda cls, config: tuple(config.get("inputs", {}).keys()))
+
+    FUNCTION = "execute"
+    CATEGORY = "工作流/输出"
+    OUTPUT_NODE = True  # 标记为输出节点，确保它的输入会被执行
+
+    def __init__(self):
+        pass
+
+    def execute(self, **kwargs):
+        # 收集输入数据
+        collected_data = []
+
+        for name in self.RETURN_NAMES:
+            if name in kwargs:
+                collected_data.append({"name": name, "value": kwargs[name]})
+            else:
+                # 如果输入中没有对应的值，提供一个默认值
+                collected_data.append({"name": name, "value": None})
+
+        # 获取节点的真实class_type
+        node_class_type = self.__class__.__name__
+
+        # 返回带有UI数据的字典，使用真实class_type作为键
+        ui_result = {"ui": {node_class_type: collected_data}}
+        logger.info(f"ui_result: {ui_result}")
+        return ui_result
+
+
+_BASE_CLASSES = {"in": IyunyaInNode, "out": IyunyaOutNode}
+
+
+def node_name_for(group, node_id):
+    """节点在ComfyUI中注册的类型名"""
+    return f"iyunya_{group}_{node_id}"
+
+
+def default_display_name(group, node_id):
+    return f"工作流{group == 'in' and '输入' or '输出'} {node_id}"
+
+
+class NodeRegistry:
+    """
+    动态节点注册表（不依赖ComfyUI，可单独导入和测试）
+
+    注册时只创建一个携带配置的空壳类并写入映射表，INPUT_TYPES、RETURN_TYPES等在首次访问时才生成。
+    类对象本身在注册时就会创建：ComfyUI的NODE_CLASS_MAPPINGS是普通dict，/object_info和执行器直接遍历、
+    取值，映射表里必须是真正的类，所以延迟的只是类属性，不是类的创建。
+    attach的映射表（如ComfyUI的NODE_CLASS_MAPPINGS）与本地映射同步更新。
+    每次注册或删除后version递增，批量操作只递增一次，供列表接口等缓存判断失效
+    """
+
+    def __init__(self):
+        self.classes = {}           # {group: {node_id: 节点类}}
+        self.class_mappings = {}    # {node_name: 节点类}
+        self.display_names = {}     # {node_name: 显示名称}
+        self.version = 0
+        self._attached = []
+        self._lock = threading.RLock()
+
+    def attach(self, class_mappings, display_name_mappings):
+        """同步写入额外的映射表，已注册的节点立即写入"""
+        with self._lock:
+            self._attached.append((class_mappings, display_name_mappings))
+            class_mappings.update(self.class_mappings)
+            display_name_mappings.update(self.display_names)
+
+    def _build(self, config):
+        """创建节点空壳类，返回 (节点信息, 节点类)"""
+        group = config.get("group", "in")
+        if group not in NODE_GROUPS:
+            raise ValueError(f"不支持的节点组类型: {group}，只支持 'in' 或 'out'")
+        node_id = config.get("id", f"iyunya_{group}_{uuid.uuid4().hex[:8]}")
+        node_name = node_name_for(group, node_id)
+        node_class = type(node_name, (_BASE_CLASSES[group],), {"_config": config})
+        info = {
+            "id": node_id,
+            "group": group,
+            "class_name": node_name,
+            "node_name": node_name,
+            "display_name": config.get("name", default_display_name(group, node_id)),
+        }
+        return info, node_class
+
+    def apply_batch(self, configs=(), removals=()):
+        """
+        在一次加锁内删除和注册多个节点，映射表各更新一次，version只递增一次
+
+        removals为 (group, id) 列表，先于注册执行（同一节点可以先删除再重新创建）。
+        返回 (注册的节点信息列表, 每个删除项被删除节点的显示名称列表，不存在的为None)
+        """
+        # 批量创建上万个类时暂停循环垃圾回收，避免反复扫描新建的类对象
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            built = [self._build(config) for config in configs]
+        finally:
+            if gc_enabled:
+                gc.enable()
+        classes = {info["node_name"]: node_class for info, node_class in built}
+        names = {info["node_name"]: info["display_name"] for info, _ in built}
+        all_mappings = [(self.class_mappings, self.display_names)] + self._attached
+
+        with self._lock:
+            removed = []
+            for group, node_id in removals:
+                node_name = node_name_for(group, node_id)
+                exists = (node_name in self.class_mappings or
+                          node_id in self.classes.get(group, {}) or
+                          any(node_name in class_mappings for class_mappings, _ in self._attached))
+                if not exists:
+                    removed.append(None)
+                    continue
+                removed.append(self.display_names.get(node_name, f"未知节点 ({node_id})"))
+                for class_mappings, display_name_mappings in all_mappings:
+                    class_mappings.pop(node_name, None)
+                    display_name_mappings.pop(node_name, None)
+                self.classes.get(group, {}).pop(node_id, None)
+
+            for info, node_class in built:
+                self.classes.setdefault(info["group"], {})[info["id"]] = node_class
+            if classes:
+                for class_mappings, display_name_mappings in all_mappings:
+                    class_mappings.update(classes)
+                    display_name_mappings.update(names)
+
+            if built or any(name is not None for name in removed):
+                self.version += 1
+        return [info for info, _ in built], removed
+
+    def register_many(self, configs):
+        """批量注册节点，返回节点信息列表"""
+        return self.apply_batch(configs)[0]
+
+    def register(self, config):
+        """注册单个节点，返回节点信息"""
+        return self.register_many([config])[0]
+
+    def unregister(self, group, node_id):
+        """删除节点，返回被删除节点的显示名称，不存在时返回None"""
+        return self.apply_batch(removals=[(group, node_id)])[1][0]
+
+    def get_class(self, group, node_id):
+        """返回节点类，不存在时返回None"""
+        return self.classes.get(group, {}).get(node_id)
+
+    def get_config(self, group, node_id):
+        """返回节点的配置，不存在时返回None"""
+        node_class = self.get_class(group, node_id)
+        return node_class.__dict__.get("_config") if node_class is not None else None
+
+    def count(self, group):
+        return len(self.classes.get(group, {}))
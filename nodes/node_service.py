@@ -0,0 +1,199 @@
+import json
+import uuid
+import hashlib
+import logging
+from datetime import datetime
+
+from .cache_utils import LRUCache
+from .node_registry import NODE_GROUPS, node_name_for
+
+logger = logging.getLogger("node_service")
+
+# 批量操作支持的动作
+BATCH_ACTIONS = ["create", "update", "delete"]
+
+# 节点列表可返回的字段
+NODE_LIST_FIELDS = ["id", "group", "class_name", "node_name", "display_name", "return_types", "return_names"]
+
+
+def default_node_name(group):
+    """未指定名称时新建节点的名称"""
+    return f"动态{group == 'in' and '输入' or '输出'}节点"
+
+
+def etag_matches(etag, if_none_match):
+    """请求头If-None-Match中是否包含etag（或为*）"""
+    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+
+class NodeService:
+    """
+    动态节点的批量修改和列表查询（不依赖ComfyUI，可单独导入和测试）
+
+    修改同时提交给注册表（ComfyUI中的节点类）和存储（持久化的配置），API路由只负责解析请求和组织响应。
+    列表响应按注册表版本和查询参数缓存，节点变化后版本号递增，旧的缓存自然失效
+    """
+
+    def __init__(self, registry, store):
+        self.registry = registry
+        self.store = store
+        self._list_cache = LRUCache(maxsize=64, name="node_list")
+        # 实例标识，拼入ETag，避免重启后版本号相同但节点不同时误返回304
+        self._instance = uuid.uuid4().hex[:8]
+
+    def validate_batch_item(self, item, seen):
+        """
+        检查一个批量操作项，返回 (动作, 节点配置或None, (group, id))
+
+        配置格式有误、节点不存在（update/delete）或已存在（create）、同一批次中重复操作同一节点时抛出ValueError
+        """
+        if not isinstance(item, dict):
+            raise ValueError("操作项必须是对象")
+        action = item.get("action", "create")
+        if action not in BATCH_ACTIONS:
+            raise ValueError(f"不支持的操作: {action}，只支持 {'、'.join(BATCH_ACTIONS)}")
+        group = item.get("group", "in")
+        if group not in NODE_GROUPS:
+            raise ValueError(f"不支持的节点组类型: {group}，只支持 'in' 或 'out'")
+        inputs = item.get("inputs", {})
+        if not isinstance(inputs, dict) or not all(isinstance(v, str) for v in inputs.values()):
+            raise ValueError("inputs必须是 {参数名: 类型} 对象")
+        if "name" in item and not isinstance(item["name"], str):
+            raise ValueError("name必须是字符串")
+
+        node_id = item.get("id")
+        if action == "create" and not node_id:
+            node_id = uuid.uuid4().hex[:8]
+        if not node_id:
+            raise ValueError("缺少节点ID")
+        if not isinstance(node_id, (str, int)) or isinstance(node_id, bool):
+            raise ValueError("节点ID必须是字符串或整数")
+        key = (group, str(node_id))
+        if key in seen:
+            raise ValueError(f"同一批次中重复操作节点: {node_id} (组: {group})")
+
+        existing = self.registry.get_config(group, key[1])
+        if action == "create":
+            if existing is not None:
+                raise ValueError(f"节点已存在: {node_id} (组: {group})，修改请使用update")
+            config = {
+                "id": key[1],
+                "group": group,
+                "inputs": inputs,
+                "name": item.get("name", default_node_name(group)),
+            }
+        elif existing is None:
+            raise ValueError(f"节点不存在: {node_id} (组: {group})")
+        elif action == "update":
+            # 原地更新：只替换提供的字段，保留创建时间等其他字段
+            config = dict(existing)
+            if "inputs" in item:
+                config["inputs"] = inputs
+            if "name" in item:
+                config["name"] = item["name"]
+        else:
+            config = None
+        seen.add(key)
+        return action, config, key
+
+    def apply_batch(self, operations, atomic=True):
+        """
+        批量创建、原地更新和删除动态节点
+
+        先校验所有操作项：atomic为True时任何一项无效则不做任何修改，否则只应用有效的项。
+        有效的修改一次性提交给注册表（版本号只递增一次）和存储（同一次写入）。
+        返回 (每项的结果列表, 是否已应用)
+        """
+        results = []
+        valid = []
+        seen = set()
+        for index, item in enumerate(operations):
+            try:
+                action, config, key = self.validate_batch_item(item, seen)
+                valid.append((index, action, config, key))
+                results.append({"index": index, "action": action, "group": key[0], "id": key[1], "status": "pending"})
+            except ValueError as e:
+                action = item.get("action", "create") if isinstance(item, dict) else None
+                results.append({"index": index, "action": action, "status": "failed", "message": str(e)})
+
+        has_errors = len(valid) < len(results)
+        if has_errors and atomic:
+            for result in results:
+                if result["status"] == "pending":
+                    result["status"] = "skipped"
+            return results, False
+
+        create_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        configs = []
+        removals = []
+        for _, action, config, key in valid:
+            if action == "delete":
+                removals.append(key)
+            else:
+                if action == "create":
+                    config["create_time"] = create_time
+                configs.append(config)
+
+        infos, _ = self.registry.apply_batch(configs, removals)
+        self.store.apply_batch(configs, removals)
+
+        infos = iter(infos)
+        for index, action, config, key in valid:
+            result = results[index]
+            result["status"] = "success"
+            if action != "delete":
+                result["node"] = next(infos)
+        return results, True
+
+    def build_node_infos(self, version):
+        """返回注册表当前所有节点的信息列表（按组、创建顺序），每个注册表版本只构建一次"""
+        def build():
+            nodes = []
+            for group_name, group_nodes in self.registry.classes.items():
+                for node_id, node_class in group_nodes.items():
+                    node_name = node_name_for(group_name, node_id)
+                    nodes.append({
+                        "id": node_id,
+                        "group": group_name,
+                        "class_name": node_class.__name__,
+                        "node_name": node_name,
+                        "display_name": self.registry.display_names.get(node_name, "Unknown"),
+                        # in类型的节点需要返回输出信息
+                        "return_types": node_class.RETURN_TYPES,
+                        "return_names": node_class.RETURN_NAMES,
+                    })
+            return nodes
+        return self._list_cache.get_or_create(("all", version), build)
+
+    def node_list(self, group=None, prefix="", fields=None, offset=0, limit=0):
+        """
+        返回 (ETag, 响应JSON文本)，按注册表版本和查询参数缓存
+
+        group只返回指定组；prefix按ID或显示名称前缀过滤（旧配置中的ID和名称可能不是字符串，先转为字符串）；
+        fields选择返回的字段；offset/limit分页，limit为0时返回全部。total为过滤后、分页前的节点数
+        """
+        version = self.registry.version
+        key = (version, group, prefix, tuple(fields or ()), offset, limit)
+
+        def build():
+            nodes = self.build_node_infos(version)
+            if group is not None:
+                nodes = [node for node in nodes if node["group"] == group]
+            if prefix:
+                nodes = [node for node in nodes
+                         if str(node["id"]).startswith(prefix) or str(node["display_name"]).startswith(prefix)]
+            page = nodes[offset:offset + limit] if limit else nodes[offset:]
+            if fields:
+                page = [{field: node[field] for field in fields} for node in page]
+            body = json.dumps({
+                "status": "success",
+                "nodes": page,
+                "total": len(nodes),
+                "offset": offset,
+                "limit": limit,
+                "version": version
+            }, ensure_ascii=False)
+            digest = hashlib.sha1(repr(key[1:]).encode("utf-8")).hexdigest()[:12]
+            return f'"{self._instance}-{version}-{digest}"', body
+
+        return self._list_cache.get_or_create(key, build)
@@ -0,0 +1,369 @@
+import gc
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("node_store")
+
+# 存储文件名（位于saved_nodes目录下）
+STORE_FILENAME = "nodes.jsonl"
+
+# 日志中失效记录（被覆盖或删除）超过该数量且超过有效记录数时压缩重写
+COMPACT_MIN_GARBAGE = 256
+
+# 写入合并窗口（秒）：后台线程收到写入后等待该时间，把期间的所有修改合并为一次追加和一次fsync
+STORE_FLUSH_INTERVAL = float(os.environ.get("IYUNYA_STORE_FLUSH_INTERVAL", "0.05"))
+
+# 写入失败后的重试间隔（秒）
+STORE_RETRY_INTERVAL = 1.0
+
+# 进程退出时等待未写入修改落盘的最长时间（秒）
+STORE_EXIT_FLUSH_TIMEOUT = 10.0
+
+# 旧版目录结构中的节点组
+LEGACY_GROUPS = ("in", "out")
+
+
+def _dump_record(record):
+    """序列化一条日志记录为一行紧凑JSON"""
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _fsync_directory(path):
+    """同步目录项，保证os.replace后的文件名在断电后依然有效（Windows不支持，忽略）"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path, text):
+    """先写入同目录下的临时文件并fsync，再用os.replace原子替换目标文件"""
+    directory = os.path.dirname(path) or "."
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8", newline="\n") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    _fsync_directory(directory)
+
+
+class NodeConfigStore:
+    """
+    所有动态节点配置保存在一个追加写的JSONL日志文件中
+
+    每行一条记录：{"op": "put", "group", "id", "config"} 或 {"op": "del", "group", "id"}，
+    一次写入多条记录时合并为一行 {"op": "batch", "records": [...]}，整批要么完整写入要么被丢弃。
+    启动时一次读入整个文件重放到内存索引 {(group, id): config}，索引保持节点的创建顺序；
+    写入只追加完整的行，进程崩溃导致的不完整末行在加载时截掉。失效记录过多时压缩为只含有效记录的快照，
+    快照通过临时文件和os.replace原子替换。
+
+    put/delete立即更新内存索引后返回，记录由后台线程写入（write-behind）：合并窗口内的修改
+    合并为一次追加和一次fsync，同一节点的多次修改只写最后一次。flush等待所有修改落盘，进程退出时自动调用
+    """
+
+    def __init__(self, directory, filename=STORE_FILENAME, flush_interval=STORE_FLUSH_INTERVAL):
+        self.directory = directory
+        self.path = os.path.join(directory, filename)
+        self.flush_interval = flush_interval
+        self._index = {}
+        self._records = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+        # 待写入的记录 {(group, id): [记录, ...]}，按首次修改的顺序排列
+        self._pending = OrderedDict()
+        self._writing = False
+        # 上一次追加失败且未能截断，文件末尾可能有不完整的行
+        self._torn = False
+        self._changed = threading.Condition(self._lock)
+        # 保证同一时间只有一个线程写文件（后台写入线程或压缩）
+        self._io_lock = threading.Lock()
+        self._writer = None
+        atexit.register(self.flush, STORE_EXIT_FLUSH_TIMEOUT)
+
+    def load(self):
+        """加载存储文件（首次加载时从旧版目录结构迁移），返回按创建顺序排列的配置列表"""
+        with self._lock:
+            if not self._loaded:
+                os.makedirs(self.directory, exist_ok=True)
+                if not os.path.exists(self.path):
+                    self._migrate_legacy()
+                self._replay()
+                self._loaded = True
+                self._maybe_compact()
+            return list(self._index.values())
+
+    def _replay(self):
+        """一次读入整个日志并重放到索引"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+
+        # 末尾没有换行符说明最后一次写入被中断，截掉不完整的部分，避免后续追加的记录接在它后面
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            logger.warning("节点配置存储末尾有不完整的记录（可能是写入时进程中断），已丢弃")
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+            data = data[:end]
+
+        lines = data.decode("utf-8").splitlines()
+        # 解析大量配置时暂停循环垃圾回收，避免反复扫描新建的dict
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            records = self._parse_lines(lines)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        # 展开批量记录
+        records = [sub for record in records if isinstance(record, dict)
+                   for sub in (record.get("records") or [] if record.get("op") == "batch" else [record])]
+        index = {}
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            key = (record.get("group"), record.get("id"))
+            if record.get("op") == "del":
+                index.pop(key, None)
+            elif isinstance(record.get("config"), dict):
+                index[key] = record["config"]
+        self._index = index
+        self._records = len(records)
+
+    @staticmethod
+    def _parse_lines(lines):
+        """解析日志行，返回记录列表，跳过无法解析的行"""
+        try:
+            # 大多数情况下所有行都完整，拼成一个数组一次性解析
+            return json.loads("[" + ",".join(line for line in lines if line.strip()) + "]")
+        except json.JSONDecodeError:
+            records = []
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"节点配置存储第{number}行无法解析，已跳过")
+            return records
+
+    def _migrate_legacy(self):
+        """
+        一次性迁移旧版的 saved_nodes/<group>/<id>.json 文件
+
+        按create_time排序后写为快照，迁移完成后旧目录重命名为 <group>.migrated，不再读取
+        """
+        configs = []
+        migrated_dirs = []
+        for group in LEGACY_GROUPS:
+            group_dir = os.path.join(self.directory, group)
+            if not os.path.isdir(group_dir):
+                continue
+            migrated_dirs.append(group_dir)
+            for filename in sorted(os.listdir(group_dir)):
+                if not filename.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(group_dir, filename), "r", encoding="utf-8") as f:
+                        config = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"迁移节点配置失败，已跳过: {filename} ({str(e)})")
+                    continue
+                if not isinstance(config, dict):
+                    continue
+                config.setdefault("group", group)
+                config.setdefault("id", os.path.splitext(filename)[0])
+                config.setdefault("create_time", "2000-01-01 00:00:00")
+                configs.append(config)
+        if not migrated_dirs:
+            return
+
+        configs.sort(key=lambda config: config["create_time"])
+        atomic_write_text(self.path, "".join(
+            _dump_record({"op": "put", "group": c["group"], "id": c["id"], "config": c}) for c in configs
+        ))
+        for group_dir in migrated_dirs:
+            target = f"{group_dir}.migrated"
+            if not os.path.exists(target):
+                os.rename(group_dir, target)
+        logger.info(f"已将 {len(configs)} 个节点配置迁移到 {self.path}")
+
+    def _garbage(self):
+        return self._records - len(self._index)
+
+    def _append(self, records):
+        """
+        追加记录并同步到磁盘，多条记录合并为一行批量记录，一次写入、一次fsync
+
+        写入失败时把文件截回写入前的长度，避免重试的记录接在写了一半的行后面；
+        截断也失败时，下一次追加先写一个换行符，让残缺的部分单独成行，加载时作为无法解析的行跳过
+        """
+        data = _dump_record(records[0] if len(records) == 1 else {"op": "batch", "records": records})
+        if self._torn:
+            data = "\n" + data
+        # 不使用缓冲，失败时没有残留在缓冲区里、关闭文件时才写出的数据
+        with open(self.path, "ab", buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            try:
+                view = memoryview(data.encode("utf-8"))
+                while view:
+                    view = view[f.write(view):]
+                os.fsync(f.fileno())
+            except BaseException:
+                try:
+                    f.truncate(size)
+                    self._torn = False
+                except OSError:
+                    self._torn = True
+                raise
+        self._torn = False
+        with self._lock:
+            self._records += len(records)
+
+    def _maybe_compact(self):
+        with self._lock:
+            needed = self._garbage() > max(COMPACT_MIN_GARBAGE, len(self._index))
+        if needed:
+            self.compact()
+
+    @staticmethod
+    def _coalesce(pending, key, record):
+        """
+        将一条记录合并到待写入队列
+
+        连续的put只保留最后一次；delete会取代之前所有未写入的记录；delete之后再put时两条都保留，
+        并移到队尾，保证重放后的节点顺序与内存索引一致
+        """
+        records = pending.get(key)
+        if record["op"] == "put" and records and records[-1]["op"] == "put":
+            records[-1] = record
+            return
+        if record["op"] == "del":
+            records = []
+        else:
+            records = pending.get(key, [])
+        pending.pop(key, None)
+        pending[key] = records + [record]
+
+    def _enqueue(self, key, record):
+        """记录加入待写入队列并唤醒后台写入线程（调用方需持有锁）"""
+        self._coalesce(self._pending, key, record)
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._writer_loop, name="node_store_writer", daemon=True)
+            self._writer.start()
+        self._changed.notify_all()
+
+    def _writer_loop(self):
+        """后台写入线程：等待修改，合并窗口结束后一次性追加写入"""
+        while True:
+            with self._changed:
+                while not self._pending:
+                    self._changed.wait()
+            # 等待合并窗口，期间的修改一起写入
+            if self.flush_interval > 0:
+                time.sleep(self.flush_interval)
+            with self._changed:
+                pending, self._pending = self._pending, OrderedDict()
+                self._writing = True
+            batch = [record for records in pending.values() for record in records]
+            try:
+                with self._io_lock:
+                    self._append(batch)
+                self._maybe_compact()
+                logger.debug(f"节点配置已写入 {len(batch)} 条记录")
+            except Exception as e:
+                logger.error(f"写入节点配置失败，{STORE_RETRY_INTERVAL}秒后重试: {str(e)}")
+                with self._changed:
+                    # 失败的记录放回队首，之后的修改合并在其后
+                    for key, records in self._pending.items():
+                        for record in records:
+                            self._coalesce(pending, key, record)
+                    self._pending = pending
+                time.sleep(STORE_RETRY_INTERVAL)
+            finally:
+                with self._changed:
+                    self._writing = False
+                    self._changed.notify_all()
+
+    def flush(self, timeout=None):
+        """等待所有已提交的修改写入磁盘，返回是否在超时前完成"""
+        with self._changed:
+            return self._changed.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def get(self, group, node_id):
+        """返回节点配置，不存在时返回None"""
+        with self._lock:
+            self.load()
+            return self._index.get((group, node_id))
+
+    def configs(self, group=None):
+        """返回按创建顺序排列的配置列表，可只返回指定组"""
+        with self._lock:
+            self.load()
+            return [config for (g, _), config in self._index.items() if group is None or g == group]
+
+    def apply_batch(self, puts=(), deletes=()):
+        """
+        一次提交多个修改：puts为配置列表，deletes为 (group, id) 列表
+
+        所有修改在同一把锁内进入写入队列，保证由同一次追加写入（同一行批量记录），
+        重放时要么全部生效要么全部不生效
+        """
+        with self._lock:
+            self.load()
+            for group, node_id in deletes:
+                if self._index.pop((group, node_id), None) is not None:
+                    self._enqueue((group, node_id), {"op": "del", "group": group, "id": node_id})
+            for config in puts:
+                group, node_id = config.get("group", "in"), config["id"]
+                self._index[(group, node_id)] = config
+                self._enqueue((group, node_id), {"op": "put", "group": group, "id": node_id, "config": config})
+
+    def put(self, config):
+        """保存节点配置，已存在时原地更新（保持原有顺序）；不等待写入磁盘"""
+        group, node_id = config.get("group", "in"), config["id"]
+        with self._lock:
+            self.load()
+            self._index[(group, node_id)] = config
+            self._enqueue((group, node_id), {"op": "put", "group": group, "id": node_id, "config": config})
+
+    def delete(self, group, node_id):
+        """删除节点配置，返回是否存在；不等待写入磁盘"""
+        with self._lock:
+            self.load()
+            if (group, node_id) not in self._index:
+                return False
+            del self._index[(group, node_id)]
+            self._enqueue((group, node_id), {"op": "del", "group": group, "id": node_id})
+            return True
+
+    def compact(self):
+        """将日志重写为只含有效记录的快照"""
+        with self._io_lock:
+            with self._lock:
+                # 快照已包含所有未写入的修改，之后再写入这些记录也只是重复的幂等操作
+                records = [{"op": "put", "group": group, "id": node_id, "config": config}
+                           for (group, node_id), config in self._index.items()]
+            atomic_write_text(self.path, "".join(_dump_record(record) for record in records))
+            with self._lock:
+                self._records = len(records)
+            logger.debug(f"节点配置存储已压缩，共 {len(records)} 条记录")
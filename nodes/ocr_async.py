@@ -0,0 +1,139 @@
+import os
+import asyncio
+import inspect
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from .qwen_vl_client import CancelToken, RequestCancelled
+
+logger = logging.getLogger("ocr_async")
+
+# 后台执行OCR任务的线程数，即可以同时进行的OCR节点数
+OCR_ASYNC_WORKERS = int(os.environ.get("IYUNYA_OCR_ASYNC_WORKERS", "4"))
+
+# 等待结果期间检查ComfyUI中断标志的间隔（秒）
+INTERRUPT_POLL_INTERVAL = 0.1
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_ocr_executor():
+    """返回进程共享的OCR后台线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, OCR_ASYNC_WORKERS), thread_name_prefix="ocr_async")
+        return _executor
+
+
+def supports_async_nodes():
+    """当前ComfyUI是否支持协程节点（等待期间可以执行图中其他独立分支）"""
+    try:
+        import execution
+    except ImportError:
+        return False
+    return (hasattr(execution, "_async_map_node_over_list") or
+            inspect.iscoroutinefunction(getattr(execution, "get_output_data", None)))
+
+
+def interrupt_requested():
+    """用户是否在ComfyUI中中断了执行"""
+    try:
+        import comfy.model_management as model_management
+    except ImportError:
+        return False
+    return model_management.processing_interrupted()
+
+
+def raise_interrupted():
+    """抛出ComfyUI的中断异常，并清除中断标志"""
+    try:
+        import comfy.model_management as model_management
+    except ImportError:
+        raise RequestCancelled("OCR任务已取消")
+    model_management.throw_exception_if_processing_interrupted()
+    raise model_management.InterruptProcessingException()
+
+
+class ProgressReporter:
+    """线程安全的进度上报，通过ComfyUI的ProgressBar经PromptServer推送到前端"""
+
+    def __init__(self, total=1):
+        self.total = max(1, int(total))
+        self.completed = 0
+        self._lock = threading.Lock()
+        try:
+            import comfy.utils
+            # 需在节点执行的线程/协程中创建，才能关联到当前节点
+            self._bar = comfy.utils.ProgressBar(self.total)
+        except Exception:
+            self._bar = None
+
+    def set_total(self, total):
+        """任务开始后才知道总量时（如分块识别的图块数）重新设置总量"""
+        with self._lock:
+            self.total = max(1, int(total))
+            self._report()
+
+    def update(self, count=1):
+        with self._lock:
+            self.completed = min(self.total, self.completed + count)
+            self._report()
+
+    def _report(self):
+        if self._bar is not None:
+            try:
+                self._bar.update_absolute(self.completed, self.total)
+            except Exception as e:
+                logger.debug(f"进度上报失败：{str(e)}")
+
+
+def submit_cancellable(func, progress_total=1, **kwargs):
+    """
+    将func提交到后台线程池，返回 (future, 取消令牌)
+
+    func需接受cancel_token和progress关键字参数
+    """
+    token = CancelToken()
+    progress = ProgressReporter(progress_total)
+    future = get_ocr_executor().submit(func, cancel_token=token, progress=progress, **kwargs)
+    return future, token
+
+
+def run_cancellable(func, progress_total=1, **kwargs):
+    """在后台线程执行func并等待结果，期间用户中断时取消正在进行的请求"""
+    future, token = submit_cancellable(func, progress_total, **kwargs)
+    while True:
+        try:
+            return future.result(timeout=INTERRUPT_POLL_INTERVAL)
+        except FutureTimeoutError:
+            if interrupt_requested():
+                token.cancel()
+                logger.info("执行已中断，取消进行中的OCR请求")
+                raise_interrupted()
+
+
+async def run_cancellable_async(func, progress_total=1, **kwargs):
+    """
+    协程版本的run_cancellable：等待期间让出事件循环，ComfyUI可以执行其他独立分支
+
+    中断或协程被取消时取消正在进行的请求
+    """
+    future, token = submit_cancellable(func, progress_total, **kwargs)
+    wrapped = asyncio.wrap_future(future)
+    # 中断后不再等待结果，提前取走异常，避免事件循环报告未处理的异常
+    wrapped.add_done_callback(lambda f: f.cancelled() or f.exception())
+    try:
+        while True:
+            done, _ = await asyncio.wait({wrapped}, timeout=INTERRUPT_POLL_INTERVAL)
+            if done:
+                return wrapped.result()
+            if interrupt_requested():
+                token.cancel()
+                logger.info("执行已中断，取消进行中的OCR请求")
+                raise_interrupted()
+    except asyncio.CancelledError:
+        token.cancel()
+        raise
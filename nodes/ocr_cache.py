@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger("ocr_cache")
+
+# OCR结果缓存目录，与saved_nodes并列存放在插件目录中
+OCR_CACHE_DIR = os.environ.get(
+    "IYUNYA_OCR_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ocr_cache")
+)
+
+# 缓存容量上限
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get("IYUNYA_OCR_CACHE_MAX_ENTRIES", "10000"))
+OCR_CACHE_MAX_BYTES = int(os.environ.get("IYUNYA_OCR_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# 默认有效期（秒）
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+# 缓存格式版本，结果结构变化时递增以使旧缓存失效
+CACHE_FORMAT_VERSION = 1
+
+
+def compute_cache_key(pil_image, prompt, model, api_base_url, extra=None):
+    """
+    根据原始像素数据和请求参数计算内容寻址的缓存键
+
+    extra用于加入影响识别结果的其他参数（如上传编码方式）
+    """
+    hasher = hashlib.sha256()
+    hasher.update(f"v{CACHE_FORMAT_VERSION}|{pil_image.mode}|{pil_image.size[0]}x{pil_image.size[1]}|".encode("utf-8"))
+    hasher.update(pil_image.tobytes())
+    meta = {"prompt": prompt, "model": model, "api_base_url": api_base_url, "extra": extra or {}}
+    hasher.update(json.dumps(meta, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class OCRResultCache:
+    """
+    磁盘上的OCR结果缓存，按有效期和总大小/条目数淘汰最旧的条目
+    """
+
+    def __init__(self, cache_dir=OCR_CACHE_DIR, max_entries=OCR_CACHE_MAX_ENTRIES, max_bytes=OCR_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 内存索引 {key: (mtime, size)}，首次使用时扫描一次目录建立
+        self._index = None
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _path_for(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """扫描缓存目录建立索引（调用方持有锁）"""
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total_bytes = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    self._index[entry.name[:-5]] = (stat.st_mtime, stat.st_size)
+                    self._total_bytes += stat.st_size
+
+    def _remove(self, key):
+        """删除缓存条目（调用方持有锁）"""
+        mtime_size = self._index.pop(key, None)
+        if mtime_size is not None:
+            self._total_bytes -= mtime_size[1]
+        try:
+            os.remove(self._path_for(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """超出容量时按写入时间淘汰最旧的条目（调用方持有锁）"""
+        if len(self._index) <= self.max_entries and self._total_bytes <= self.max_bytes:
+            return
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1][0]):
+            if len(self._index) <= self.max_entries and self._total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+
+    def get(self, key, ttl_seconds=DEFAULT_TTL_SECONDS):
+        """读取缓存，过期或不存在时返回None"""
+        with self._lock:
+            self._load_index()
+            mtime_size = self._index.get(key)
+            if mtime_size is None:
+                self.misses += 1
+                return None
+            if ttl_seconds and time.time() - mtime_size[0] > ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+        try:
+            with open(self._path_for(key), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取OCR缓存失败：{str(e)}")
+            with self._lock:
+                self._remove(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """写入缓存，使用临时文件加原子替换，避免读到写了一半的文件"""
+        path = self._path_for(key)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            stat = os.stat(path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"写入OCR缓存失败：{str(e)}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        with self._lock:
+            self._load_index()
+            old = self._index.get(key)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._index[key] = (stat.st_mtime, stat.st_size)
+            self._total_bytes += stat.st_size
+            self._evict()
+        return True
+
+    def clear(self):
+        """删除所有缓存条目"""
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                self._remove(key)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            self._load_index()
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """返回进程共享的OCR结果缓存"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = OCRResultCache()
+        return _shared_cache
@@ -0,0 +1,112 @@
+import numpy as np
+
+from .bbox_utils import clip_pixel_boxes
+
+# 节点间直接传递识别结果的自定义类型名，避免JSON序列化/解析往返
+OCR_RESULT_TYPE = "OCR_RESULT"
+
+# 结果项中由OCRFrame单独存储的字段，其余字段（如自定义提示词返回的row/col）原样保留
+_CORE_FIELDS = ("bbox_2d", "text_content", "polygon")
+
+
+class OCRFrame:
+    """
+    单张图片的识别结果
+
+    boxes为 (N, 4) int32像素外接框（包含端点），texts为对应的文字列表；
+    polygons与boxes对齐，矩形框对应None；attributes保存结果项中的其他字段；
+    metadata保存status、model_used、cache_hit等整帧信息
+    """
+
+    __slots__ = ("boxes", "texts", "polygons", "attributes", "metadata")
+
+    def __init__(self, boxes=None, texts=None, polygons=None, attributes=None, metadata=None):
+        self.boxes = np.zeros((0, 4), dtype=np.int32) if boxes is None else np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        self.texts = list(texts or [])
+        count = len(self.boxes)
+        self.polygons = list(polygons) if polygons is not None else [None] * count
+        self.attributes = list(attributes) if attributes is not None else [None] * count
+        self.metadata = dict(metadata or {})
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @classmethod
+    def from_items(cls, items, boxes, metadata=None):
+        """由normalize_ocr_results返回的结果项和外接框数组构建"""
+        texts = []
+        polygons = []
+        attributes = []
+        for item in items:
+            texts.append(str(item.get("text_content", "")))
+            polygon = item.get("polygon")
+            bbox = item.get("bbox_2d") or []
+            if polygon:
+                polygons.append(np.asarray(polygon, dtype=np.int32).reshape(-1, 2))
+            elif len(bbox) >= 8:
+                polygons.append(np.asarray(bbox, dtype=np.int32).reshape(-1, 2))
+            else:
+                polygons.append(None)
+            extra = {key: value for key, value in item.items() if key not in _CORE_FIELDS}
+            attributes.append(extra or None)
+        return cls(boxes, texts, polygons, attributes, metadata)
+
+    def to_items(self):
+        """转换为 {"bbox_2d", "text_content", ...} 结果项列表"""
+        items = []
+        for box, text, polygon, extra in zip(self.boxes.tolist(), self.texts, self.polygons, self.attributes):
+            item = {"bbox_2d": box, "text_content": text}
+            if polygon is not None:
+                item["polygon"] = polygon.tolist()
+            if extra:
+                item.update(extra)
+            items.append(item)
+        return items
+
+    def clipped(self, width, height):
+        """返回裁剪到 width x height 图像范围内并去掉退化框后的结果"""
+        boxes, keep = clip_pixel_boxes(self.boxes, width, height)
+        if keep.all() and np.array_equal(boxes, self.boxes):
+            return self
+        indices = np.flatnonzero(keep).tolist()
+        return OCRFrame(
+            boxes[keep],
+            [self.texts[i] for i in indices],
+            [self.polygons[i] for i in indices],
+            [self.attributes[i] for i in indices],
+            self.metadata,
+        )
+
+    def mask_shapes(self):
+        """返回 (矩形框float32数组, 多边形点数组列表)，供mask_utils栅格化"""
+        is_rect = np.fromiter((p is None for p in self.polygons), dtype=bool, count=len(self.polygons))
+        polygons = [p.astype(np.float32) for p in self.polygons if p is not None and len(p) >= 3]
+        return self.boxes[is_rect].astype(np.float32), polygons
+
+
+class OCRResult:
+    """OCR_RESULT类型的值：一批图片的识别结果，每张图片一个OCRFrame"""
+
+    __slots__ = ("frames",)
+
+    def __init__(self, frames=None):
+        self.frames = list(frames or [])
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    @property
+    def total_detections(self):
+        return sum(len(frame) for frame in self.frames)
+
+    def frames_for_batch(self, batch_size):
+        """返回与图片批次一一对应的帧列表：单帧结果广播到整批，数量不一致时截断或补空"""
+        if len(self.frames) == 1:
+            return self.frames * batch_size
+        return (self.frames + [OCRFrame() for _ in range(batch_size)])[:batch_size]
@@ -0,0 +1,93 @@
+import json
+import logging
+
+logger = logging.getLogger("ocr_stream_parser")
+
+
+def is_ocr_item(data):
+    """判断解析出的对象是否为有效的OCR结果项"""
+    return isinstance(data, dict) and "bbox_2d" in data and "text_content" in data
+
+
+class IncrementalOCRParser:
+    """
+    增量JSON解析器：逐段喂入模型输出的文本，每当一个完整的
+    {"bbox_2d": ..., "text_content": ...} 对象结束时立即返回
+
+    不要求整体是合法JSON，可以处理markdown代码块、前后说明文字、
+    嵌套对象以及被包在外层对象中的结果数组
+    """
+
+    _PAIRS = {"}": "{", "]": "["}
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        # 未闭合的括号栈，元素为 (括号字符, 在_text中的起始位置)
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self.items_emitted = 0
+
+    def feed(self, chunk):
+        """喂入一段文本，返回本段中新完成的OCR结果项列表"""
+        if not chunk:
+            return []
+        self._text += chunk
+        items = []
+        text = self._text
+        i = self._pos
+        length = len(text)
+        while i < length:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                # 括号外的引号属于说明文字，不参与解析
+                if self._stack:
+                    self._in_string = True
+            elif ch in "{[":
+                self._stack.append((ch, i))
+            elif ch in "}]":
+                if not self._stack or self._stack[-1][0] != self._PAIRS[ch]:
+                    # 括号不匹配（说明文字中的孤立括号），重置状态
+                    self._stack = []
+                else:
+                    _, start = self._stack.pop()
+                    if ch == "}":
+                        items.extend(self._emit(text[start:i + 1]))
+            i += 1
+
+        if not self._stack and not self._in_string:
+            # 没有未闭合的结构，丢弃已扫描的文本
+            self._text = ""
+            self._pos = 0
+        else:
+            # 保留最外层未闭合结构开始之后的文本
+            offset = self._stack[0][1]
+            self._text = text[offset:]
+            self._stack = [(ch, start - offset) for ch, start in self._stack]
+            self._pos = i - offset
+        return items
+
+    def _emit(self, fragment):
+        """解析一个完整的对象片段，是OCR结果项时返回"""
+        try:
+            data = json.loads(fragment)
+        except ValueError:
+            return []
+        if is_ocr_item(data):
+            self.items_emitted += 1
+            return [data]
+        return []
+
+
+def parse_ocr_items(content):
+    """从完整的模型输出中提取所有OCR结果项"""
+    parser = IncrementalOCRParser()
+    return parser.feed(content or "")
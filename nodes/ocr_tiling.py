@@ -0,0 +1,154 @@
+import numpy as np
+
+
+def clamp_tile_overlap(tile_size, overlap):
+    """
+    将重叠像素限制在 [0, tile_size // 2]
+
+    重叠接近或超过图块边长时步长退化为1像素，图块数量会达到上千万个
+    """
+    return min(max(0, int(overlap)), max(1, int(tile_size)) // 2)
+
+
+def compute_tiles(width, height, tile_size, overlap):
+    """
+    将图像划分为带重叠的图块，返回 [(x1, y1, x2, y2), ...]
+
+    最后一行/列图块贴齐图像右/下边缘，保证完整覆盖；图像不超过tile_size时只有一个图块。
+    overlap超过tile_size的一半时按一半计算，见clamp_tile_overlap
+    """
+    tile_size = max(1, int(tile_size))
+    stride = max(1, tile_size - clamp_tile_overlap(tile_size, overlap))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def offset_item(item, dx, dy):
+    """返回坐标平移 (dx, dy) 后的OCR结果项副本，支持矩形、多边形bbox_2d和polygon字段"""
+    shifted = dict(item)
+    bbox = item.get("bbox_2d")
+    if isinstance(bbox, (list, tuple)):
+        try:
+            shifted["bbox_2d"] = [value + (dx if i % 2 == 0 else dy) for i, value in enumerate(bbox)]
+        except TypeError:
+            pass
+    polygon = item.get("polygon")
+    if isinstance(polygon, (list, tuple)):
+        try:
+            shifted["polygon"] = [[point[0] + dx, point[1] + dy] for point in polygon]
+        except (TypeError, IndexError):
+            pass
+    return shifted
+
+
+def item_bounds(item):
+    """返回OCR结果项的外接矩形 [x1, y1, x2, y2]，坐标无效时返回None"""
+    points = item.get("polygon") or item.get("bbox_2d")
+    try:
+        coords = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+    except (TypeError, ValueError):
+        return None
+    if len(coords) < 2:
+        return None
+    x1, y1 = coords.min(axis=0)
+    x2, y2 = coords.max(axis=0)
+    return [x1, y1, x2, y2]
+
+
+def overlapping_pairs(boxes, groups=None):
+    """
+    找出 (N, 4) 框数组中相交的框对，返回 (i, j, IoU, 包含率)，其中 i < j
+
+    包含率为交集 / 较小框面积。交集宽高用外积一次性计算，IoU只对相交的框对计算；
+    groups不为None时只返回来自不同分组的框对
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    x1, y1, x2, y2 = boxes.T
+    inter_w = np.minimum.outer(x2, x2) - np.maximum.outer(x1, x1)
+    inter_h = np.minimum.outer(y2, y2) - np.maximum.outer(y1, y1)
+    candidate = (inter_w > 0) & (inter_h > 0)
+    if groups is not None:
+        groups = np.asarray(groups)
+        candidate &= groups[:, None] != groups[None, :]
+    i, j = np.nonzero(np.triu(candidate, 1))
+
+    inter = inter_w[i, j] * inter_h[i, j]
+    areas = (x2 - x1) * (y2 - y1)
+    union = areas[i] + areas[j] - inter
+    smaller = np.minimum(areas[i], areas[j])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou = np.where(union > 0, inter / union, 0.0)
+        containment = np.where(smaller > 0, inter / smaller, 0.0)
+    return i, j, iou, containment
+
+
+def nms_boxes(boxes, scores=None, groups=None, iou_threshold=0.5, containment_threshold=0.9):
+    """
+    非极大值抑制，返回保留的框索引（按原顺序）
+
+    重叠关系一次性向量化计算；scores缺省时按面积优先保留大框（图块边缘被截断的
+    文字框面积更小）。groups不为None时只抑制来自不同分组（图块）的框，
+    同一图块内模型返回的相邻文字框不会互相抑制
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    count = len(boxes)
+    if count == 0:
+        return []
+    if scores is None:
+        scores = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    i, j, iou, containment = overlapping_pairs(boxes, groups)
+    duplicate = (iou > iou_threshold) | (containment > containment_threshold)
+    i, j = i[duplicate], j[duplicate]
+    if len(i) == 0:
+        return list(range(count))
+
+    # 按框索引分组的邻接表，只有存在重复关系的框需要逐个判断
+    sources = np.concatenate([i, j])
+    targets = np.concatenate([j, i])
+    order = np.argsort(sources, kind="stable")
+    sources, targets = sources[order], targets[order]
+    bounds = np.searchsorted(sources, np.arange(count + 1))
+
+    suppressed = np.zeros(count, dtype=bool)
+    for index in np.argsort(-np.asarray(scores), kind="stable"):
+        if suppressed[index]:
+            continue
+        suppressed[targets[bounds[index]:bounds[index + 1]]] = True
+    return np.flatnonzero(~suppressed).tolist()
+
+
+def merge_tile_results(tile_results, iou_threshold=0.5, containment_threshold=0.9):
+    """
+    将各图块的OCR结果映射回整图坐标并去除重叠区域中的重复框
+
+    tile_results为 [((x1, y1, x2, y2), ocr_results), ...]
+    """
+    items = []
+    bounds = []
+    groups = []
+    for tile_index, (tile, ocr_results) in enumerate(tile_results):
+        for item in ocr_results:
+            shifted = offset_item(item, tile[0], tile[1])
+            box = item_bounds(shifted)
+            if box is None:
+                continue
+            items.append(shifted)
+            bounds.append(box)
+            groups.append(tile_index)
+    if len(tile_results) <= 1:
+        return items
+    keep = nms_boxes(bounds, groups=groups, iou_threshold=iou_threshold,
+                     containment_threshold=containment_threshold)
+    return [items[i] for i in keep]
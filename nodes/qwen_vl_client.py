@@ -0,0 +1,333 @@
+import json
+import time
+import random
+import itertools
+import socket
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger("qwen_vl_client")
+
+# 可重试的HTTP状态码：限流和服务端临时错误
+RETRY_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+# 连接池大小，需不小于OCR节点的最大并发数
+POOL_MAXSIZE = 32
+
+# 默认请求参数
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+
+_session = None
+_session_lock = threading.Lock()
+
+# 当前线程正在发送的请求所属的取消令牌，以及该请求登记连接得到的句柄列表，由连接池在发送时登记底层连接
+_request_context = threading.local()
+
+
+class APIRequestError(Exception):
+    """API请求最终失败（已用尽重试次数或遇到不可重试的错误）"""
+
+    def __init__(self, message, status_code=None, attempts=0, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.attempts = attempts
+        self.retry_after = retry_after
+
+
+class RequestCancelled(APIRequestError):
+    """请求被取消（如用户中断了ComfyUI的执行）"""
+
+
+class CancelToken:
+    """
+    请求取消令牌，可在任意线程调用cancel()
+
+    取消时会关闭令牌登记的所有底层socket，正在等待响应或读取响应体的请求立即中断，
+    退避等待也会提前结束。同一个令牌可以被多个并发请求共用，每次登记连接返回一个句柄，
+    请求结束时只注销自己的句柄，不影响其他仍在进行的请求
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._handles = itertools.count()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """取消令牌并中断正在进行的请求"""
+        self._event.set()
+        with self._lock:
+            connections = list(self._connections.values())
+        for conn in connections:
+            sock = getattr(conn, "sock", None)
+            if sock is None:
+                continue
+            try:
+                # 直接关闭底层socket的读写，阻塞在recv上的线程会立即返回
+                socket.socket.shutdown(sock, socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def wait(self, timeout):
+        """等待timeout秒，期间被取消时提前返回True"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise RequestCancelled("请求已取消")
+
+    def _attach(self, conn):
+        """登记请求正在使用的连接，返回用于注销的句柄"""
+        with self._lock:
+            handle = next(self._handles)
+            self._connections[handle] = conn
+        if self.cancelled:
+            self.cancel()
+        return handle
+
+    def _release(self, handles):
+        """注销一个请求登记的连接（连接随后可能归还连接池，被其他请求复用）"""
+        with self._lock:
+            for handle in handles:
+                self._connections.pop(handle, None)
+
+
+class _CancellableMixin:
+    """连接池混入类：发送请求时把使用的连接登记到当前线程的取消令牌"""
+
+    def _make_request(self, conn, *args, **kwargs):
+        token = getattr(_request_context, "cancel_token", None)
+        if token is not None:
+            _request_context.cancel_handles.append(token._attach(conn))
+        return super()._make_request(conn, *args, **kwargs)
+
+
+class _CancellableHTTPConnectionPool(_CancellableMixin, HTTPConnectionPool):
+    pass
+
+
+class _CancellableHTTPSConnectionPool(_CancellableMixin, HTTPSConnectionPool):
+    pass
+
+
+class _CancellableHTTPAdapter(HTTPAdapter):
+    """使用可取消连接池的HTTP适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CancellableHTTPConnectionPool,
+            "https": _CancellableHTTPSConnectionPool,
+        }
+
+
+def get_http_session():
+    """返回进程共享的HTTP会话，复用TCP/TLS连接（keep-alive）"""
+    global _session
+    session = _session
+    if session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # 重试由send_with_retry统一处理，适配器本身不重试
+                adapter = _CancellableHTTPAdapter(pool_connections=8, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+            session = _session
+    return session
+
+
+def close_http_session():
+    """关闭共享HTTP会话，下次请求时重新创建"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def parse_retry_after(value):
+    """解析Retry-After响应头（秒数或HTTP日期），返回等待秒数，无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def compute_backoff(attempt, backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX, retry_after=None):
+    """
+    计算第attempt次重试前的等待时间
+
+    服务端给出Retry-After时优先遵守，否则使用带full jitter的指数退避
+    """
+    if retry_after is not None:
+        return min(retry_after, backoff_max)
+    return random.uniform(0, min(backoff_max, backoff_base * (2 ** attempt)))
+
+
+def send_with_retry(url, headers, payload, max_retries=DEFAULT_MAX_RETRIES,
+                    connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                    backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX, stream=False,
+                    cancel_token=None):
+    """
+    通过共享会话发送JSON POST请求，遇到连接错误、超时、429和5xx时自动重试
+
+    返回状态码正常的响应对象，失败时抛出APIRequestError。
+    stream=True时只重试建立连接和响应头阶段，响应体由调用方流式读取。
+    cancel_token被取消时中断正在进行的请求并抛出RequestCancelled；
+    流式响应的连接在读取期间保持登记，调用方读取结束后需调用release_response
+    """
+    session = get_http_session()
+    attempt = 0
+    while True:
+        retry_after = None
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        handles = []
+        keep_registered = False
+        _request_context.cancel_token = cancel_token
+        _request_context.cancel_handles = handles
+        try:
+            response = session.post(url, headers=headers, json=payload,
+                                    timeout=(connect_timeout, read_timeout), stream=stream)
+            if response.status_code not in RETRY_STATUS_CODES:
+                try:
+                    response.raise_for_status()
+                except requests.exceptions.HTTPError:
+                    response.close()
+                    raise
+                if stream:
+                    response.cancel_handles = handles
+                    keep_registered = True
+                return response
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            error = APIRequestError(f"HTTP {response.status_code}: {response.text[:200]}",
+                                    status_code=response.status_code, attempts=attempt + 1,
+                                    retry_after=retry_after)
+            response.close()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if cancel_token is not None and cancel_token.cancelled:
+                raise RequestCancelled("请求已取消", attempts=attempt + 1) from e
+            error = APIRequestError(f"{type(e).__name__}: {str(e)}", attempts=attempt + 1)
+        except requests.exceptions.RequestException as e:
+            if cancel_token is not None and cancel_token.cancelled:
+                raise RequestCancelled("请求已取消", attempts=attempt + 1) from e
+            # 4xx等不可重试的错误直接抛出
+            status_code = e.response.status_code if e.response is not None else None
+            raise APIRequestError(str(e), status_code=status_code, attempts=attempt + 1) from e
+        finally:
+            _request_context.cancel_token = None
+            _request_context.cancel_handles = None
+            if cancel_token is not None and not keep_registered:
+                # 响应体已读取完毕（或请求失败），连接可能已归还连接池，只注销本次请求登记的连接
+                cancel_token._release(handles)
+
+        if attempt >= max_retries:
+            raise error
+
+        delay = compute_backoff(attempt, backoff_base, backoff_max, retry_after)
+        logger.warning(f"API请求失败（{str(error)}），{delay:.2f}秒后进行第{attempt + 1}次重试")
+        if cancel_token is not None:
+            if cancel_token.wait(delay):
+                raise RequestCancelled("请求已取消", attempts=attempt + 1)
+        else:
+            time.sleep(delay)
+        attempt += 1
+
+
+def release_response(response, cancel_token):
+    """流式响应读取结束后注销其连接，需在response.close()之后调用"""
+    if cancel_token is not None:
+        cancel_token._release(getattr(response, "cancel_handles", ()))
+
+
+def post_json_with_retry(url, headers, payload, **request_options):
+    """发送请求并返回解析后的JSON响应，重试参数见send_with_retry"""
+    response = send_with_retry(url, headers, payload, **request_options)
+    try:
+        return response.json()
+    except ValueError:
+        # 读取响应体时被取消会得到不完整的内容
+        cancel_token = request_options.get("cancel_token")
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        raise
+    finally:
+        response.close()
+
+
+def iter_sse_data(response):
+    """逐条读取Server-Sent Events响应中的data字段，遇到[DONE]结束"""
+    data_lines = []
+    # chunk_size=None时数据到达即返回，按行切分后再解码，避免多字节字符被截断
+    for raw_line in response.iter_lines(chunk_size=None):
+        line = raw_line.decode("utf-8").rstrip("\r")
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+            continue
+        if line == "" and data_lines:
+            # 空行表示一个事件结束
+            data = "\n".join(data_lines)
+            data_lines = []
+            if data == "[DONE]":
+                return
+            yield data
+    if data_lines:
+        data = "\n".join(data_lines)
+        if data != "[DONE]":
+            yield data
+
+
+def stream_chat_completion(url, headers, payload, **request_options):
+    """
+    以SSE流式方式调用chat/completions接口，逐段返回模型输出的文本增量
+
+    只有在收到响应之前的错误会重试；流式读取过程中出错时抛出APIRequestError
+    """
+    payload = dict(payload, stream=True)
+    cancel_token = request_options.get("cancel_token")
+    response = send_with_retry(url, headers, payload, stream=True, **request_options)
+    try:
+        for data in iter_sse_data(response):
+            try:
+                event = json.loads(data)
+            except ValueError:
+                logger.warning(f"无法解析的SSE事件：{data[:200]}")
+                continue
+            for choice in event.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+        if cancel_token is not None:
+            # 取消时socket被关闭，SSE读取会提前正常结束
+            cancel_token.raise_if_cancelled()
+    except requests.exceptions.RequestException as e:
+        if cancel_token is not None and cancel_token.cancelled:
+            raise RequestCancelled("请求已取消") from e
+        raise APIRequestError(f"流式读取响应失败：{str(e)}") from e
+    finally:
+        response.close()
+        release_response(response, cancel_token)
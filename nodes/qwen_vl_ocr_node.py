@@ -1,13 +1,27 @@
 import os
+import io
 import json
+import time
 import base64
 import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import torch
 from PIL import Image, ImageDraw
 import cv2
 
+from .qwen_vl_client import post_json_with_retry, stream_chat_completion, APIRequestError, RequestCancelled
+from .endpoint_pool import BALANCE_STRATEGIES, get_endpoint_pool
+from .ocr_async import supports_async_nodes, run_cancellable, run_cancellable_async
+from .ocr_stream_parser import IncrementalOCRParser, is_ocr_item, parse_ocr_items
+from .ocr_cache import compute_cache_key, get_ocr_cache
+from .image_utils import tensor_to_pil_list, pil_list_to_tensor
+from .bbox_utils import COORD_MODES, normalize_ocr_results
+from .ocr_result import OCR_RESULT_TYPE, OCRFrame, OCRResult
+from .ocr_tiling import clamp_tile_overlap, compute_tiles, merge_tile_results
+from .mask_utils import split_boxes_and_polygons, rasterize_frame, build_mask_batch
+
 logger = logging.getLogger("qwen_vl_ocr")
 
 class QwenVLOCRNode:
@@ -39,45 +53,209 @@ class QwenVLOCRNode:
                     "default": "https://dashscope.aliyuncs.com/compatible-mode/v1",
                     "multiline": False,
                     "tooltip": "API基础URL"
+                }),
+                "max_concurrency": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 32,
+                    "step": 1,
+                    "tooltip": "批量图片时同时进行的最大API请求数"
+                }),
+                "max_retries": ("INT", {
+                    "default": 3,
+                    "min": 0,
+                    "max": 10,
+                    "step": 1,
+                    "tooltip": "遇到429限流、5xx错误或网络超时时的最大重试次数"
+                }),
+                "connect_timeout": ("FLOAT", {
+                    "default": 10.0,
+                    "min": 1.0,
+                    "max": 120.0,
+                    "step": 1.0,
+                    "tooltip": "建立连接的超时时间（秒）"
+                }),
+                "read_timeout": ("FLOAT", {
+                    "default": 60.0,
+                    "min": 5.0,
+                    "max": 600.0,
+                    "step": 5.0,
+                    "tooltip": "等待API响应的超时时间（秒）"
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "相同图片像素、提示词、模型和API地址时直接复用磁盘缓存的识别结果"
+                }),
+                "cache_ttl_hours": ("FLOAT", {
+                    "default": 168.0,
+                    "min": 0.0,
+                    "max": 8760.0,
+                    "step": 1.0,
+                    "tooltip": "缓存有效期（小时），0表示永不过期"
+                }),
+                "upload_format": (["png", "jpeg", "webp"], {
+                    "default": "png",
+                    "tooltip": "上传图片的编码格式，jpeg/webp编码更快、请求体更小"
+                }),
+                "upload_quality": ("INT", {
+                    "default": 90,
+                    "min": 10,
+                    "max": 100,
+                    "step": 1,
+                    "tooltip": "jpeg/webp编码质量"
+                }),
+                "max_side": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 16384,
+                    "step": 64,
+                    "tooltip": "上传前将图片长边缩放到该尺寸以内，0表示不缩放；返回的坐标会自动还原到原图分辨率"
+                }),
+                "mask_dilate": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 256,
+                    "step": 1,
+                    "tooltip": "mask中每个文字区域向外扩展的像素数"
+                }),
+                "mask_feather": ("FLOAT", {
+                    "default": 0.0,
+                    "min": 0.0,
+                    "max": 64.0,
+                    "step": 0.5,
+                    "tooltip": "mask边缘羽化程度（高斯模糊sigma，像素），0表示硬边缘"
+                }),
+                "stream": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "以流式方式接收API返回，每个文字区域输出完整后立即解析，降低首个结果的延迟"
+                }),
+                "coord_mode": (COORD_MODES, {
+                    "default": "auto",
+                    "tooltip": "API返回bbox_2d的坐标约定：absolute像素坐标、norm_1000为0~1000归一化、norm_1为0~1归一化，auto按坐标范围自动判断"
+                }),
+                "endpoint_pool": ("STRING", {
+                    "default": "",
+                    "multiline": True,
+                    "tooltip": "多个API Key/地址组成的端点池，每行一个：api_key, api_base_url[, 权重[, QPS[, TPM]]]；填写后忽略上方的api_key和api_base_url"
+                }),
+                "balance_strategy": (BALANCE_STRATEGIES, {
+                    "default": "weighted_round_robin",
+                    "tooltip": "端点池的负载均衡策略：weighted_round_robin按权重轮询，least_in_flight选择进行中请求最少的端点"
+                }),
+                "enable_tiling": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "将大图切分为带重叠的图块分别识别，再合并为整图坐标；适合海报、扫描件等超大图片"
+                }),
+                "tile_size": ("INT", {
+                    "default": 2048,
+                    "min": 256,
+                    "max": 8192,
+                    "step": 64,
+                    "tooltip": "图块边长（像素），图片不超过该尺寸时不切分"
+                }),
+                "tile_overlap": ("INT", {
+                    "default": 256,
+                    "min": 0,
+                    "max": 2048,
+                    "step": 16,
+                    "tooltip": "相邻图块的重叠像素数，应不小于单行文字的高度，避免文字被切断；超过图块边长的一半时按一半计算"
+                }),
+                "tile_iou_threshold": ("FLOAT", {
+                    "default": 0.5,
+                    "min": 0.05,
+                    "max": 1.0,
+                    "step": 0.05,
+                    "tooltip": "合并重叠区域时，不同图块的框IoU超过该值视为同一文字区域"
+                }),
+                "include_raw_response": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "在ocr_result_json中附带模型的原始响应（体积较大），用于调试解析问题"
                 })
             }
         }
     
-    RETURN_TYPES = ("IMAGE", "MASK", "STRING")
-    RETURN_NAMES = ("marked_image", "text_mask", "ocr_result_json")
-    FUNCTION = "process_ocr"
+    RETURN_TYPES = ("IMAGE", "MASK", "STRING", OCR_RESULT_TYPE)
+    RETURN_NAMES = ("marked_image", "text_mask", "ocr_result_json", "ocr_result")
+    OUTPUT_TOOLTIPS = (
+        "标记了文字区域的图像",
+        "文字区域遮罩",
+        "识别结果JSON，批量图片时为每张图片一个结果的数组",
+        "结构化识别结果（框数组+文字列表），可直接连接到文字叠加节点，省去JSON序列化和解析"
+    )
+    # 支持协程节点的ComfyUI版本使用异步入口，否则使用可中断的同步入口
+    FUNCTION = "process_ocr_async" if supports_async_nodes() else "run_ocr"
     CATEGORY = "iyunya/文字识别"
     
     def tensor_to_pil(self, tensor):
-        """将tensor转换为PIL图像"""
-        # tensor shape: [batch, height, width, channels]
-        if len(tensor.shape) == 4:
-            tensor = tensor[0]  # 取第一张图片
-        
-        # 转换为numpy并调整数据类型
-        image_np = tensor.cpu().numpy()
-        if image_np.max() <= 1.0:
-            image_np = (image_np * 255).astype(np.uint8)
-        else:
-            image_np = image_np.astype(np.uint8)
-            
-        return Image.fromarray(image_np)
+        """将tensor转换为PIL图像（批量输入时取第一张）"""
+        return tensor_to_pil_list(tensor[:1] if len(tensor.shape) == 4 else tensor)[0]
     
     def pil_to_tensor(self, pil_image):
         """将PIL图像转换为tensor"""
-        image_np = np.array(pil_image).astype(np.float32) / 255.0
-        return torch.from_numpy(image_np).unsqueeze(0)  # 添加batch维度
+        return pil_list_to_tensor([pil_image])  # 添加batch维度
     
-    def image_to_base64(self, pil_image):
-        """将PIL图像转换为base64编码"""
-        import io
+    def tensor_to_pil_batch(self, tensor):
+        """将批量tensor转换为PIL图像列表"""
+        return tensor_to_pil_list(tensor)
+    
+    def encode_image(self, pil_image, upload_format="png", quality=90):
+        """将PIL图像编码为指定格式，返回 (编码后的字节缓冲区, MIME类型)"""
         buffer = io.BytesIO()
-        pil_image.save(buffer, format='PNG')
-        image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        return f"data:image/png;base64,{image_base64}"
+        if upload_format == "jpeg":
+            if pil_image.mode != "RGB":
+                pil_image = pil_image.convert("RGB")
+            pil_image.save(buffer, format='JPEG', quality=int(quality))
+            mime_type = "image/jpeg"
+        elif upload_format == "webp":
+            # method=0为最快的编码速度
+            pil_image.save(buffer, format='WEBP', quality=int(quality), method=0)
+            mime_type = "image/webp"
+        else:
+            # PNG使用最快的压缩等级，体积略大但编码耗时大幅降低
+            pil_image.save(buffer, format='PNG', compress_level=1)
+            mime_type = "image/png"
+        return buffer.getbuffer(), mime_type
+    
+    def to_data_url(self, data, mime_type):
+        """将编码后的图像字节转换为base64 data URL"""
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+    
+    def image_to_base64(self, pil_image, upload_format="png", quality=90):
+        """将PIL图像转换为base64编码"""
+        return self.to_data_url(*self.encode_image(pil_image, upload_format, quality))
+    
+    def encode_image_for_upload(self, pil_image, upload_options=None):
+        """
+        按上传选项缩放并编码图像
+        
+        返回 (base64数据, 编码统计信息)，统计信息中的upload_size为实际上传的图像尺寸
+        """
+        options = upload_options or {}
+        max_side = int(options.get("max_side", 0) or 0)
+        start = time.perf_counter()
+        
+        width, height = pil_image.size
+        upload_image = pil_image
+        if max_side > 0 and max(width, height) > max_side:
+            ratio = max_side / max(width, height)
+            upload_size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+            upload_image = pil_image.resize(upload_size, Image.BILINEAR, reducing_gap=2.0)
+        
+        data, mime_type = self.encode_image(
+            upload_image, options.get("format", "png"), options.get("quality", 90)
+        )
+        image_base64 = self.to_data_url(data, mime_type)
+        stats = {
+            "format": options.get("format", "png"),
+            "upload_size": list(upload_image.size),
+            "encode_ms": round((time.perf_counter() - start) * 1000, 2),
+            # 编码后的图像字节数（base64之前），请求体中的data URL约为其4/3
+            "payload_bytes": len(data)
+        }
+        return image_base64, stats
     
-    def call_qwen_vl_api(self, image_base64, prompt, api_key, model, api_base_url):
-        """调用阿里云百炼Qwen-VL API"""
+    def build_api_request(self, image_base64, prompt, api_key, model, api_base_url):
+        """构建chat/completions请求的URL、请求头和请求体"""
         headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
@@ -107,17 +285,24 @@ class QwenVLOCRNode:
             "temperature": 0.1,
             "max_tokens": 2000
         }
+        return f"{api_base_url}/chat/completions", headers, payload
+    
+    def call_qwen_vl_api(self, image_base64, prompt, api_key, model, api_base_url, request_options=None):
+        """
+        调用阿里云百炼Qwen-VL API，request_options为重试和超时设置
+        
+        request_options中的endpoint_pool不为None时，由端点池选择API Key和地址
+        """
+        url, headers, payload = self.build_api_request(image_base64, prompt, api_key, model, api_base_url)
+        options = dict(request_options or {})
+        pool = options.pop("endpoint_pool", None)
         
         try:
-            response = requests.post(
-                f"{api_base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            response.raise_for_status()
-            
-            result = response.json()
+            # 通过共享连接池发送请求，临时错误自动重试
+            if pool is not None:
+                result = pool.post_json("/chat/completions", payload, **options)
+            else:
+                result = post_json_with_retry(url, headers, payload, **options)
             if 'choices' in result and len(result['choices']) > 0:
                 content = result['choices'][0]['message']['content']
                 logger.info(f"API调用成功，返回内容：{content}")
@@ -125,190 +310,413 @@ class QwenVLOCRNode:
             else:
                 raise Exception(f"API返回格式错误：{result}")
                 
-        except requests.exceptions.RequestException as e:
+        except RequestCancelled:
+            raise
+        except (APIRequestError, requests.exceptions.RequestException) as e:
             logger.error(f"API请求失败：{str(e)}")
             raise Exception(f"API请求失败：{str(e)}")
         except Exception as e:
             logger.error(f"处理API响应时出错：{str(e)}")
             raise Exception(f"处理API响应时出错：{str(e)}")
     
-    def parse_ocr_result(self, content):
-        """解析OCR结果，提取JSON格式的文本和坐标信息"""
+    def stream_qwen_vl_api(self, image_base64, prompt, api_key, model, api_base_url,
+                           request_options=None, on_item=None):
+        """
+        以流式方式调用API，边接收边解析，每个文字区域的JSON对象一结束就回调on_item
+        
+        返回 (完整返回内容, OCR结果列表, 首个结果到达耗时毫秒数)
+        """
+        url, headers, payload = self.build_api_request(image_base64, prompt, api_key, model, api_base_url)
+        options = dict(request_options or {})
+        pool = options.pop("endpoint_pool", None)
+        if pool is not None:
+            deltas = pool.stream_chat_completion("/chat/completions", payload, **options)
+        else:
+            deltas = stream_chat_completion(url, headers, payload, **options)
+        parser = IncrementalOCRParser()
+        chunks = []
         ocr_results = []
+        first_item_ms = None
+        start = time.perf_counter()
         
         try:
-            # 先清理内容，去除markdown代码块标记
-            cleaned_content = content.strip()
-            if cleaned_content.startswith('```json'):
-                cleaned_content = cleaned_content[7:]  # 去除 ```json
-            if cleaned_content.endswith('```'):
-                cleaned_content = cleaned_content[:-3]  # 去除 ```
-            cleaned_content = cleaned_content.strip()
-            
-            # 尝试直接解析JSON
-            if cleaned_content.startswith('{') or cleaned_content.startswith('['):
+            for delta in deltas:
+                chunks.append(delta)
+                for item in parser.feed(delta):
+                    if first_item_ms is None:
+                        first_item_ms = round((time.perf_counter() - start) * 1000, 2)
+                    ocr_results.append(item)
+                    if on_item is not None:
+                        on_item(item)
+        except RequestCancelled:
+            raise
+        except (APIRequestError, requests.exceptions.RequestException) as e:
+            logger.error(f"API请求失败：{str(e)}")
+            raise Exception(f"API请求失败：{str(e)}")
+        
+        content = "".join(chunks)
+        logger.info(f"API流式调用完成，返回内容：{content}")
+        return content, ocr_results, first_item_ms
+    
+    def parse_ocr_result(self, content):
+        """解析OCR结果，提取JSON格式的文本和坐标信息"""
+        # 先清理内容，去除markdown代码块标记
+        cleaned_content = (content or "").strip()
+        if cleaned_content.startswith('```json'):
+            cleaned_content = cleaned_content[7:]  # 去除 ```json
+        if cleaned_content.endswith('```'):
+            cleaned_content = cleaned_content[:-3]  # 去除 ```
+        cleaned_content = cleaned_content.strip()
+        
+        # 标准JSON直接解析
+        if cleaned_content.startswith('[') or cleaned_content.startswith('{'):
+            try:
                 data = json.loads(cleaned_content)
-                if isinstance(data, dict):
-                    data = [data]
-                
-                for item in data:
-                    if 'bbox_2d' in item and 'text_content' in item:
-                        ocr_results.append(item)
-            else:
-                # 尝试从文本中提取JSON块
-                import re
-                # 更宽松的JSON匹配模式
-                json_pattern = r'\{[^{}]*"bbox_2d"[^{}]*"text_content"[^{}]*\}'
-                matches = re.findall(json_pattern, cleaned_content, re.DOTALL)
-                
-                for match in matches:
-                    try:
-                        data = json.loads(match)
-                        ocr_results.append(data)
-                    except json.JSONDecodeError:
-                        continue
-                
-                # 如果没有找到标准格式，尝试从整个文本中提取
-                if not ocr_results:
-                    # 查找坐标模式 [x1,y1,x2,y2] 或类似格式
-                    coord_pattern = r'\[(\d+),\s*(\d+),\s*(\d+),\s*(\d+)\]'
-                    coords = re.findall(coord_pattern, cleaned_content)
-                    
-                    if coords:
-                        # 简单假设：如果找到坐标，就把整个内容作为文本
-                        for i, coord in enumerate(coords):
-                            x1, y1, x2, y2 = map(int, coord)
-                            ocr_results.append({
-                                "bbox_2d": [x1, y1, x2, y2],
-                                "text_content": f"文字区域{i+1}"  # 使用简单的区域标识
-                            })
-                    else:
-                        # 如果完全没有坐标信息，创建一个默认结果
-                        ocr_results.append({
-                            "bbox_2d": [0, 0, 100, 50],
-                            "text_content": "识别结果"
-                        })
-            
-        except Exception as e:
-            logger.warning(f"解析OCR结果时出错：{str(e)}，使用默认格式")
-            # 返回默认结果
-            ocr_results.append({
-                "bbox_2d": [0, 0, 100, 50],
-                "text_content": "解析失败"
-            })
+            except ValueError:
+                data = None
+            if isinstance(data, list):
+                return [item for item in data if is_ocr_item(item)]
+            if is_ocr_item(data):
+                return [data]
         
+        # 带说明文字、被截断或包在外层对象中的返回，逐个提取完整的结果对象
+        ocr_results = parse_ocr_items(cleaned_content)
+        if not ocr_results:
+            logger.warning(f"未能从API返回内容中解析出文字区域：{cleaned_content[:200]}")
         return ocr_results
     
-    def draw_bboxes_on_image(self, pil_image, ocr_results):
-        """在图片上绘制边界框"""
+    def draw_bboxes_on_image(self, pil_image, ocr_results, boxes=None):
+        """在图片上绘制边界框，boxes为normalize_ocr_results返回的像素外接框数组"""
         draw_image = pil_image.copy()
         draw = ImageDraw.Draw(draw_image)
         
-        for i, result in enumerate(ocr_results):
-            bbox = result.get("bbox_2d", [0, 0, 100, 50])
-            if len(bbox) >= 4:
-                x1, y1, x2, y2 = bbox[:4]
-                # 绘制红色边界框
-                draw.rectangle([x1, y1, x2, y2], outline="red", width=3)
-                
-                # 绘制序号而不是中文文字，避免编码问题
-                try:
-                    if y1 > 20:  # 确保有足够空间绘制序号
-                        # 绘制序号标识
-                        draw.text((x1, y1-20), f"#{i+1}", fill="red")
-                except Exception as e:
-                    # 如果绘制出现任何问题，只记录警告，继续绘制边界框
-                    logger.warning(f"绘制序号时出现错误：{str(e)}")
+        if boxes is None:
+            ocr_results, boxes = normalize_ocr_results(ocr_results, pil_image.size[0], pil_image.size[1], "absolute")
+        
+        for i, (x1, y1, x2, y2) in enumerate(boxes.tolist()):
+            # 绘制红色边界框
+            draw.rectangle([x1, y1, x2, y2], outline="red", width=3)
+            
+            # 绘制序号而不是中文文字，避免编码问题
+            try:
+                if y1 > 20:  # 确保有足够空间绘制序号
+                    # 绘制序号标识
+                    draw.text((x1, y1-20), f"#{i+1}", fill="red")
+            except Exception as e:
+                # 如果绘制出现任何问题，只记录警告，继续绘制边界框
+                logger.warning(f"绘制序号时出现错误：{str(e)}")
         
         return draw_image
     
-    def create_mask_from_bboxes(self, image_size, ocr_results):
-        """根据边界框创建mask"""
+    def create_mask_from_bboxes(self, image_size, ocr_results, dilate=0, feather=0.0):
+        """根据边界框创建mask（PIL 'L'图像）"""
         width, height = image_size
-        mask = Image.new('L', (width, height), 0)  # 黑色背景
-        draw = ImageDraw.Draw(mask)
+        mask = np.zeros((height, width), dtype=np.float32)  # 黑色背景
+        boxes, polygons = split_boxes_and_polygons(ocr_results)
+        rasterize_frame(mask, boxes, polygons, dilate, feather)
+        return Image.fromarray((mask * 255).astype(np.uint8), mode='L')
+    
+    def recognize_image(self, pil_image, api_key, custom_prompt, model, api_base_url,
+                        request_options=None, cache_ttl_seconds=None, upload_options=None, stream=False,
+                        coord_mode="auto"):
+        """
+        调用API识别一张图片（或图块）中的文字区域，不绘制标记，失败时抛出异常
         
-        for result in ocr_results:
-            bbox = result.get("bbox_2d", [0, 0, 100, 50])
-            if len(bbox) >= 4:
-                x1, y1, x2, y2 = bbox[:4]
-                # 在mask上绘制白色矩形
-                draw.rectangle([x1, y1, x2, y2], fill=255)
+        返回的坐标已按coord_mode约定转换为该图片的像素坐标，并裁剪、去除退化的框
+        返回字典：ocr_results、original_response、cache_hit，以及可选的upload、first_item_ms
+        """
+        cache_key = None
+        cached = None
+        if cache_ttl_seconds is not None:
+            cache_key = compute_cache_key(pil_image, custom_prompt, model, api_base_url,
+                                          dict(upload_options or {}, coord_mode=coord_mode))
+            cached = get_ocr_cache().get(cache_key, cache_ttl_seconds)
         
-        return mask
-    
-    def process_ocr(self, image, api_key, custom_prompt, model, api_base_url=None):
-        """处理OCR识别"""
-        if not api_key or not api_key.strip():
-            raise ValueError("请提供有效的阿里云百炼API Key")
+        if cached is not None:
+            logger.info("命中OCR结果缓存，跳过API调用")
+            return {
+                "ocr_results": cached["ocr_results"],
+                "original_response": cached.get("original_response", ""),
+                "cache_hit": True
+            }
         
-        if api_base_url is None:
-            api_base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+        # 按上传选项缩放并编码为base64
+        image_base64, upload_stats = self.encode_image_for_upload(pil_image, upload_options)
+        logger.info(f"图像编码完成：{upload_stats}")
         
-        try:
-            # 转换输入图像
-            pil_image = self.tensor_to_pil(image)
-            logger.info(f"图像尺寸：{pil_image.size}")
-            
-            # 转换为base64
-            image_base64 = self.image_to_base64(pil_image)
-            
-            # 调用API
-            logger.info("正在调用阿里云百炼API...")
+        # 调用API
+        logger.info("正在调用阿里云百炼API...")
+        first_item_ms = None
+        if stream:
+            api_result, ocr_results, first_item_ms = self.stream_qwen_vl_api(
+                image_base64, custom_prompt, api_key, model, api_base_url, request_options,
+                on_item=lambda item: logger.debug(f"收到文字区域：{item}")
+            )
+            if not ocr_results:
+                # 流式解析未得到结果时，再按完整内容解析一次
+                ocr_results = self.parse_ocr_result(api_result)
+        else:
             api_result = self.call_qwen_vl_api(
-                image_base64, custom_prompt, api_key, model, api_base_url
+                image_base64, custom_prompt, api_key, model, api_base_url, request_options
             )
-            
-            # 解析结果
             ocr_results = self.parse_ocr_result(api_result)
+        
+        # 统一转换为原图分辨率的像素坐标（上传前缩放过时一并还原）
+        ocr_results, _ = normalize_ocr_results(
+            ocr_results, pil_image.size[0], pil_image.size[1], coord_mode, upload_stats["upload_size"]
+        )
+        
+        # 结果为空可能是解析失败或模型输出异常，不写入缓存，以免在有效期内一直返回空结果
+        if cache_key is not None and ocr_results:
+            get_ocr_cache().put(cache_key, {
+                "model": model,
+                "ocr_results": ocr_results,
+                "original_response": api_result
+            })
+        
+        info = {
+            "ocr_results": ocr_results,
+            "original_response": api_result,
+            "cache_hit": False,
+            "upload": upload_stats
+        }
+        if first_item_ms is not None:
+            info["first_item_ms"] = first_item_ms
+        return info
+    
+    def error_result(self, error):
+        """构建识别失败时的结果字典"""
+        return {
+            "status": "error",
+            "error_message": str(error),
+            "ocr_results": [],
+            "total_detections": 0
+        }
+    
+    def build_frame(self, result_json, boxes=None):
+        """由结果字典和外接框数组构建OCR_RESULT中的单帧结果，元数据不含原始响应"""
+        metadata = {key: value for key, value in result_json.items()
+                    if key not in ("ocr_results", "original_response")}
+        if boxes is None:
+            return OCRFrame(metadata=metadata)
+        return OCRFrame.from_items(result_json["ocr_results"], boxes, metadata)
+    
+    def ocr_single_image(self, pil_image, api_key, custom_prompt, model, api_base_url,
+                         request_options=None, cache_ttl_seconds=None, upload_options=None, stream=False,
+                         coord_mode="auto"):
+        """
+        对单张图片进行OCR识别，返回 (标记图像, 结果字典, OCRFrame)
+        
+        cache_ttl_seconds不为None时启用结果缓存，相同像素和参数的请求直接返回缓存结果
+        upload_options为上传编码设置：format、quality、max_side
+        stream为True时使用流式接口，边接收边解析文字区域
+        coord_mode为API返回bbox_2d的坐标约定，见bbox_utils.COORD_MODES
+        """
+        try:
+            logger.info(f"图像尺寸：{pil_image.size}")
+            info = self.recognize_image(pil_image, api_key, custom_prompt, model, api_base_url,
+                                        request_options, cache_ttl_seconds, upload_options, stream, coord_mode)
+            ocr_results, boxes = normalize_ocr_results(
+                info["ocr_results"], pil_image.size[0], pil_image.size[1], "absolute"
+            )
             logger.info(f"解析到{len(ocr_results)}个文字区域")
             
             # 在图像上绘制边界框
-            marked_image = self.draw_bboxes_on_image(pil_image, ocr_results)
+            marked_image = self.draw_bboxes_on_image(pil_image, ocr_results, boxes)
             
-            # 创建mask
-            mask_image = self.create_mask_from_bboxes(pil_image.size, ocr_results)
-            
-            # 准备返回的JSON结果，确保UTF-8编码
             result_json = {
                 "status": "success",
                 "model_used": model,
                 "ocr_results": ocr_results,
                 "total_detections": len(ocr_results),
-                "original_response": api_result
+                "cache_hit": info["cache_hit"],
+                "original_response": info["original_response"]
             }
+            for key in ("upload", "first_item_ms"):
+                if info.get(key) is not None:
+                    result_json[key] = info[key]
+            return marked_image, result_json, self.build_frame(result_json, boxes)
             
-            # 转换回tensor格式
-            marked_tensor = self.pil_to_tensor(marked_image)
-            mask_tensor = self.pil_to_tensor(mask_image)
-            
-            # 确保JSON序列化时使用UTF-8编码
-            json_result = json.dumps(result_json, ensure_ascii=False, indent=2)
-            
-            return (marked_tensor, mask_tensor, json_result)
-            
+        except RequestCancelled:
+            raise
         except Exception as e:
             error_msg = f"OCR处理失败：{str(e)}"
             logger.error(error_msg)
             
-            # 返回错误信息
-            error_result = {
-                "status": "error",
-                "error_message": str(e),
-                "ocr_results": [],
-                "total_detections": 0
-            }
-            
-            # 返回原图和空mask
-            pil_image = self.tensor_to_pil(image)
-            empty_mask = Image.new('L', pil_image.size, 0)
-            
-            marked_tensor = self.pil_to_tensor(pil_image)
-            mask_tensor = self.pil_to_tensor(empty_mask)
+            # 返回原图和错误信息
+            error_result = self.error_result(e)
+            return pil_image, error_result, self.build_frame(error_result)
+    
+    def ocr_tiled_batch(self, pil_images, model, recognize, tile_size, tile_overlap, max_workers,
+                        iou_threshold=0.5, progress=None):
+        """
+        分块识别一批大图，返回每张图片的 (标记图像, 结果字典, OCRFrame)
+        
+        recognize为识别单个图块的函数，返回recognize_image格式的字典；
+        所有图片的全部图块放入同一个线程池并发请求，并发数不超过max_workers；
+        各图块的框平移回整图坐标后，用向量化的NMS合并重叠区域中的重复框
+        """
+        jobs = []
+        for image_index, pil_image in enumerate(pil_images):
+            width, height = pil_image.size
+            for tile in compute_tiles(width, height, tile_size, tile_overlap):
+                jobs.append((image_index, tile))
+        logger.info(f"分块识别{len(pil_images)}张图片，共{len(jobs)}个图块，最大并发数：{max_workers}")
+        if progress is not None:
+            progress.set_total(len(jobs))
+        
+        def run_tile(job):
+            image_index, tile = job
+            try:
+                return recognize(pil_images[image_index].crop(tile)), None
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"图块{tile}识别失败：{str(e)}")
+                return None, e
+            finally:
+                if progress is not None:
+                    progress.update()
+        
+        workers = max(1, min(len(jobs), max_workers))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qwen_vl_ocr") as executor:
+                tile_outputs = list(executor.map(run_tile, jobs))
+        else:
+            tile_outputs = [run_tile(job) for job in jobs]
+        
+        per_image = [[] for _ in pil_images]
+        for (image_index, tile), output in zip(jobs, tile_outputs):
+            per_image[image_index].append((tile, output))
+        
+        outputs = []
+        for pil_image, tiles in zip(pil_images, per_image):
+            succeeded = [(tile, info) for tile, (info, _) in tiles if info is not None]
+            errors = [str(error) for _, (info, error) in tiles if info is None]
+            if not succeeded:
+                error_result = self.error_result(errors[0] if errors else "没有可识别的图块")
+                outputs.append((pil_image, error_result, self.build_frame(error_result)))
+                continue
             
-            json_result = json.dumps(error_result, ensure_ascii=False, indent=2)
+            ocr_results, boxes = normalize_ocr_results(merge_tile_results(
+                [(tile, info["ocr_results"]) for tile, info in succeeded], iou_threshold
+            ), pil_image.size[0], pil_image.size[1], "absolute")
+            logger.info(f"合并{len(succeeded)}个图块后得到{len(ocr_results)}个文字区域")
+            result_json = {
+                "status": "success",
+                "model_used": model,
+                "ocr_results": ocr_results,
+                "total_detections": len(ocr_results),
+                "cache_hit": all(info["cache_hit"] for _, info in succeeded),
+                "original_response": [info["original_response"] for _, info in succeeded],
+                "tiles": {
+                    "count": len(tiles),
+                    "failed": len(errors),
+                    "tile_size": int(tile_size),
+                    "overlap": int(tile_overlap)
+                }
+            }
+            if errors:
+                result_json["tiles"]["errors"] = errors
+            outputs.append((self.draw_bboxes_on_image(pil_image, ocr_results, boxes), result_json,
+                            self.build_frame(result_json, boxes)))
+        return outputs
+    
+    def process_ocr(self, image, api_key, custom_prompt, model, api_base_url=None, max_concurrency=4,
+                    max_retries=3, connect_timeout=10.0, read_timeout=60.0, use_cache=True, cache_ttl_hours=168.0,
+                    upload_format="png", upload_quality=90, max_side=0, mask_dilate=0, mask_feather=0.0,
+                    stream=False, enable_tiling=False, tile_size=2048, tile_overlap=256, tile_iou_threshold=0.5,
+                    coord_mode="auto", endpoint_pool="", balance_strategy="weighted_round_robin",
+                    include_raw_response=False, cancel_token=None, progress=None):
+        """
+        处理OCR识别，批量图片（或开启分块时的全部图块）并发请求API
+        
+        cancel_token被取消时中断进行中的请求；progress在每张图片（或图块）完成后更新
+        """
+        pool = get_endpoint_pool(endpoint_pool, balance_strategy)
+        if pool is None and (not api_key or not api_key.strip()):
+            raise ValueError("请提供有效的阿里云百炼API Key")
+        
+        if api_base_url is None:
+            api_base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+        
+        request_options = {
+            "max_retries": int(max_retries),
+            "connect_timeout": float(connect_timeout),
+            "read_timeout": float(read_timeout),
+            "cancel_token": cancel_token,
+            "endpoint_pool": pool,
+        }
+        cache_ttl_seconds = float(cache_ttl_hours) * 3600 if use_cache else None
+        upload_options = {
+            "format": upload_format,
+            "quality": int(upload_quality),
+            "max_side": int(max_side),
+        }
+        
+        # 转换输入图像
+        pil_images = self.tensor_to_pil_batch(image)
+        batch_size = len(pil_images)
+        
+        def run(pil_image):
+            try:
+                return self.ocr_single_image(pil_image, api_key, custom_prompt, model, api_base_url,
+                                             request_options, cache_ttl_seconds, upload_options, bool(stream), coord_mode)
+            finally:
+                if progress is not None:
+                    progress.update()
+        
+        # 批量图片时并发请求，限制同时进行的请求数
+        max_workers = max(1, min(batch_size, int(max_concurrency)))
+        if enable_tiling:
+            def recognize(tile_image):
+                return self.recognize_image(tile_image, api_key, custom_prompt, model, api_base_url,
+                                            request_options, cache_ttl_seconds, upload_options, bool(stream), coord_mode)
             
-            return (marked_tensor, mask_tensor, json_result)
+            overlap = clamp_tile_overlap(tile_size, tile_overlap)
+            if overlap != int(tile_overlap):
+                logger.warning(f"图块重叠{int(tile_overlap)}像素超过图块边长{int(tile_size)}的一半，"
+                               f"实际使用{overlap}像素")
+            outputs = self.ocr_tiled_batch(pil_images, model, recognize, int(tile_size), overlap,
+                                           max(1, int(max_concurrency)), float(tile_iou_threshold), progress)
+        elif max_workers > 1:
+            logger.info(f"批量识别{batch_size}张图片，最大并发数：{max_workers}")
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="qwen_vl_ocr") as executor:
+                outputs = list(executor.map(run, pil_images))
+        else:
+            outputs = [run(pil_image) for pil_image in pil_images]
+        
+        # 转换回tensor格式
+        marked_tensor = pil_list_to_tensor([marked for marked, _, _ in outputs])
+        results = [result for _, result, _ in outputs]
+        if not include_raw_response:
+            # 原始响应只用于调试，下游节点使用ocr_result输出，不再重复序列化
+            results = [{key: value for key, value in result.items() if key != "original_response"}
+                       for result in results]
+        ocr_result = OCRResult([frame for _, _, frame in outputs])
+        
+        # 整批mask直接由框数组写入预分配的张量，失败的图片对应空mask
+        width, height = pil_images[0].size
+        mask_tensor = build_mask_batch(ocr_result.frames, height, width, int(mask_dilate), float(mask_feather))
+        
+        # 单张图片保持原有的对象格式，批量时返回每张图片一个结果的数组
+        result_json = results[0] if batch_size == 1 else results
+        
+        if pool is not None:
+            logger.info(f"端点池状态：{pool.stats()}")
+        
+        # 紧凑格式序列化，确保JSON序列化时使用UTF-8编码
+        json_result = json.dumps(result_json, ensure_ascii=False, separators=(",", ":"))
+        
+        return (marked_tensor, mask_tensor, json_result, ocr_result)
+    
+    def run_ocr(self, **kwargs):
+        """同步执行入口：识别在后台线程进行，等待期间用户中断时立即取消进行中的HTTP请求"""
+        return run_cancellable(self.process_ocr, progress_total=len(kwargs["image"]), **kwargs)
+    
+    async def process_ocr_async(self, **kwargs):
+        """协程执行入口：等待API期间ComfyUI可以继续执行图中的其他独立分支"""
+        return await run_cancellable_async(self.process_ocr, progress_total=len(kwargs["image"]), **kwargs)
 
 # 节点映射
 NODE_CLASS_MAPPINGS = {
@@ -0,0 +1,433 @@
+import os
+import re
+import logging
+
+from .cache_utils import LRUCache
+from .font_utils import load_font, resolve_font_path
+
+logger = logging.getLogger("text_layout")
+
+# 测量参考字号：在该字号下测量一次文字尺寸，再按比例推算目标字号
+REFERENCE_FONT_SIZE = 100
+
+# 自动字号结果缓存容量，同一文字在同尺寸bbox中反复出现时直接复用
+FIT_CACHE_SIZE = int(os.environ.get("IYUNYA_FIT_CACHE_SIZE", "4096"))
+
+# 键为 (文字, 目标宽, 目标高, 最小字号, 最大字号, 字体路径)
+_fit_cache = LRUCache(maxsize=FIT_CACHE_SIZE, name="font_fit")
+
+
+def measure_text(font, text):
+    """测量文字在指定字体下的宽高（与ImageDraw.textbbox在原点处的结果一致）"""
+    left, top, right, bottom = font.getbbox(text)
+    return right - left, bottom - top
+
+
+def fit_single_line(text, font_path, target_width, target_height, min_size=6, max_size=500):
+    """
+    计算单行文字能放入目标尺寸的最大字号
+
+    先在参考字号下测量一次，利用字形尺寸随字号线性缩放的特性推算字号，
+    再测量推算值和一个相邻字号修正取整和hinting带来的误差，总共最多测量3次。
+
+    返回 (字号, 测量次数)
+    """
+    if max_size < min_size:
+        max_size = min_size
+
+    ref_font = load_font(font_path, REFERENCE_FONT_SIZE)
+    ref_width, ref_height = measure_text(ref_font, text)
+    probes = 1
+
+    if not font_path:
+        # PIL默认字体不随字号缩放，尺寸是否合适与字号无关
+        fits = ref_width <= target_width and ref_height <= target_height
+        return (max_size if fits else min_size), probes
+
+    if ref_width <= 0 and ref_height <= 0:
+        return min_size, probes
+
+    # 按宽高两个方向的约束推算字号，取更严格的一个
+    scales = []
+    if ref_width > 0:
+        scales.append(target_width / ref_width)
+    if ref_height > 0:
+        scales.append(target_height / ref_height)
+    size = int(min(scales) * REFERENCE_FONT_SIZE)
+    size = max(min_size, min(size, max_size))
+
+    def fits_at(font_size):
+        width, height = measure_text(load_font(font_path, font_size), text)
+        return width <= target_width and height <= target_height, width, height
+
+    fits, width, height = fits_at(size)
+    probes += 1
+
+    if fits:
+        # 推算值可用，校验大一号是否也能放下（字形尺寸线性缩放，最多差一号）
+        if size < max_size:
+            bigger_fits, _, _ = fits_at(size + 1)
+            probes += 1
+            if bigger_fits:
+                size += 1
+    elif size > min_size:
+        # 推算值偏大（hinting误差），按实测尺寸修正一次；修正值仍放不下时再减一号，不再测量
+        shrink = min(
+            target_width / width if width > 0 else 1.0,
+            target_height / height if height > 0 else 1.0,
+        )
+        corrected = max(min_size, min(size - 1, int(size * shrink)))
+        fits, _, _ = fits_at(corrected)
+        probes += 1
+        size = corrected if fits else corrected - 1
+
+    return max(min_size, min(size, max_size)), probes
+
+
+def fit_font_size(text, font_path, target_width, target_height, min_size=6, max_size=500):
+    """
+    带缓存的fit_single_line，命中时不做任何字体测量
+
+    返回 (字号, 测量次数)，命中缓存时测量次数为0
+    """
+    font_key = resolve_font_path(font_path) if font_path else None
+    key = (text, int(target_width), int(target_height), int(min_size), int(max_size), font_key)
+    cached = _fit_cache.get(key)
+    if cached is not None:
+        return cached, 0
+
+    size, probes = fit_single_line(text, font_path, target_width, target_height, min_size, max_size)
+    _fit_cache.put(key, size)
+    return size, probes
+
+
+def get_fit_cache_stats():
+    """返回自动字号缓存的命中统计"""
+    return _fit_cache.stats()
+
+
+def set_fit_cache_size(maxsize):
+    """调整自动字号缓存容量"""
+    _fit_cache.resize(maxsize)
+
+
+def clear_fit_cache():
+    """清空自动字号缓存"""
+    _fit_cache.clear()
+
+
+# ---------------------------------------------------------------------------
+# 多行/竖排排版：同时选择字号和换行位置
+# ---------------------------------------------------------------------------
+
+# 排版方向：horizontal横排，vertical竖排（列从右到左），auto对纯CJK文字取两者中字号更大的一种
+TEXT_DIRECTIONS = ["horizontal", "vertical", "auto"]
+
+# 竖排相邻两列的间距（相对于列宽）
+VERTICAL_COLUMN_SPACING = 1.1
+
+# 字形宽度表缓存容量（每个条目是一个字体文件的 {字符: 参考字号下的advance} 表）
+GLYPH_ADVANCE_CACHE_SIZE = int(os.environ.get("IYUNYA_GLYPH_ADVANCE_CACHE_SIZE", "64"))
+
+# 键为 (解析后的字体路径, face索引)
+_advance_tables = LRUCache(maxsize=GLYPH_ADVANCE_CACHE_SIZE, name="glyph_advance")
+
+# 键为 (文字, 目标宽, 目标高, 最小字号, 最大字号, 字体路径, 方向)
+_layout_cache = LRUCache(maxsize=FIT_CACHE_SIZE, name="text_layout")
+
+# CJK表意文字、假名、谚文和全角符号逐字断行；其余连续的非空白字符视为一个单词
+_CJK = (
+    "\u2e80-\u2fdf\u3000-\u303f\u3040-\u30ff\u3100-\u31ff\u3200-\u9fff"
+    "\uac00-\ud7af\uf900-\ufaff\ufe30-\ufe4f\uff00-\uffef"
+)
+# 不能出现在行首的标点，跟随在前一个字符后面
+_CLOSING = "，。、！？；：）」』】》〉”’…%％,.!?;:)]}"
+_BREAK_UNIT_RE = re.compile(
+    "[{cjk}][{close}]*|[^\\s{cjk}]+[{close}]*\\s*|\\s+".format(
+        cjk=_CJK, close=re.escape(_CLOSING))
+)
+
+_CJK_TEXT_RE = re.compile("[{cjk}{close}\\s]+".format(cjk=_CJK, close=re.escape(_CLOSING)))
+
+
+def is_cjk_text(text):
+    """文字是否只由CJK字符、标点和空白组成（auto方向时只有这类文字才考虑竖排）"""
+    return bool(text.strip()) and _CJK_TEXT_RE.fullmatch(text) is not None
+
+
+def glyph_advances(font_path, text):
+    """
+    返回text中每个字符在参考字号下的advance宽度列表
+
+    每个字体只维护一张 {字符: 宽度} 表，每个字符只测量一次；
+    advance随字号线性缩放，其他字号乘以 字号 / REFERENCE_FONT_SIZE 即可
+    """
+    resolved = resolve_font_path(font_path)
+    table = _advance_tables.get_or_create((resolved, 0), dict)
+    advances = []
+    font = None
+    for char in text:
+        advance = table.get(char)
+        if advance is None:
+            if font is None:
+                font = load_font(font_path, REFERENCE_FONT_SIZE)
+            advance = table[char] = font.getlength(char)
+        advances.append(advance)
+    return advances
+
+
+def font_line_height(font_path):
+    """返回参考字号下的行高（ascent + descent）"""
+    ascent, descent = load_font(font_path, REFERENCE_FONT_SIZE).getmetrics()
+    return ascent + descent
+
+
+def split_break_units(text):
+    """
+    将一段文字（不含换行符）拆分为断行单元
+
+    CJK字符逐字为一个单元，西文单词连同其后的空格为一个单元，
+    句末标点附在前一个单元上，避免出现在行首
+    """
+    return _BREAK_UNIT_RE.findall(text)
+
+
+class TextLayout:
+    """
+    排版结果
+
+    横排时lines为各行文字，line_pitch为行距；竖排时lines为各列文字（从右到左），
+    line_pitch为列距，字符逐个以字号为间距从上到下排列。width/height为文字块尺寸
+    """
+
+    __slots__ = ("size", "lines", "vertical", "line_pitch", "width", "height")
+
+    def __init__(self, size, lines, vertical, line_pitch, width, height):
+        self.size = size
+        self.lines = lines
+        self.vertical = vertical
+        self.line_pitch = line_pitch
+        self.width = width
+        self.height = height
+
+
+class _Paragraphs:
+    """一段文字按换行符拆成的段落，及参考字号下各断行单元的宽度"""
+
+    def __init__(self, text, font_path):
+        self.paragraphs = []
+        for paragraph in text.split("\n"):
+            units = split_break_units(paragraph)
+            widths = []
+            trimmed = []
+            for unit in units:
+                advances = glyph_advances(font_path, unit)
+                widths.append(sum(advances))
+                # 行尾的空格不计入行宽
+                stripped = len(unit.rstrip())
+                trimmed.append(sum(advances[:stripped]))
+            self.paragraphs.append((units, widths, trimmed))
+        self.max_glyph = max(glyph_advances(font_path, text.replace("\n", "")) or [0.0])
+        self.char_counts = [len(paragraph.strip()) for paragraph in text.split("\n")]
+
+    def wrap(self, max_width, font_path, split_words=False):
+        """
+        按参考字号下的最大行宽贪心断行，返回 [(行文字, 行宽), ...]
+
+        单个单词比行宽还长时，split_words为True则在单词内部逐字断开，否则返回None；
+        有字符比行宽还宽时返回None
+        """
+        if self.max_glyph > max_width:
+            return None
+        lines = []
+        for units, widths, trimmed in self.paragraphs:
+            current, current_width, current_trimmed = [], 0.0, 0.0
+            for unit, width, trimmed_width in zip(units, widths, trimmed):
+                if current and current_width + trimmed_width > max_width:
+                    lines.append(("".join(current).rstrip(), current_trimmed))
+                    current, current_width, current_trimmed = [], 0.0, 0.0
+                    if not unit.strip():
+                        continue
+                if trimmed_width > max_width:
+                    if not split_words:
+                        return None
+                    # 超长单词逐字断开
+                    for char, advance in zip(unit, glyph_advances(font_path, unit)):
+                        if current and current_width + advance > max_width and char.strip():
+                            lines.append(("".join(current).rstrip(), current_trimmed))
+                            current, current_width, current_trimmed = [], 0.0, 0.0
+                        current.append(char)
+                        current_width += advance
+                        if char.strip():
+                            current_trimmed = current_width
+                    continue
+                current.append(unit)
+                current_trimmed = current_width + trimmed_width
+                current_width += width
+            lines.append(("".join(current).rstrip(), current_trimmed))
+        return lines
+
+
+def _search_largest(min_size, max_size, fits):
+    """在 [min_size, max_size] 中二分查找满足fits的最大字号，都不满足时返回None"""
+    best = None
+    low, high = min_size, max_size
+    while low <= high:
+        mid = (low + high) // 2
+        result = fits(mid)
+        if result is not None:
+            best = (mid, result)
+            low = mid + 1
+        else:
+            high = mid - 1
+    return best
+
+
+def _layout_horizontal(paragraphs, font_path, target_width, target_height, min_size, max_size, wrap=True):
+    """
+    横排多行排版：二分查找字号，每个候选字号只用缓存的单元宽度重新断行
+
+    wrap为False时只在换行符处断行，每段一行
+    """
+    line_height = font_line_height(font_path)
+    split_words = False
+
+    def fits(size):
+        scale = size / REFERENCE_FONT_SIZE
+        max_width = target_width / scale
+        lines = paragraphs.wrap(max_width if wrap else float("inf"), font_path, split_words)
+        if lines is None or len(lines) * line_height * scale > target_height:
+            return None
+        if not wrap and max(width for _, width in lines) > max_width:
+            return None
+        return lines
+
+    # 优先只在单词之间断行，任何字号都放不下时才允许拆开单词
+    found = _search_largest(min_size, max_size, fits)
+    if found is None and wrap:
+        split_words = True
+        found = _search_largest(min_size, max_size, fits)
+    if found is None:
+        return None
+    size, lines = found
+
+    # 逐字宽度之和忽略了字距调整和hinting，用实际字体校验最终结果，超出时下调字号
+    while True:
+        font = load_font(font_path, size)
+        texts = [line for line, _ in lines]
+        widths = [font.getlength(line) for line in texts]
+        if max(widths) <= target_width or size <= min_size:
+            break
+        size -= 1
+        lines = fits(size) or lines
+    pitch = int(round(line_height * size / REFERENCE_FONT_SIZE))
+    return TextLayout(size, texts, False, pitch, int(round(max(widths))), pitch * len(texts))
+
+
+def _layout_vertical(paragraphs, font_path, target_width, target_height, min_size, max_size):
+    """竖排排版：字符以字号为间距从上到下排列，放不下时换到左侧的新列"""
+    column_width = paragraphs.max_glyph
+
+    def fits(size):
+        scale = size / REFERENCE_FONT_SIZE
+        per_column = int(target_height // size)
+        if per_column <= 0 or column_width * scale > target_width:
+            return None
+        columns = sum(max(1, -(-count // per_column)) for count in paragraphs.char_counts)
+        width = ((columns - 1) * VERTICAL_COLUMN_SPACING + 1) * column_width * scale
+        if width > target_width:
+            return None
+        return per_column
+
+    found = _search_largest(min_size, max_size, fits)
+    if found is None:
+        return None
+    size, per_column = found
+
+    columns = []
+    for units, _, _ in paragraphs.paragraphs:
+        chars = "".join(units).strip()
+        columns.extend(chars[i:i + per_column] for i in range(0, len(chars), per_column))
+        if not chars:
+            columns.append("")
+    scale = size / REFERENCE_FONT_SIZE
+    pitch = int(round(column_width * scale * VERTICAL_COLUMN_SPACING))
+    width = int(round(column_width * scale)) + pitch * (len(columns) - 1)
+    height = size * max(len(column) for column in columns)
+    return TextLayout(size, columns, True, pitch, width, height)
+
+
+def layout_text(text, font_path, target_width, target_height, min_size=6, max_size=500, direction="horizontal",
+                wrap=True):
+    """
+    计算文字放入目标尺寸时的最大字号及对应的换行方式
+
+    横排时先按单行计算（与fit_font_size结果一致），再尝试多行排版，取字号更大的一种；
+    wrap为False时横排不自动换行，只在文字自带的换行符处分行。
+    竖排时逐字排列成列。direction为auto时，纯CJK文字在横排和竖排中取字号更大的一种，其他文字只横排。
+    没有可缩放字体时退化为单行。返回TextLayout
+    """
+    if max_size < min_size:
+        max_size = min_size
+    font_key = resolve_font_path(font_path) if font_path else None
+    key = (text, int(target_width), int(target_height), int(min_size), int(max_size), font_key, direction,
+           bool(wrap))
+    cached = _layout_cache.get(key)
+    if cached is not None:
+        return cached
+
+    best = None
+    if "\n" not in text and (direction != "vertical" or not font_path):
+        size, _ = fit_font_size(text, font_path, target_width, target_height, min_size, max_size)
+        width, height = measure_text(load_font(font_path, size), text)
+        best = TextLayout(size, [text], False, height, width, height)
+
+    if font_path:
+        paragraphs = _Paragraphs(text, font_path)
+        candidates = []
+        # 不换行的单行文字已由上面的单行计算得到
+        if direction in ("horizontal", "auto") and (wrap or "\n" in text):
+            candidates.append(_layout_horizontal(
+                paragraphs, font_path, target_width, target_height, min_size, max_size, wrap))
+        if direction == "vertical" or (direction == "auto" and is_cjk_text(text)):
+            candidates.append(_layout_vertical(
+                paragraphs, font_path, target_width, target_height, min_size, max_size))
+        for candidate in candidates:
+            if candidate is not None and (best is None or candidate.size > best.size):
+                best = candidate
+
+    if best is None:
+        # 最小字号也放不下：按最小字号单行/逐行显示
+        font = load_font(font_path, min_size)
+        lines = text.split("\n")
+        widths = [measure_text(font, line)[0] for line in lines]
+        pitch = sum(font.getmetrics()) if font_path else measure_text(font, text)[1]
+        best = TextLayout(min_size, lines, False, pitch, max(widths), pitch * len(lines))
+
+    _layout_cache.put(key, best)
+    return best
+
+
+def layout_fixed(text, font_path, size, direction="horizontal"):
+    """固定字号排版：只在换行符处断行，竖排时每段一列"""
+    paragraphs = text.split("\n")
+    font = load_font(font_path, size)
+    if direction == "vertical" and font_path:
+        column_width = max(glyph_advances(font_path, text.replace("\n", "")) or [0.0]) * size / REFERENCE_FONT_SIZE
+        pitch = int(round(column_width * VERTICAL_COLUMN_SPACING))
+        width = int(round(column_width)) + pitch * (len(paragraphs) - 1)
+        return TextLayout(size, paragraphs, True, pitch, width, size * max(len(p) for p in paragraphs))
+    widths = [measure_text(font, line)[0] for line in paragraphs]
+    pitch = sum(font.getmetrics()) if font_path else measure_text(font, text)[1]
+    return TextLayout(size, paragraphs, False, pitch, max(widths), pitch * len(paragraphs))
+
+
+def get_layout_cache_stats():
+    """返回排版结果缓存和字形宽度表缓存的命中统计"""
+    return {"layout": _layout_cache.stats(), "glyph_advance": _advance_tables.stats()}
+
+
+def clear_layout_cache():
+    """清空排版结果缓存和字形宽度表"""
+    _layout_cache.clear()
+    _advance_tables.clear()
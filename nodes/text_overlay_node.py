@@ -1,13 +1,23 @@
 import os
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import torch
 from PIL import Image, ImageDraw, ImageFont
-import platform
+
+from .font_utils import load_font, get_available_fonts, find_font_path
+from .text_layout import fit_font_size, layout_text, layout_fixed, TEXT_DIRECTIONS, get_layout_cache_stats
+from .image_utils import tensor_to_pil_list, pil_list_to_tensor, composite_layer
+from .text_raster_cache import get_text_patch, paste_text_patch, get_text_raster_cache_stats
+from .bbox_utils import COORD_MODES, normalize_ocr_results
+from .ocr_result import OCR_RESULT_TYPE, OCRFrame
 
 logger = logging.getLogger("text_overlay")
 
+# 批量图片并行绘制的最大线程数
+OVERLAY_MAX_WORKERS = int(os.environ.get("IYUNYA_OVERLAY_WORKERS", str(min(8, os.cpu_count() or 1))))
+
 class TextOverlayNode:
     """
     文字叠加显示节点 - 将OCR识别的文字内容显示在图片上
@@ -20,7 +30,8 @@ class TextOverlayNode:
                 "image": ("IMAGE",),
                 "ocr_json": ("STRING", {
                     "multiline": True,
-                    "tooltip": "OCR识别结果的JSON字符串"
+                    "default": "",
+                    "tooltip": "OCR识别结果的JSON字符串，批量图片可传入每帧一个结果的JSON数组；连接了ocr_result时可留空"
                 }),
                             "font_size_mode": (["auto_fit", "max_fill", "fixed"], {
                 "default": "auto_fit",
@@ -69,6 +80,21 @@ class TextOverlayNode:
                     "default": "",
                     "multiline": False,
                     "tooltip": "自定义字体文件路径，留空使用系统默认字体"
+                }),
+                "coord_mode": (COORD_MODES, {
+                    "default": "auto",
+                    "tooltip": "bbox_2d的坐标约定：absolute像素坐标、norm_1000为0~1000归一化、norm_1为0~1归一化，auto按坐标范围自动判断"
+                }),
+                "enable_wrap": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "自动模式下允许文字换行：中日韩文字逐字断行、西文按单词断行，与字号一起选择使文字尽可能大"
+                }),
+                "text_direction": (TEXT_DIRECTIONS, {
+                    "default": "horizontal",
+                    "tooltip": "文字方向：horizontal横排，vertical竖排（列从右到左），auto自动选择字号更大的方向（仅自动模式）"
+                }),
+                "ocr_result": (OCR_RESULT_TYPE, {
+                    "tooltip": "OCR节点输出的结构化识别结果，连接后优先使用，省去JSON解析"
                 })
             }
         }
@@ -79,153 +105,43 @@ class TextOverlayNode:
     CATEGORY = "iyunya/文字处理"
     
     def tensor_to_pil(self, tensor):
-        """将tensor转换为PIL图像"""
-        if len(tensor.shape) == 4:
-            tensor = tensor[0]  # 取第一张图片
-        
-        image_np = tensor.cpu().numpy()
-        if image_np.max() <= 1.0:
-            image_np = (image_np * 255).astype(np.uint8)
-        else:
-            image_np = image_np.astype(np.uint8)
-            
-        return Image.fromarray(image_np)
+        """将tensor转换为PIL图像（批量输入时取第一张）"""
+        return tensor_to_pil_list(tensor[:1] if len(tensor.shape) == 4 else tensor)[0]
     
     def pil_to_tensor(self, pil_image):
         """将PIL图像转换为tensor"""
-        image_np = np.array(pil_image).astype(np.float32) / 255.0
-        return torch.from_numpy(image_np).unsqueeze(0)
+        return pil_list_to_tensor([pil_image])
+    
+    def tensor_to_pil_batch(self, tensor):
+        """将批量tensor转换为PIL图像列表"""
+        return tensor_to_pil_list(tensor)
+    
+    def pil_batch_to_tensor(self, pil_images):
+        """将PIL图像列表转换为批量tensor"""
+        return pil_list_to_tensor(pil_images)
     
     def get_font(self, font_size, font_path=""):
         """获取字体对象"""
         try:
-            if font_path and os.path.exists(font_path):
-                # 使用自定义字体
-                return ImageFont.truetype(font_path, font_size)
-            else:
-                # 尝试使用系统字体
-                system = platform.system()
-                if system == "Windows":
-                    # Windows系统字体路径
-                    font_paths = [
-                        "C:/Windows/Fonts/msyh.ttc",  # 微软雅黑
-                        "C:/Windows/Fonts/simhei.ttf",  # 黑体
-                        "C:/Windows/Fonts/simsun.ttc",  # 宋体
-                        "C:/Windows/Fonts/arial.ttf",  # Arial
-                    ]
-                elif system == "Darwin":  # macOS
-                    font_paths = [
-                        "/System/Library/Fonts/PingFang.ttc",  # 苹方
-                        "/System/Library/Fonts/Helvetica.ttc",  # Helvetica
-                        "/System/Library/Fonts/Arial.ttf",  # Arial
-                    ]
-                else:  # Linux
-                    font_paths = [
-                        # 中文字体优先
-                        "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
-                        "/usr/share/fonts/truetype/noto/NotoSerifCJK-Regular.ttc",
-                        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-                        "/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc",
-                        "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
-                        "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
-                        "/usr/share/fonts/truetype/arphic/ukai.ttc",
-                        "/usr/share/fonts/truetype/arphic/uming.ttc",
-                        "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
-                        "/usr/share/fonts/truetype/fonts-japanese-mincho.ttf",
-                        # 系统可能的其他中文字体位置
-                        "/System/Library/Fonts/PingFang.ttc",
-                        "/usr/share/fonts/TTF/DejaVuSans.ttf",
-                        "/usr/share/fonts/liberation/LiberationSans-Regular.ttf",
-                        # 备用西文字体
-                        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-                        "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-                    ]
-                
-                # 尝试加载系统字体
-                for font_path in font_paths:
-                    if os.path.exists(font_path):
-                        try:
-                            return ImageFont.truetype(font_path, font_size)
-                        except Exception:
-                            continue
-                
-                # 如果都失败了，尝试安装提示和使用默认字体
-                logger.warning("无法加载系统中文字体，建议安装字体包：sudo apt-get install fonts-noto-cjk fonts-wqy-microhei fonts-wqy-zenhei")
-                logger.warning("使用PIL默认字体，可能无法正确显示中文")
-                return ImageFont.load_default()
-                
+            font_file_path = self.get_font_path(font_path)
+            if font_file_path:
+                return load_font(font_file_path, font_size)
+
+            # 没有可用字体时使用默认字体
+            logger.warning("使用PIL默认字体，可能无法正确显示中文")
+            return load_font(None, font_size)
+
         except Exception as e:
             logger.warning(f"字体加载失败：{str(e)}，使用默认字体")
-            return ImageFont.load_default()
+            return load_font(None, font_size)
     
     def detect_available_fonts(self):
         """检测系统中可用的字体"""
-        system = platform.system()
-        available_fonts = []
-        
-        if system == "Windows":
-            font_paths = [
-                "C:/Windows/Fonts/msyh.ttc",
-                "C:/Windows/Fonts/simhei.ttf", 
-                "C:/Windows/Fonts/simsun.ttc",
-                "C:/Windows/Fonts/arial.ttf",
-            ]
-        elif system == "Darwin":  # macOS
-            font_paths = [
-                "/System/Library/Fonts/PingFang.ttc",
-                "/System/Library/Fonts/Helvetica.ttc",
-                "/System/Library/Fonts/Arial.ttf",
-            ]
-        else:  # Linux
-            font_paths = [
-                # 中文字体优先
-                "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
-                "/usr/share/fonts/truetype/noto/NotoSerifCJK-Regular.ttc",
-                "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-                "/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc",
-                "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
-                "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
-                "/usr/share/fonts/truetype/arphic/ukai.ttc",
-                "/usr/share/fonts/truetype/arphic/uming.ttc",
-                "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
-                "/usr/share/fonts/truetype/fonts-japanese-mincho.ttf",
-                # 系统可能的其他中文字体位置
-                "/System/Library/Fonts/PingFang.ttc",
-                "/usr/share/fonts/TTF/DejaVuSans.ttf",
-                "/usr/share/fonts/liberation/LiberationSans-Regular.ttf",
-                # 备用西文字体
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-                "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-            ]
-        
-        for path in font_paths:
-            if os.path.exists(path):
-                available_fonts.append(path)
-        
-        return available_fonts
+        return [path for _, path in get_available_fonts()]
 
     def get_font_path(self, font_path=""):
         """获取字体文件路径"""
-        if font_path and os.path.exists(font_path):
-            return font_path
-        
-        # 检测可用字体
-        available_fonts = self.detect_available_fonts()
-        
-        if available_fonts:
-            # 记录找到的字体
-            logger.info(f"检测到可用字体: {available_fonts[0]}")
-            return available_fonts[0]
-        else:
-            # 记录字体检测失败的详细信息
-            system = platform.system()
-            logger.warning(f"在{system}系统上未找到可用的中文字体")
-            if system == "Linux":
-                logger.warning("建议安装中文字体包:")
-                logger.warning("sudo apt-get install fonts-noto-cjk fonts-wqy-microhei fonts-wqy-zenhei")
-                logger.warning("或者: sudo apt-get install fonts-arphic-ukai fonts-arphic-uming")
-        
-        return None
+        return find_font_path(font_path)
     
     def calculate_auto_font_size(self, text, bbox, fill_ratio, font_path=""):
         """自动计算适合bbox的字体大小"""
@@ -237,92 +153,48 @@ class TextOverlayNode:
         target_width = int(bbox_width * fill_ratio)
         target_height = int(bbox_height * fill_ratio)
         
-        # 字体大小搜索范围
+        # 字体大小范围，根据bbox大小调整最大字体
         min_size = 6
-        max_size = min(500, max(bbox_width, bbox_height))  # 根据bbox大小调整最大字体
-        best_size = min_size
+        max_size = min(500, max(bbox_width, bbox_height))
         
         # 获取字体路径
         font_file_path = self.get_font_path(font_path)
         
-        # 二分查找最佳字体大小 - 提高精度
-        left, right = min_size, max_size
-        
-        while right - left > 1:  # 精确到1像素
-            mid_size = (left + right) // 2
-            
-            try:
-                # 测试字体
-                if font_file_path:
-                    test_font = ImageFont.truetype(font_file_path, mid_size)
-                else:
-                    test_font = ImageFont.load_default()
-                
-                # 创建临时绘制对象来测量文字尺寸
-                temp_img = Image.new('RGB', (max(bbox_width, 100), max(bbox_height, 100)))
-                temp_draw = ImageDraw.Draw(temp_img)
-                text_bbox = temp_draw.textbbox((0, 0), text, font=test_font)
-                text_width = text_bbox[2] - text_bbox[0]
-                text_height = text_bbox[3] - text_bbox[1]
-                
-                # 同时考虑宽度和高度限制，选择更严格的约束
-                width_fits = text_width <= target_width
-                height_fits = text_height <= target_height
-                
-                if width_fits and height_fits:
-                    best_size = mid_size
-                    left = mid_size  # 尝试更大的字体
-                else:
-                    right = mid_size  # 字体太大，尝试更小的
-                    
-            except Exception as e:
-                logger.warning(f"测试字体大小{mid_size}时出错：{str(e)}")
-                right = mid_size
-        
-        # 最终验证和微调
-        final_size = best_size
         try:
-            if font_file_path:
-                final_font = ImageFont.truetype(font_file_path, final_size)
-            else:
-                final_font = ImageFont.load_default()
-                
-            temp_img = Image.new('RGB', (max(bbox_width, 100), max(bbox_height, 100)))
-            temp_draw = ImageDraw.Draw(temp_img)
-            final_bbox = temp_draw.textbbox((0, 0), text, font=final_font)
-            final_width = final_bbox[2] - final_bbox[0]
-            final_height = final_bbox[3] - final_bbox[1]
-            
-            # 如果还有空间，尝试增大字体
-            while final_size < max_size:
-                test_size = final_size + 1
-                if font_file_path:
-                    test_font = ImageFont.truetype(font_file_path, test_size)
-                else:
-                    test_font = ImageFont.load_default()
-                    
-                test_bbox = temp_draw.textbbox((0, 0), text, font=test_font)
-                test_width = test_bbox[2] - test_bbox[0]
-                test_height = test_bbox[3] - test_bbox[1]
-                
-                if test_width <= target_width and test_height <= target_height:
-                    final_size = test_size
-                    final_width = test_width
-                    final_height = test_height
-                else:
-                    break
-                    
+            final_size, probes = fit_font_size(
+                text, font_file_path, target_width, target_height, min_size, max_size
+            )
         except Exception as e:
-            logger.warning(f"最终字体验证时出错：{str(e)}")
-        
-        # 确保字体大小在合理范围内
-        final_size = max(min_size, min(final_size, max_size))
+            logger.warning(f"计算字体大小时出错：{str(e)}")
+            final_size, probes = min_size, 0
         
-        logger.info(f"文字'{text[:10]}...'在bbox {bbox}(尺寸:{bbox_width}x{bbox_height})中，"
-                   f"目标尺寸:{target_width}x{target_height}，最终字体大小：{final_size}")
+        logger.debug(f"文字'{text[:10]}...'在bbox {bbox}(尺寸:{bbox_width}x{bbox_height})中，"
+                     f"目标尺寸:{target_width}x{target_height}，最终字体大小：{final_size}（测量{probes}次）")
         
         return final_size
     
+    def calculate_auto_layout(self, text, bbox, fill_ratio, font_path="", text_direction="horizontal", enable_wrap=True):
+        """自动计算适合bbox的字体大小和换行方式，返回TextLayout；enable_wrap为False时横排不自动换行"""
+        x1, y1, x2, y2 = bbox
+        bbox_width = x2 - x1
+        bbox_height = y2 - y1
+        target_width = int(bbox_width * fill_ratio)
+        target_height = int(bbox_height * fill_ratio)
+        min_size = 6
+        max_size = min(500, max(bbox_width, bbox_height))
+        
+        font_file_path = self.get_font_path(font_path)
+        try:
+            layout = layout_text(text, font_file_path, target_width, target_height, min_size, max_size,
+                                 text_direction, enable_wrap)
+        except Exception as e:
+            logger.warning(f"计算文字排版时出错：{str(e)}，使用默认字体的最小字号")
+            layout = layout_fixed(text, None, min_size)
+        
+        logger.debug(f"文字'{text[:10]}...'在bbox {bbox}中排版为{len(layout.lines)}"
+                     f"{'列' if layout.vertical else '行'}，字体大小：{layout.size}")
+        return layout
+    
     def parse_color(self, color_name):
         """解析颜色名称为RGB值"""
         color_map = {
@@ -364,8 +236,13 @@ class TextOverlayNode:
             # 默认在上方
             return (x1, max(0, y1 - text_height - 5))
     
-    def draw_text_with_background(self, draw, position, text, font, text_color, bg_color, text_alpha, enable_stroke=True):
-        """绘制带背景的文字"""
+    def draw_text_with_background(self, draw, position, text, font, text_color, bg_color, text_alpha, enable_stroke=True,
+                                  layer=None):
+        """
+        绘制带背景的文字（text_alpha在整个文字图层合成时统一应用）
+        
+        传入RGBA图层layer时，文字通过栅格缓存中的预渲染图块粘贴，重复文字不再重新栅格化
+        """
         x, y = position
         
         # 获取文字尺寸
@@ -390,6 +267,11 @@ class TextOverlayNode:
             stroke_color = (0, 0, 0) if sum(text_color) > 384 else (255, 255, 255)  # 根据文字颜色选择描边颜色
             stroke_width = max(1, font.size // 20)  # 根据字体大小调整描边宽度
             
+            if layer is not None:
+                patch, offset = get_text_patch(text, font, text_color, stroke_width, stroke_color)
+                paste_text_patch(layer, (x, y), patch, offset)
+                return text_width, text_height
+            
             try:
                 # 尝试使用stroke参数（PIL较新版本支持）
                 draw.text((x, y), text, font=font, fill=text_color, 
@@ -403,12 +285,56 @@ class TextOverlayNode:
                             draw.text((x + dx, y + dy), text, font=font, fill=stroke_color)
                 # 最后绘制主文字
                 draw.text((x, y), text, font=font, fill=text_color)
+        elif layer is not None:
+            # 有背景色或禁用描边时，直接粘贴无描边的文字图块
+            patch, offset = get_text_patch(text, font, text_color)
+            paste_text_patch(layer, (x, y), patch, offset)
         else:
             # 有背景色或禁用描边时，直接绘制文字
             draw.text((x, y), text, font=font, fill=text_color)
         
         return text_width, text_height
     
+    def draw_text_layout(self, draw, position, layout, font, text_color, bg_color, text_alpha, enable_stroke=True,
+                         layer=None):
+        """
+        绘制多行或竖排文字块：背景覆盖整个文字块，每行（竖排时每个字）复用单行文字的绘制和栅格缓存
+        
+        横排各行水平居中；竖排各列从右到左，字符在列内水平居中
+        """
+        x, y = position
+        
+        if bg_color is not None:
+            padding = 2
+            draw.rectangle([x - padding, y - padding, x + layout.width + padding, y + layout.height + padding],
+                           fill=bg_color)
+        
+        # 背景已整体绘制，逐行绘制时不再重复绘制背景，描边规则与单行文字一致
+        stroke = enable_stroke and bg_color is None
+        if layout.vertical:
+            column_width = layout.width - layout.line_pitch * (len(layout.lines) - 1)
+            for column_index, column in enumerate(layout.lines):
+                column_x = x + layout.width - column_width - layout.line_pitch * column_index
+                for char_index, char in enumerate(column):
+                    if not char.strip():
+                        continue
+                    char_x = column_x + (column_width - font.getlength(char)) / 2
+                    self.draw_text_with_background(
+                        draw, (char_x, y + layout.size * char_index), char, font,
+                        text_color, None, text_alpha, stroke, layer=layer
+                    )
+        else:
+            for line_index, line in enumerate(layout.lines):
+                if not line.strip():
+                    continue
+                line_x = x + (layout.width - font.getlength(line)) / 2
+                self.draw_text_with_background(
+                    draw, (line_x, y + layout.line_pitch * line_index), line, font,
+                    text_color, None, text_alpha, stroke, layer=layer
+                )
+        
+        return layout.width, layout.height
+    
     def parse_ocr_json(self, ocr_json_str):
         """解析OCR JSON结果"""
         try:
@@ -446,95 +372,187 @@ class TextOverlayNode:
             logger.error(f"OCR数据解析失败：{str(e)}")
             return []
     
-    def overlay_text(self, image, ocr_json, font_size_mode, font_size, fill_ratio, 
-                    text_color, background_color, position_mode, enable_stroke, text_alpha=1.0, font_path=""):
-        """在图片上叠加文字"""
+    def parse_ocr_batch(self, ocr_json_str, batch_size):
+        """解析OCR JSON，返回与图片批次一一对应的结果列表"""
         try:
-            # 转换输入图像
-            pil_image = self.tensor_to_pil(image)
-            
-            # 创建可绘制的图像副本
-            overlay_image = pil_image.copy()
-            draw = ImageDraw.Draw(overlay_image)
+            if isinstance(ocr_json_str, str):
+                ocr_data = json.loads(ocr_json_str)
+            else:
+                ocr_data = ocr_json_str
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON解析失败：{str(e)}")
+            return [[] for _ in range(batch_size)]
+        
+        # 每帧一个结果：[{"ocr_results": [...]}, ...] 或 [[...], [...]]
+        is_per_frame = (
+            isinstance(ocr_data, list) and len(ocr_data) > 0 and
+            all(isinstance(d, list) or (isinstance(d, dict) and "ocr_results" in d) for d in ocr_data)
+        )
+        if not is_per_frame:
+            # 所有帧共用同一个OCR结果
+            shared_results = self.parse_ocr_json(ocr_data)
+            return [shared_results for _ in range(batch_size)]
+        
+        frame_results = [self.parse_ocr_json(d) for d in ocr_data]
+        if len(frame_results) == 1:
+            return frame_results * batch_size
+        if len(frame_results) != batch_size:
+            logger.warning(f"OCR结果数量({len(frame_results)})与图片数量({batch_size})不一致，多余部分忽略，缺少的帧不绘制")
+            frame_results = (frame_results + [[] for _ in range(batch_size)])[:batch_size]
+        return frame_results
+    
+    def render_text_layer(self, image_size, frame, font_size_mode, font_size, fill_ratio,
+                          text_rgb, bg_rgb, position_mode, enable_stroke, text_alpha, font_path,
+                          enable_wrap=True, text_direction="horizontal"):
+        """
+        将单帧的所有文字、描边和背景绘制到一个透明RGBA图层上
+        
+        frame为OCRFrame，框数组已是该图像上的像素坐标
+        """
+        layer = Image.new('RGBA', image_size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(layer)
+        
+        # 绘制每个文字项
+        for i, (text_content, bbox) in enumerate(zip(frame.texts, frame.boxes.tolist())):
+            try:
+                
+                if not text_content.strip():
+                    continue
+                
+                # 根据模式决定字体大小和排版（layout为None时按单行绘制）
+                layout = None
+                if font_size_mode in ["auto_fit", "max_fill"]:
+                    # auto_fit自动适应模式，max_fill最大化填充模式使用99%填充率
+                    ratio = fill_ratio if font_size_mode == "auto_fit" else 0.99
+                    if enable_wrap or text_direction != "horizontal":
+                        layout = self.calculate_auto_layout(text_content, bbox, ratio, font_path, text_direction,
+                                                            enable_wrap)
+                        actual_font_size = layout.size
+                    else:
+                        actual_font_size = self.calculate_auto_font_size(
+                            text_content, bbox, ratio, font_path
+                        )
+                else:
+                    # 固定大小模式，竖排时每段文字一列
+                    actual_font_size = font_size
+                    if text_direction == "vertical":
+                        try:
+                            layout = layout_fixed(text_content, self.get_font_path(font_path), font_size, "vertical")
+                        except Exception as e:
+                            logger.warning(f"竖排排版时出错：{str(e)}，改为横排绘制")
+                font = self.get_font(actual_font_size, font_path)
+                
+                if layout is not None and not layout.vertical and len(layout.lines) == 1:
+                    layout = None
+                
+                # 获取文字尺寸
+                if layout is None:
+                    text_bbox = draw.textbbox((0, 0), text_content, font=font)
+                    text_size = (text_bbox[2] - text_bbox[0], text_bbox[3] - text_bbox[1])
+                else:
+                    text_size = (layout.width, layout.height)
+                
+                # 根据模式计算文字位置
+                if font_size_mode in ["auto_fit", "max_fill"]:
+                    # 自动模式下，文字居中显示在bbox内
+                    x1, y1, x2, y2 = bbox
+                    center_x = x1 + (x2 - x1) // 2 - text_size[0] // 2
+                    center_y = y1 + (y2 - y1) // 2 - text_size[1] // 2
+                    text_position = (center_x, center_y)
+                else:
+                    # 固定模式下，按照position_mode计算位置
+                    text_position = self.calculate_text_position(bbox, text_size, position_mode)
+                
+                # 绘制文字
+                if layout is None:
+                    self.draw_text_with_background(
+                        draw, text_position, text_content, font, 
+                        text_rgb, bg_rgb, text_alpha, enable_stroke, layer=layer
+                    )
+                else:
+                    self.draw_text_layout(
+                        draw, text_position, layout, font,
+                        text_rgb, bg_rgb, text_alpha, enable_stroke, layer=layer
+                    )
+                
+                logger.debug(f"已绘制文字 #{i+1}: '{text_content}' 字体大小:{actual_font_size} 位置:{text_position}")
+                
+            except Exception as e:
+                logger.error(f"绘制第{i+1}个文字项时出错：{str(e)}")
+                continue
+        
+        return layer
+    
+    def load_frames(self, ocr_json, ocr_result, batch_size, width, height, coord_mode="auto"):
+        """
+        返回与图片批次一一对应的OCRFrame列表，坐标已转换为像素坐标并裁剪到图像范围
+        
+        连接了结构化的ocr_result时直接使用其框数组，否则解析ocr_json
+        """
+        if ocr_result is not None:
+            return [frame.clipped(width, height) for frame in ocr_result.frames_for_batch(batch_size)]
+        
+        frames = []
+        for results in self.parse_ocr_batch(ocr_json, batch_size):
+            # 整帧的坐标一次性转换为像素坐标，裁剪到图像范围并去掉退化的框
+            items, boxes = normalize_ocr_results(results, width, height, coord_mode)
+            frames.append(OCRFrame.from_items(items, boxes))
+        return frames
+    
+    def overlay_text(self, image, ocr_json, font_size_mode, font_size, fill_ratio,
+                    text_color, background_color, position_mode, enable_stroke, text_alpha=1.0, font_path="",
+                    coord_mode="auto", enable_wrap=True, text_direction="horizontal", ocr_result=None):
+        """在图片上叠加文字，支持批量图片"""
+        try:
+            batch = image if len(image.shape) == 4 else image.unsqueeze(0)
+            batch_size, height, width = batch.shape[0], batch.shape[1], batch.shape[2]
             
             # 解析OCR结果
-            ocr_results = self.parse_ocr_json(ocr_json)
-            if not ocr_results:
+            ocr_frames = self.load_frames(ocr_json, ocr_result, batch_size, width, height, coord_mode)
+            if not any(ocr_frames):
                 logger.warning("没有找到有效的OCR结果")
-                return (self.pil_to_tensor(overlay_image),)
+                return (batch,)
             
-            logger.info(f"准备绘制{len(ocr_results)}个文字项，模式：{font_size_mode}")
+            total_items = sum(len(frame) for frame in ocr_frames)
+            logger.info(f"准备在{batch_size}张图片上绘制{total_items}个文字项，模式：{font_size_mode}")
             
             # 解析颜色
             text_rgb = self.parse_color(text_color)
             bg_rgb = self.parse_color(background_color)
             
-            # 绘制每个文字项
-            for i, result in enumerate(ocr_results):
-                try:
-                    bbox = result["bbox_2d"][:4]  # 确保只取前4个坐标值
-                    text_content = result["text_content"]
-                    
-                    if not text_content.strip():
-                        continue
-                    
-                    # 根据模式决定字体大小
-                    if font_size_mode == "auto_fit":
-                        # 自动适应模式
-                        actual_font_size = self.calculate_auto_font_size(
-                            text_content, bbox, fill_ratio, font_path
-                        )
-                        font = self.get_font(actual_font_size, font_path)
-                    elif font_size_mode == "max_fill":
-                        # 最大化填充模式 - 使用99%填充率
-                        actual_font_size = self.calculate_auto_font_size(
-                            text_content, bbox, 0.99, font_path
-                        )
-                        font = self.get_font(actual_font_size, font_path)
-                    else:
-                        # 固定大小模式
-                        font = self.get_font(font_size, font_path)
-                        actual_font_size = font_size
-                    
-                    # 获取文字尺寸
-                    text_bbox = draw.textbbox((0, 0), text_content, font=font)
-                    text_size = (text_bbox[2] - text_bbox[0], text_bbox[3] - text_bbox[1])
-                    
-                    # 根据模式计算文字位置
-                    if font_size_mode in ["auto_fit", "max_fill"]:
-                        # 自动模式下，文字居中显示在bbox内
-                        x1, y1, x2, y2 = bbox
-                        center_x = x1 + (x2 - x1) // 2 - text_size[0] // 2
-                        center_y = y1 + (y2 - y1) // 2 - text_size[1] // 2
-                        text_position = (center_x, center_y)
-                    else:
-                        # 固定模式下，按照position_mode计算位置
-                        text_position = self.calculate_text_position(bbox, text_size, position_mode)
-                    
-                    # 绘制文字
-                    self.draw_text_with_background(
-                        draw, text_position, text_content, font, 
-                        text_rgb, bg_rgb, text_alpha, enable_stroke
-                    )
-                    
-                    logger.info(f"已绘制文字 #{i+1}: '{text_content}' 字体大小:{actual_font_size} 位置:{text_position}")
-                    
-                except Exception as e:
-                    logger.error(f"绘制第{i+1}个文字项时出错：{str(e)}")
-                    continue
+            # 输出直接基于输入tensor的float32副本，文字图层合成时原地修改，不经过PIL往返转换
+            frames = np.array(batch.detach().cpu().numpy(), dtype=np.float32, copy=True)
+            
+            def render(index):
+                if not ocr_frames[index]:
+                    return
+                layer = self.render_text_layer(
+                    (width, height), ocr_frames[index], font_size_mode, font_size, fill_ratio,
+                    text_rgb, bg_rgb, position_mode, enable_stroke, text_alpha, font_path,
+                    enable_wrap, text_direction
+                )
+                # 一次性合成整个文字图层，text_alpha控制整体透明度
+                composite_layer(frames[index], layer, text_alpha)
+            
+            # 多帧时在线程池中并行绘制，PIL绘制和numpy合成时会释放GIL
+            max_workers = min(batch_size, OVERLAY_MAX_WORKERS)
+            if max_workers > 1:
+                with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="text_overlay") as executor:
+                    list(executor.map(render, range(batch_size)))
+            else:
+                for index in range(batch_size):
+                    render(index)
             
-            # 转换回tensor并返回
-            result_tensor = self.pil_to_tensor(overlay_image)
-            return (result_tensor,)
+            logger.info(f"文字栅格缓存：{get_text_raster_cache_stats()}")
+            logger.debug(f"排版缓存：{get_layout_cache_stats()}")
+            return (torch.from_numpy(frames),)
             
         except Exception as e:
             error_msg = f"文字叠加处理失败：{str(e)}"
             logger.error(error_msg)
             
             # 发生错误时返回原图
-            pil_image = self.tensor_to_pil(image)
-            result_tensor = self.pil_to_tensor(pil_image)
-            return (result_tensor,)
+            return (image,)
 
 # 节点映射
 NODE_CLASS_MAPPINGS = {
@@ -0,0 +1,78 @@
+import os
+import logging
+from PIL import Image, ImageDraw
+
+from .cache_utils import LRUCache
+
+logger = logging.getLogger("text_raster_cache")
+
+# 文字栅格缓存容量：条目数和总字节数（RGBA每像素4字节）
+TEXT_RASTER_CACHE_SIZE = int(os.environ.get("IYUNYA_TEXT_RASTER_CACHE_SIZE", "2048"))
+TEXT_RASTER_CACHE_MAX_BYTES = int(os.environ.get("IYUNYA_TEXT_RASTER_CACHE_MAX_MB", "128")) * 1024 * 1024
+
+# 键为 (文字, 字体标识, 填充色, 描边宽度, 描边颜色)，值为 (RGBA图块, 相对绘制原点的偏移)
+_raster_cache = LRUCache(
+    maxsize=TEXT_RASTER_CACHE_SIZE,
+    name="text_raster",
+    max_weight=TEXT_RASTER_CACHE_MAX_BYTES,
+    weigher=lambda entry: entry[0].width * entry[0].height * 4,
+)
+
+
+def font_identity(font):
+    """返回字体对象的标识：文件路径、字号和face索引；无路径的位图字体使用对象id"""
+    path = getattr(font, "path", None)
+    if path is None:
+        return ("<bitmap>", id(font))
+    return (path, getattr(font, "size", None), getattr(font, "index", 0))
+
+
+def render_text_patch(text, font, fill, stroke_width=0, stroke_fill=None):
+    """
+    将一段文字（含描边）栅格化为紧贴内容的透明RGBA图块
+
+    返回 (图块, (dx, dy))，在绘制原点(x, y)处粘贴到 (x + dx, y + dy) 与直接draw.text等效
+    """
+    left, top, right, bottom = font.getbbox(text, stroke_width=stroke_width)
+    patch = Image.new('RGBA', (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(patch)
+    if stroke_width > 0:
+        draw.text((-left, -top), text, font=font, fill=fill,
+                  stroke_width=stroke_width, stroke_fill=stroke_fill)
+    else:
+        draw.text((-left, -top), text, font=font, fill=fill)
+    return patch, (left, top)
+
+
+def get_text_patch(text, font, fill, stroke_width=0, stroke_fill=None):
+    """从缓存中获取文字图块，未命中时栅格化并写入缓存"""
+    key = (text, font_identity(font), tuple(fill), int(stroke_width),
+           tuple(stroke_fill) if stroke_fill is not None else None)
+    return _raster_cache.get_or_create(
+        key, lambda: render_text_patch(text, font, fill, stroke_width, stroke_fill)
+    )
+
+
+def paste_text_patch(layer, position, patch, offset):
+    """将文字图块alpha合成到RGBA图层的指定绘制原点，自动裁剪超出图层的部分"""
+    x = int(round(position[0])) + offset[0]
+    y = int(round(position[1])) + offset[1]
+    # alpha_composite不接受负坐标，超出左/上边界的部分从源图块裁掉
+    src_x, src_y = max(0, -x), max(0, -y)
+    dest_x, dest_y = max(0, x), max(0, y)
+    width = min(patch.width - src_x, layer.width - dest_x)
+    height = min(patch.height - src_y, layer.height - dest_y)
+    if width <= 0 or height <= 0:
+        return
+    layer.alpha_composite(patch, dest=(dest_x, dest_y),
+                          source=(src_x, src_y, src_x + width, src_y + height))
+
+
+def get_text_raster_cache_stats():
+    """返回文字栅格缓存的命中统计"""
+    return _raster_cache.stats()
+
+
+def clear_text_raster_cache():
+    """清空文字栅格缓存"""
+    _raster_cache.clear()
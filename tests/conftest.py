@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeAPIServer:
+    """
+    本地替身API服务器，按顺序返回预设的响应，队列为空时返回default
+
+    响应为 (状态码, 响应头dict, 响应体) 元组，响应体为dict时按JSON返回；
+    也可以是函数 handler(request_handler)，由函数自行写出响应（用于慢响应和SSE流）
+    """
+
+    def __init__(self, default=None):
+        self.default = default or (200, {}, {"choices": [{"message": {"content": "[]"}}]})
+        self.responses = deque()
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                with server._lock:
+                    server.requests.append({"path": self.path, "time": time.monotonic(),
+                                            "json": json.loads(body) if body else None})
+                    response = server.responses.popleft() if server.responses else server.default
+                if callable(response):
+                    response(self)
+                    return
+                status, headers, payload = response
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def enqueue(self, *responses):
+        with self._lock:
+            self.responses.extend(responses)
+
+    @property
+    def request_count(self):
+        with self._lock:
+            return len(self.requests)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def ok_response(content="[]", usage=None):
+    """chat/completions的成功响应"""
+    body = {"choices": [{"message": {"content": content}}]}
+    if usage is not None:
+        body["usage"] = usage
+    return 200, {}, body
+
+
+def slow_response(delay, response=None):
+    """等待delay秒后再返回response，等待期间客户端断开时直接结束"""
+    def handler(request_handler):
+        time.sleep(delay)
+        status, headers, payload = response or ok_response()
+        data = json.dumps(payload).encode("utf-8")
+        try:
+            request_handler.send_response(status)
+            request_handler.send_header("Content-Type", "application/json")
+            request_handler.send_header("Content-Length", str(len(data)))
+            request_handler.end_headers()
+            request_handler.wfile.write(data)
+        except OSError:
+            pass
+    return handler
+
+
+def sse_response(chunks, delay=0.0):
+    """以SSE流返回chat/completions增量，每个文本片段一个事件，最后发送[DONE]"""
+    def handler(request_handler):
+        try:
+            request_handler.send_response(200)
+            request_handler.send_header("Content-Type", "text/event-stream")
+            request_handler.end_headers()
+            for chunk in chunks:
+                event = {"choices": [{"delta": {"content": chunk}}]}
+                request_handler.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                request_handler.wfile.flush()
+                if delay:
+                    time.sleep(delay)
+            request_handler.wfile.write(b"data: [DONE]\n\n")
+            request_handler.wfile.flush()
+        except OSError:
+            pass
+    return handler
+
+
+@pytest.fixture
+def make_fake_server():
+    servers = []
+
+    def factory(default=None):
+        server = FakeAPIServer(default)
+        servers.append(server)
+        return server
+
+    yield factory
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def fake_server(make_fake_server):
+    return make_fake_server()
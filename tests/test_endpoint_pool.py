@@ -0,0 +1,175 @@
+import time
+import threading
+
+import pytest
+
+from conftest import ok_response
+from nodes.endpoint_pool import (BREAKER_FAILURE_THRESHOLD, TokenBucket, build_endpoint_pool,
+                                 parse_endpoint_config)
+from nodes.qwen_vl_client import APIRequestError, CancelToken, RequestCancelled
+
+PAYLOAD = {"model": "qwen-vl-max", "messages": [{"role": "user", "content": "hi"}]}
+RATE_LIMITED = (429, {"Retry-After": "0"}, {"error": "rate limited"})
+
+
+def make_pool(*entries, strategy="weighted_round_robin"):
+    """entries为 (服务器, 权重, qps) 元组，每个端点使用不同的API Key"""
+    return build_endpoint_pool([(f"sk-test-key-{index}", server.url, weight, qps, None)
+                                for index, (server, weight, qps) in enumerate(entries)], strategy)
+
+
+def post(pool, **options):
+    options.setdefault("backoff_base", 0.01)
+    options.setdefault("max_retries", 3)
+    return pool.post_json("/chat/completions", PAYLOAD, **options)
+
+
+def test_rate_limited_request_fails_over_to_another_endpoint(make_fake_server):
+    limited = make_fake_server(RATE_LIMITED)
+    healthy = make_fake_server(ok_response("ok"))
+    pool = make_pool((limited, 1, None), (healthy, 1, None))
+
+    assert post(pool)["choices"][0]["message"]["content"] == "ok"
+    assert limited.request_count == 1
+    assert healthy.request_count == 1
+    assert [stats["failures"] for stats in pool.stats()] == [1, 0]
+    assert all(stats["in_flight"] == 0 for stats in pool.stats())
+
+
+def test_single_endpoint_waits_for_retry_after(fake_server):
+    fake_server.enqueue((429, {"Retry-After": "0.3"}, {}), ok_response())
+    pool = make_pool((fake_server, 1, None))
+
+    post(pool, max_retries=1, backoff_base=0.0)
+
+    first, second = fake_server.requests
+    assert second["time"] - first["time"] >= 0.3
+
+
+def test_breaker_opens_after_threshold_and_lets_one_probe_through(make_fake_server):
+    limited = make_fake_server(RATE_LIMITED)
+    healthy = make_fake_server(ok_response())
+    pool = make_pool((limited, 1, None), (healthy, 1, None))
+    breaker = pool.endpoints[0].breaker
+
+    for _ in range(BREAKER_FAILURE_THRESHOLD * 4):
+        post(pool)
+    assert breaker.state == "open"
+    assert limited.request_count == BREAKER_FAILURE_THRESHOLD
+
+    # 冷却结束后只放行一个探测请求，探测失败重新熔断
+    breaker.reset_timeout = 0.2
+    time.sleep(0.25)
+    for _ in range(10):
+        post(pool)
+    assert limited.request_count == BREAKER_FAILURE_THRESHOLD + 1
+    assert breaker.state == "open"
+
+    # 探测成功后恢复
+    limited.default = ok_response()
+    time.sleep(0.25)
+    for _ in range(10):
+        post(pool)
+    assert breaker.state == "closed"
+    assert limited.request_count > BREAKER_FAILURE_THRESHOLD + 2
+
+
+def test_half_open_breaker_admits_only_one_concurrent_probe(make_fake_server):
+    pool = make_pool((make_fake_server(), 1, None))
+    endpoint = pool.endpoints[0]
+    for _ in range(BREAKER_FAILURE_THRESHOLD):
+        pool.acquire()
+        pool.release(endpoint, False)
+    assert endpoint.breaker.state == "open"
+
+    endpoint.breaker.reset_timeout = 0.0
+    probe, _ = pool.acquire()
+    assert probe is endpoint
+    assert endpoint.breaker.state == "half_open"
+    assert pool.acquire()[0] is None
+
+
+def test_all_endpoints_open_raises(make_fake_server):
+    limited = make_fake_server(RATE_LIMITED)
+    pool = make_pool((limited, 1, None))
+
+    with pytest.raises(APIRequestError):
+        post(pool, max_retries=BREAKER_FAILURE_THRESHOLD + 2, backoff_max=0.05)
+    assert limited.request_count == BREAKER_FAILURE_THRESHOLD
+
+
+def test_client_error_does_not_reset_or_close_the_breaker(fake_server):
+    fake_server.enqueue(RATE_LIMITED, RATE_LIMITED, (400, {}, {"error": "bad request"}))
+    pool = make_pool((fake_server, 1, None))
+    breaker = pool.endpoints[0].breaker
+
+    with pytest.raises(APIRequestError) as excinfo:
+        post(pool, max_retries=2)
+    assert excinfo.value.status_code == 400
+    assert breaker.failures == 2
+
+    # half_open时探测请求遇到400，不能恢复为closed
+    breaker.state, breaker.opened_at, breaker.reset_timeout = "open", 0.0, 0.0
+    fake_server.enqueue((400, {}, {}))
+    with pytest.raises(APIRequestError):
+        post(pool, max_retries=0)
+    assert breaker.state == "half_open"
+    assert breaker.failures == 2
+    assert pool.acquire()[0] is pool.endpoints[0]
+
+
+def test_cancelled_request_does_not_reset_the_breaker(fake_server):
+    fake_server.enqueue(RATE_LIMITED)
+    pool = make_pool((fake_server, 1, 1))
+    endpoint = pool.endpoints[0]
+
+    with pytest.raises(APIRequestError):
+        post(pool, max_retries=0)
+    # QPS额度已用完，第二个请求在限流等待中被取消
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    with pytest.raises(RequestCancelled):
+        post(pool, cancel_token=token)
+
+    assert fake_server.request_count == 1
+    assert endpoint.breaker.failures == 1
+    assert endpoint.in_flight == 0
+
+
+def test_qps_limit_spaces_requests(fake_server):
+    pool = make_pool((fake_server, 1, 5))
+
+    start = time.monotonic()
+    for _ in range(8):
+        post(pool)
+    elapsed = time.monotonic() - start
+
+    # 桶容量为5：前5个请求立即发出，之后每0.2秒一个
+    assert elapsed >= 0.55
+    times = [request["time"] for request in fake_server.requests]
+    # 桶空之后每个请求都要等一个完整的补充周期，与前5个请求耗时无关
+    assert times[-1] - times[5] >= 0.35
+
+
+def test_endpoints_sharing_a_key_share_the_limiter(make_fake_server):
+    first, second = make_fake_server(), make_fake_server()
+    pool = build_endpoint_pool(parse_endpoint_config(
+        f"sk-shared, {first.url}, 1, 2\nsk-shared, {second.url}, 1, 50"
+    ))
+
+    assert pool.endpoints[0].limiter is pool.endpoints[1].limiter
+    start = time.monotonic()
+    for _ in range(4):
+        post(pool)
+    assert time.monotonic() - start >= 0.9
+
+
+def test_token_bucket_wait_and_adjust():
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert bucket.try_consume(2) == 0
+    assert bucket.try_consume(1) == pytest.approx(0.1, abs=0.02)
+    bucket.adjust(-1)
+    assert bucket.try_consume(1) == 0
+    bucket.adjust(5)
+    assert bucket.wait_time(1) == pytest.approx(0.6, abs=0.05)
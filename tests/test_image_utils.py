@@ -0,0 +1,27 @@
+import pytest
+import torch
+
+from nodes.image_utils import tensor_to_pil_list, tensor_to_uint8
+
+
+def test_mask_batch_with_narrow_width_keeps_batch_dimension():
+    # [B, H, W] 的MASK宽度为3时不能被当作单张 [H, W, C] 图像
+    masks = torch.rand(5, 64, 3)
+
+    assert tensor_to_uint8(masks, kind="MASK").shape == (5, 64, 3)
+    frames = tensor_to_pil_list(masks, kind="MASK")
+    assert len(frames) == 5
+    assert frames[0].size == (3, 64)
+
+
+def test_single_frames_get_a_batch_dimension():
+    assert tensor_to_uint8(torch.rand(64, 3, 3)).shape == (1, 64, 3, 3)
+    assert tensor_to_uint8(torch.rand(8, 8), kind="MASK").shape == (1, 8, 8)
+    assert tensor_to_uint8(torch.rand(2, 8, 8, 3)).shape == (2, 8, 8, 3)
+
+
+def test_rejects_unknown_layout():
+    with pytest.raises(ValueError):
+        tensor_to_uint8(torch.rand(8, 8), kind="IMAGE")
+    with pytest.raises(ValueError):
+        tensor_to_uint8(torch.rand(8, 8), kind="LATENT")
@@ -0,0 +1,40 @@
+import numpy as np
+
+from nodes.mask_utils import clip_boxes, rasterize_frame, split_boxes_and_polygons
+
+
+def test_non_numeric_bbox_is_skipped_without_failing_the_batch():
+    boxes, polygons = split_boxes_and_polygons([
+        {"bbox_2d": [1, 2, 3, 4]},
+        {"bbox_2d": ["left", "top", "right", "bottom"]},
+        {"bbox_2d": ["5", "6", "7", "8"]},
+        {"bbox_2d": [None, 1, 2, 3]},
+        {"bbox_2d": [float("nan"), 1, 2, 3]},
+    ])
+
+    assert boxes.tolist() == [[1, 2, 3, 4], [5, 6, 7, 8]]
+    assert polygons == []
+
+
+def test_rasterized_boxes_match_per_box_fill():
+    rng = np.random.default_rng(0)
+    corners = rng.uniform(-40, 300, (200, 2))
+    boxes = np.concatenate([corners, corners + rng.uniform(-20, 60, (200, 2))], axis=1).astype(np.float32)
+    out = np.zeros((240, 320), dtype=np.float32)
+    out[0, 0] = 0.5
+
+    rasterize_frame(out, boxes, dilate=2)
+
+    expected = np.zeros_like(out)
+    expected[0, 0] = 0.5
+    for x1, y1, x2, y2 in clip_boxes(boxes, 240, 320, 2).tolist():
+        expected[y1:y2, x1:x2] = 1.0
+    assert np.array_equal(out, expected)
+
+
+def test_rasterize_without_boxes_leaves_frame_untouched():
+    out = np.zeros((8, 8), dtype=np.float32)
+
+    rasterize_frame(out, np.zeros((0, 4), dtype=np.float32))
+
+    assert not out.any()
@@ -0,0 +1,32 @@
+from nodes.node_registry import NodeRegistry, build_input_types
+
+
+def test_classes_are_registered_eagerly_and_attributes_built_on_first_access():
+    registry = NodeRegistry()
+    class_mappings, display_names = {}, {}
+    registry.attach(class_mappings, display_names)
+    config = {"id": "a", "group": "in", "name": "输入A", "inputs": {"prompt": "STRING", "seed": "INT"}}
+
+    info = registry.register(config)
+
+    node_class = class_mappings[info["node_name"]]
+    assert isinstance(node_class, type)
+    assert display_names[info["node_name"]] == "输入A"
+    assert "RETURN_TYPES" not in node_class.__dict__
+    assert node_class.RETURN_TYPES == ("STRING", "INT")
+    assert "RETURN_TYPES" in node_class.__dict__
+    assert node_class.INPUT_TYPES() == build_input_types(config)
+
+
+def test_batch_bumps_the_version_once():
+    registry = NodeRegistry()
+    registry.register_many([{"id": str(i), "group": "out"} for i in range(3)])
+    assert registry.version == 1
+
+    registry.apply_batch([{"id": "0", "group": "out", "name": "新名称"}], [("out", "0"), ("out", "missing")])
+
+    assert registry.version == 2
+    assert registry.count("out") == 3
+    assert registry.get_config("out", "0")["name"] == "新名称"
+    assert registry.unregister("out", "missing") is None
+    assert registry.version == 2
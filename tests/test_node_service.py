@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+from nodes.node_registry import NodeRegistry
+from nodes.node_service import NodeService, etag_matches
+from nodes.node_store import NodeConfigStore
+
+
+@pytest.fixture
+def service(tmp_path):
+    return NodeService(NodeRegistry(), NodeConfigStore(str(tmp_path), flush_interval=0))
+
+
+def saved_configs(service):
+    assert service.store.flush(5)
+    return NodeConfigStore(service.store.directory, flush_interval=0).load()
+
+
+def test_atomic_batch_with_an_invalid_item_changes_nothing(service):
+    service.apply_batch([{"id": "a", "inputs": {"x": "STRING"}}])
+    version = service.registry.version
+
+    results, applied = service.apply_batch([
+        {"id": "b", "group": "out"},
+        {"action": "delete", "id": "a"},
+        {"action": "update", "id": "missing", "name": "新名称"},
+    ])
+
+    assert not applied
+    assert [result["status"] for result in results] == ["skipped", "skipped", "failed"]
+    assert "节点不存在" in results[2]["message"]
+    assert service.registry.version == version
+    assert service.registry.get_config("out", "b") is None
+    assert [config["id"] for config in saved_configs(service)] == ["a"]
+
+
+def test_non_atomic_batch_applies_only_the_valid_items(service):
+    results, applied = service.apply_batch([
+        {"id": "a"},
+        {"id": "b", "name": ["不是字符串"]},
+        {"id": "c", "group": "side"},
+        {"id": "d", "inputs": {"x": 1}},
+    ], atomic=False)
+
+    assert applied
+    assert [result["status"] for result in results] == ["success", "failed", "failed", "failed"]
+    assert results[1]["message"] == "name必须是字符串"
+    assert results[0]["node"]["node_name"] == "iyunya_in_a"
+    assert service.registry.count("in") == 1
+
+
+def test_update_keeps_other_fields_and_ids_are_strings(service):
+    service.apply_batch([{"id": 7, "name": "旧名称", "inputs": {"x": "INT"}}])
+    create_time = service.registry.get_config("in", "7")["create_time"]
+
+    results, applied = service.apply_batch([{"action": "update", "id": 7, "name": "新名称"}])
+
+    assert applied and results[0]["id"] == "7"
+    config = service.registry.get_config("in", "7")
+    assert config == {"id": "7", "group": "in", "name": "新名称", "inputs": {"x": "INT"}, "create_time": create_time}
+    assert saved_configs(service) == [config]
+
+
+@pytest.mark.parametrize("item, message", [
+    ({"id": {"nested": 1}}, "节点ID必须是字符串或整数"),
+    ({"id": True}, "节点ID必须是字符串或整数"),
+    ({"action": "delete"}, "缺少节点ID"),
+    ({"action": "rename", "id": "a"}, "不支持的操作"),
+    ("a", "操作项必须是对象"),
+])
+def test_invalid_items_are_rejected(service, item, message):
+    results, applied = service.apply_batch([item])
+
+    assert not applied
+    assert message in results[0]["message"]
+
+
+def test_the_same_node_cannot_be_touched_twice_in_one_batch(service):
+    results, applied = service.apply_batch([{"id": "a"}, {"action": "delete", "id": "a"}])
+
+    assert not applied
+    assert "重复操作节点" in results[1]["message"]
+
+
+def node_list(service, **query):
+    etag, body = service.node_list(**query)
+    return etag, json.loads(body)
+
+
+def test_prefix_filter_handles_non_string_ids_and_names(service):
+    # 旧版配置文件中的ID和名称可能是数字，加载时原样注册
+    service.registry.register_many([{"id": 1024, "group": "in", "name": 42},
+                                    {"id": "10x", "group": "out"},
+                                    {"id": "b", "group": "in", "name": "1号"}])
+
+    _, result = node_list(service, prefix="10")
+    assert [node["id"] for node in result["nodes"]] == [1024, "10x"]
+    assert [node["id"] for node in node_list(service, prefix="4")[1]["nodes"]] == [1024]
+    assert [node["id"] for node in node_list(service, prefix="1", group="in")[1]["nodes"]] == [1024, "b"]
+
+
+def test_fields_and_pagination(service):
+    service.apply_batch([{"id": f"n{i}", "inputs": {"x": "STRING"}} for i in range(5)])
+
+    _, result = node_list(service, fields=["id", "return_types"], offset=1, limit=2)
+
+    assert result["nodes"] == [{"id": "n1", "return_types": ["STRING"]}, {"id": "n2", "return_types": ["STRING"]}]
+    assert (result["total"], result["offset"], result["limit"]) == (5, 1, 2)
+    assert len(node_list(service, offset=4)[1]["nodes"]) == 1
+
+
+def test_etag_changes_only_when_nodes_or_query_change(service):
+    service.apply_batch([{"id": "a"}])
+    etag, _ = service.node_list()
+
+    assert service.node_list()[0] == etag
+    assert etag_matches(etag, f'"other", {etag}')
+    assert etag_matches(etag, "*")
+    assert not etag_matches(etag, "")
+    assert service.node_list(prefix="a")[0] != etag
+
+    service.apply_batch([{"action": "update", "id": "a", "name": "改名"}])
+    new_etag, result = node_list(service)
+    assert new_etag != etag and not etag_matches(new_etag, etag)
+    assert result["nodes"][0]["display_name"] == "改名"
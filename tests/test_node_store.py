@@ -0,0 +1,150 @@
+import json
+
+import pytest
+
+from nodes import node_store
+from nodes.node_store import NodeConfigStore
+
+
+def config(node_id, group="in", **extra):
+    return {"id": node_id, "group": group, "name": f"节点{node_id}", **extra}
+
+
+def reopen(store):
+    assert store.flush(5)
+    return NodeConfigStore(store.directory, flush_interval=0)
+
+
+def read_lines(store):
+    with open(store.path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NodeConfigStore(str(tmp_path), flush_interval=0.05)
+
+
+def test_write_behind_coalesces_changes_into_one_append(store):
+    store.load()
+    store.put(config("a"))
+    store.put(config("b"))
+    store.put(config("a", name="改名"))
+    store.delete("in", "b")
+    store.put(config("b"))
+
+    assert store.flush(5)
+    lines = read_lines(store)
+    assert len(lines) == 1
+    assert [(r["op"], r["id"]) for r in json.loads(lines[0])["records"]] == [("put", "a"), ("del", "b"), ("put", "b")]
+    assert reopen(store).load() == [config("a", name="改名"), config("b")]
+
+
+def test_batch_is_written_as_one_line(store):
+    store.load()
+    store.put(config("old"))
+    store.flush(5)
+
+    store.apply_batch([config("x"), config("y", "out")], [("in", "old")])
+
+    assert store.flush(5)
+    assert len(read_lines(store)) == 2
+    assert reopen(store).configs() == [config("x"), config("y", "out")]
+
+
+def test_replay_after_compaction(store, monkeypatch):
+    monkeypatch.setattr(node_store, "COMPACT_MIN_GARBAGE", 4)
+    store.load()
+    for round_ in range(6):
+        store.put(config("a", round=round_))
+        store.flush(5)
+    store.put(config("b"))
+    store.flush(5)
+
+    store.compact()
+    store.put(config("c"))
+    store.delete("in", "a")
+
+    assert len(read_lines(reopen(store))) == 3
+    assert reopen(store).load() == [config("b"), config("c")]
+
+
+def test_torn_tail_is_dropped_on_load(store):
+    store.load()
+    store.put(config("a"))
+    store.flush(5)
+    with open(store.path, "a", encoding="utf-8") as f:
+        f.write('{"op":"put","group":"in","id":"b","con')
+
+    reloaded = reopen(store)
+    assert reloaded.load() == [config("a")]
+    reloaded.put(config("c"))
+    assert reopen(reloaded).load() == [config("a"), config("c")]
+
+
+class FailingFile:
+    """只写出一半数据就抛出OSError的文件，truncate_fails为True时截断也失败"""
+
+    def __init__(self, file, truncate_fails):
+        self.file = file
+        self.truncate_fails = truncate_fails
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+    def write(self, data):
+        self.file.write(bytes(data[:len(data) // 2]))
+        raise OSError("disk full")
+
+    def truncate(self, size):
+        if self.truncate_fails:
+            raise OSError("read-only file system")
+        return self.file.truncate(size)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+@pytest.mark.parametrize("truncate_fails", [False, True])
+def test_failed_append_does_not_glue_the_retry_onto_a_torn_line(store, monkeypatch, truncate_fails):
+    monkeypatch.setattr(node_store, "STORE_RETRY_INTERVAL", 0.05)
+    store.load()
+    store.put(config("a"))
+    store.flush(5)
+
+    failures = []
+
+    def failing_open(path, mode="r", *args, **kwargs):
+        file = open(path, mode, *args, **kwargs)
+        if mode == "ab" and not failures:
+            failures.append(path)
+            return FailingFile(file, truncate_fails)
+        return file
+
+    monkeypatch.setattr(node_store, "open", failing_open, raising=False)
+    store.put(config("b"))
+    store.put(config("c"))
+
+    assert store.flush(5)
+    assert failures
+    lines = read_lines(store)
+    assert len(lines) == (3 if truncate_fails else 2)
+    assert reopen(store).load() == [config("a"), config("b"), config("c")]
+
+
+def test_legacy_directories_are_migrated_once(tmp_path):
+    for group, node_id, create_time in [("in", "late", "2024-02-01 00:00:00"), ("out", "early", "2024-01-01 00:00:00")]:
+        (tmp_path / group).mkdir(exist_ok=True)
+        (tmp_path / group / f"{node_id}.json").write_text(
+            json.dumps({"id": node_id, "group": group, "create_time": create_time}), encoding="utf-8")
+    (tmp_path / "in" / "broken.json").write_text("{", encoding="utf-8")
+
+    store = NodeConfigStore(str(tmp_path), flush_interval=0)
+
+    assert [c["id"] for c in store.load()] == ["early", "late"]
+    assert not (tmp_path / "in").exists()
+    assert (tmp_path / "in.migrated" / "late.json").exists()
+    assert [c["id"] for c in reopen(store).load()] == ["early", "late"]
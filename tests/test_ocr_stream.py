@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from conftest import sse_response
+from nodes.ocr_stream_parser import IncrementalOCRParser, parse_ocr_items
+from nodes.qwen_vl_client import APIRequestError, stream_chat_completion
+
+ITEMS = [
+    {"bbox_2d": [10, 20, 110, 60], "text_content": "第一行 {带括号}"},
+    {"bbox_2d": [10, 80, 210, 120], "text_content": "He said \"hi\" ]"},
+    {"bbox_2d": [5, 140, 95, 170], "text_content": "末尾\\"},
+]
+CONTENT = "识别结果如下：\n```json\n" + json.dumps(ITEMS, ensure_ascii=False, indent=2) + "\n```\n以上。"
+
+
+def feed_in_chunks(content, size):
+    parser = IncrementalOCRParser()
+    items = []
+    for start in range(0, len(content), size):
+        items.extend(parser.feed(content[start:start + size]))
+    return parser, items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 1000])
+def test_items_split_across_chunks(size):
+    parser, items = feed_in_chunks(CONTENT, size)
+
+    assert items == ITEMS
+    assert parser.items_emitted == len(ITEMS)
+
+
+def test_item_is_emitted_as_soon_as_its_object_closes():
+    parser = IncrementalOCRParser()
+    first = json.dumps(ITEMS[0], ensure_ascii=False)
+
+    assert parser.feed("[" + first[:-1]) == []
+    assert parser.feed("}") == [ITEMS[0]]
+    assert parser.feed(", " + json.dumps(ITEMS[1], ensure_ascii=False)[:10]) == []
+
+
+def test_results_wrapped_in_outer_object():
+    content = json.dumps({"results": ITEMS, "meta": {"count": 3}}, ensure_ascii=False)
+
+    assert feed_in_chunks(content, 5)[1] == ITEMS
+
+
+def test_malformed_objects_and_stray_brackets_are_skipped():
+    content = '说明] 文字 {"bbox_2d": [1, 2, 3], "text_content": oops} ' + json.dumps(ITEMS[0], ensure_ascii=False)
+
+    assert parse_ocr_items(content) == [ITEMS[0]]
+    assert parse_ocr_items("") == []
+
+
+def test_stream_chat_completion_yields_deltas(fake_server):
+    chunks = [CONTENT[i:i + 9] for i in range(0, len(CONTENT), 9)]
+    fake_server.enqueue(sse_response(chunks, delay=0.001))
+
+    parser = IncrementalOCRParser()
+    deltas = []
+    items = []
+    for delta in stream_chat_completion(fake_server.url, {}, {"model": "qwen-vl-max"}):
+        deltas.append(delta)
+        items.extend(parser.feed(delta))
+
+    assert "".join(deltas) == CONTENT
+    assert items == ITEMS
+    assert fake_server.requests[0]["json"]["stream"] is True
+
+
+def test_stream_retries_before_the_response_starts(fake_server):
+    fake_server.enqueue((503, {"Retry-After": "0"}, {"error": "busy"}), sse_response(["[", "]"]))
+
+    assert "".join(stream_chat_completion(fake_server.url, {}, {}, max_retries=1)) == "[]"
+    assert fake_server.request_count == 2
+
+
+def test_stream_read_timeout_raises(fake_server):
+    fake_server.enqueue(sse_response(["[", "{", "}", "]"], delay=1.0))
+
+    with pytest.raises(APIRequestError):
+        for _ in stream_chat_completion(fake_server.url, {}, {}, read_timeout=0.2, max_retries=0):
+            pass
@@ -0,0 +1,24 @@
+from nodes.ocr_tiling import clamp_tile_overlap, compute_tiles
+
+
+def covers(tiles, width, height):
+    covered = [[False] * width for _ in range(height)]
+    for x1, y1, x2, y2 in tiles:
+        for y in range(y1, y2):
+            covered[y][x1:x2] = [True] * (x2 - x1)
+    return all(all(row) for row in covered)
+
+
+def test_overlap_at_or_above_tile_size_is_clamped():
+    assert clamp_tile_overlap(256, 2048) == 128
+    assert clamp_tile_overlap(256, -5) == 0
+    # 不限制时步长为1像素，会得到上千万个图块
+    assert len(compute_tiles(4096, 4096, 256, 2048)) == len(compute_tiles(4096, 4096, 256, 128)) == 31 * 31
+
+
+def test_tiles_cover_the_whole_image():
+    tiles = compute_tiles(300, 170, 64, 16)
+
+    assert covers(tiles, 300, 170)
+    assert all(x2 - x1 == 64 and y2 - y1 == 64 for x1, y1, x2, y2 in tiles)
+    assert compute_tiles(50, 40, 64, 16) == [(0, 0, 50, 40)]
@@ -0,0 +1,140 @@
+import time
+import threading
+from email.utils import formatdate
+
+import pytest
+
+from conftest import ok_response, slow_response, sse_response
+from nodes.qwen_vl_client import (APIRequestError, CancelToken, RequestCancelled, parse_retry_after,
+                                  post_json_with_retry, send_with_retry, stream_chat_completion)
+
+PAYLOAD = {"model": "qwen-vl-max", "messages": []}
+
+
+def post(server, **options):
+    options.setdefault("backoff_base", 0.01)
+    return post_json_with_retry(server.url + "/chat/completions", {}, PAYLOAD, **options)
+
+
+def test_retries_5xx_until_success(fake_server):
+    fake_server.enqueue((503, {}, {"error": "busy"}), (500, {}, {"error": "boom"}), ok_response("ok"))
+
+    result = post(fake_server, max_retries=3)
+
+    assert result["choices"][0]["message"]["content"] == "ok"
+    assert fake_server.request_count == 3
+
+
+def test_429_waits_for_retry_after(fake_server):
+    fake_server.enqueue((429, {"Retry-After": "0.3"}, {"error": "rate limited"}), ok_response())
+
+    start = time.monotonic()
+    post(fake_server, max_retries=1, backoff_base=0.0)
+
+    first, second = fake_server.requests
+    assert second["time"] - first["time"] >= 0.3
+    assert time.monotonic() - start < 3
+
+
+def test_retry_after_is_capped_by_backoff_max(fake_server):
+    fake_server.enqueue((429, {"Retry-After": "120"}, {}), ok_response())
+
+    start = time.monotonic()
+    post(fake_server, max_retries=1, backoff_max=0.2)
+
+    assert time.monotonic() - start < 2
+
+
+def test_gives_up_after_max_retries(fake_server):
+    fake_server.default = (429, {"Retry-After": "0"}, {"error": "rate limited"})
+
+    with pytest.raises(APIRequestError) as excinfo:
+        post(fake_server, max_retries=2)
+
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.attempts == 3
+    assert excinfo.value.retry_after == 0
+    assert fake_server.request_count == 3
+
+
+def test_client_errors_are_not_retried(fake_server):
+    fake_server.default = (400, {}, {"error": "bad request"})
+
+    with pytest.raises(APIRequestError) as excinfo:
+        post(fake_server, max_retries=3)
+
+    assert excinfo.value.status_code == 400
+    assert fake_server.request_count == 1
+
+
+def test_read_timeout_is_retried(fake_server):
+    fake_server.enqueue(slow_response(1.0), ok_response("late"))
+
+    start = time.monotonic()
+    result = post(fake_server, max_retries=1, read_timeout=0.2)
+
+    assert result["choices"][0]["message"]["content"] == "late"
+    assert fake_server.request_count == 2
+    assert time.monotonic() - start < 1.0
+
+
+def test_read_timeout_exhausts_retries(fake_server):
+    fake_server.default = slow_response(1.0)
+
+    with pytest.raises(APIRequestError) as excinfo:
+        send_with_retry(fake_server.url, {}, PAYLOAD, max_retries=1, read_timeout=0.2, backoff_base=0.01)
+
+    assert excinfo.value.status_code is None
+    assert excinfo.value.attempts == 2
+    assert "Timeout" in str(excinfo.value)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("-5") == 0.0
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+    assert 8 <= parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+
+
+def wait_for_requests(server, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while server.request_count < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_cancel_aborts_in_flight_request_after_another_request_on_the_token_finished(fake_server):
+    # 同一个令牌被一批图片的所有请求共用，先完成的请求不能注销其他请求的连接
+    fake_server.enqueue(slow_response(5.0), ok_response("fast"))
+    token = CancelToken()
+    outcome = {}
+
+    def run_slow():
+        start = time.monotonic()
+        try:
+            post(fake_server, max_retries=0, cancel_token=token)
+        except Exception as e:
+            outcome["error"] = e
+        outcome["elapsed"] = time.monotonic() - start
+
+    thread = threading.Thread(target=run_slow)
+    thread.start()
+    wait_for_requests(fake_server, 1)
+    assert post(fake_server, max_retries=0, cancel_token=token)["choices"][0]["message"]["content"] == "fast"
+
+    token.cancel()
+    thread.join(5)
+    assert isinstance(outcome["error"], RequestCancelled)
+    assert outcome["elapsed"] < 2
+    assert token._connections == {}
+
+
+def test_finished_requests_release_their_connections(fake_server):
+    fake_server.enqueue((503, {}, {}), ok_response(), sse_response(["[", "]"]))
+    token = CancelToken()
+
+    post(fake_server, max_retries=1, cancel_token=token)
+    assert "".join(stream_chat_completion(fake_server.url, {}, {}, cancel_token=token)) == "[]"
+
+    assert token._connections == {}
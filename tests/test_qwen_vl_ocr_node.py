@@ -0,0 +1,35 @@
+import json
+
+import torch
+
+from conftest import ok_response
+from nodes.qwen_vl_ocr_node import QwenVLOCRNode
+
+CONTENT = json.dumps([{"bbox_2d": [10, 10, 60, 30], "text_content": "你好"}], ensure_ascii=False)
+
+
+def run_ocr(server, **options):
+    image = torch.rand(1, 64, 96, 3)
+    return QwenVLOCRNode().process_ocr(image, "sk-test", "识别文字", "qwen-vl-max", api_base_url=server.url,
+                                       use_cache=False, coord_mode="absolute", **options)
+
+
+def test_result_json_is_compact_without_raw_response(fake_server):
+    fake_server.default = ok_response(CONTENT)
+
+    _, mask, json_result, ocr_result = run_ocr(fake_server)
+
+    assert "\n" not in json_result and ": " not in json_result
+    result = json.loads(json_result)
+    assert "original_response" not in result
+    assert result["ocr_results"][0]["text_content"] == "你好"
+    assert ocr_result.frames[0].texts == ["你好"]
+    assert mask[0, 10:31, 10:61].min() == 1.0
+
+
+def test_raw_response_can_be_included(fake_server):
+    fake_server.default = ok_response(CONTENT)
+
+    result = json.loads(run_ocr(fake_server, include_raw_response=True)[2])
+
+    assert result["original_response"] == CONTENT
@@ -0,0 +1,74 @@
+import os
+import json
+
+import pytest
+import torch
+
+from nodes import text_overlay_node
+from nodes.text_layout import clear_layout_cache, layout_text
+from nodes.text_overlay_node import TextOverlayNode
+
+FONT = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+TEXT = "The quick brown fox jumps over the lazy dog"
+
+pytestmark = pytest.mark.skipif(not os.path.exists(FONT), reason="需要DejaVu Sans字体")
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    clear_layout_cache()
+
+
+@pytest.mark.parametrize("direction", ["horizontal", "auto"])
+def test_disabling_wrap_keeps_latin_text_on_one_line(direction):
+    wrapped = layout_text(TEXT, FONT, 160, 300, direction=direction)
+    single = layout_text(TEXT, FONT, 160, 300, direction=direction, wrap=False)
+
+    assert len(wrapped.lines) > 1
+    assert single.lines == [TEXT]
+    assert not single.vertical
+    assert single.size < wrapped.size
+
+
+def test_explicit_vertical_layout_is_kept_without_wrap():
+    assert layout_text("竖排文字", FONT, 60, 300, direction="vertical", wrap=False).vertical
+
+
+def test_disabling_wrap_still_breaks_at_newlines():
+    layout = layout_text("first line\nsecond", FONT, 400, 300, wrap=False)
+
+    assert layout.lines == ["first line", "second"]
+    assert layout.width <= 400
+
+
+def test_overlay_passes_enable_wrap_to_the_layout():
+    node = TextOverlayNode()
+    bbox = (0, 0, 160, 300)
+
+    assert len(node.calculate_auto_layout(TEXT, bbox, 1.0, FONT, "auto").lines) > 1
+    assert node.calculate_auto_layout(TEXT, bbox, 1.0, FONT, "auto", enable_wrap=False).lines == [TEXT]
+
+
+@pytest.mark.parametrize("font_size_mode", ["auto_fit", "fixed"])
+def test_unloadable_font_path_falls_back_to_the_default_font(tmp_path, font_size_mode):
+    bad_font = tmp_path / "not-a-font.ttf"
+    bad_font.write_text("not a font")
+    image = torch.zeros(1, 120, 240, 3)
+    ocr_json = json.dumps([{"bbox_2d": [10, 10, 230, 110], "text_content": TEXT}])
+
+    result, = TextOverlayNode().overlay_text(image, ocr_json, font_size_mode, 24, 0.9, "white", "none",
+                                             "bbox_center", False, font_path=str(bad_font), coord_mode="absolute")
+
+    assert result.shape == image.shape
+    assert (result > 0).sum() > 0
+
+
+def test_layout_errors_fall_back_to_the_smallest_size(monkeypatch):
+    def broken_layout(*args, **kwargs):
+        raise OSError("broken font")
+    monkeypatch.setattr(text_overlay_node, "layout_text", broken_layout)
+
+    layout = TextOverlayNode().calculate_auto_layout(TEXT, (0, 0, 160, 300), 1.0, FONT)
+
+    assert layout.size == 6
+    assert layout.lines == [TEXT]
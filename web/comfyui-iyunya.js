@@ -331,7 +331,8 @@ class IyunyaNodesMenu {
   async showManageNodesDialog() {
     try {
       // 获取所有节点列表
-      const response = await fetch("/api/iyunya/node/list");
+      // 只请求对话框用到的字段；节点未变化时服务端返回304，浏览器直接使用缓存
+      const response = await fetch("/api/iyunya/node/list?fields=id,group,node_name,display_name,return_names");
       const result = await response.json();
       
       if (result.status !== "success") {